@@ -0,0 +1,53 @@
+## @package base.controller Helpers shared by replica controllers.
+
+## Reports of replica controllers, shared by the controllers that compute a
+# dimmer once per control period from the latencies reported to them.
+# Classes using it set self.sim, self.controlLoop, the handle of their
+# periodic control event, None if not running, self.latestLatencies, a
+# base.sketch.PercentileEstimator of the latencies reported during the
+# current control period, and self.dimmer.
+class DimmerReportMixin:
+	## Columns of report rows
+	REPORT_COLUMNS = ('time', 'avgLatency', 'maxLatency', 'dimmer', 'outputDimmer')
+
+	## Name the columns of reports, for the metrics registry
+	def describeReport(self):
+		self.sim.describeOutput(self, self.REPORT_COLUMNS)
+
+	## Report the control period that ends, then start a new one.
+	# Without latencies, the control loop only reports, hence it is suspended
+	# until resumeControlLoop(); the periods skipped meanwhile are reported
+	# with NaN values.
+	# @param outputDimmer dimmer computed in the control period, NaN if none
+	def endControlPeriod(self, outputDimmer):
+		self.outputReport(self.sim.now, self.latestLatencies.average(),
+			self.latestLatencies.max, outputDimmer)
+
+		if not self.latestLatencies:
+			self.sim.suspend(self.controlLoop, self._outputSkippedReport)
+		self.latestLatencies.reset()
+
+	## Resume the control loop, if suspended, e.g., when a latency is reported
+	def resumeControlLoop(self):
+		if self.controlLoop is not None:
+			self.sim.resume(self.controlLoop)
+
+	## Output the report of a control period skipped while suspended
+	# @param now time of the report
+	def _outputSkippedReport(self, now):
+		self.outputReport(now, float('nan'), float('nan'), float('nan'))
+
+	## Output a report row
+	# @param now time of the report
+	# @param avgLatency average latency during the last control period, NaN if none
+	# @param maxLatency maximum latency during the last control period, NaN if none
+	# @param outputDimmer dimmer computed in the last control period, NaN if none
+	def outputReport(self, now, avgLatency, maxLatency, outputDimmer):
+		valuesToOutput = ( \
+			now, \
+			avgLatency, \
+			maxLatency, \
+			self.dimmer, \
+			outputDimmer, \
+		)
+		self.sim.output(self, valuesToOutput)
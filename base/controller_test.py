@@ -0,0 +1,37 @@
+from __future__ import print_function
+
+import math
+
+from controller import DimmerReportMixin
+from kernel import SimulatorKernel
+from sketch import PercentileEstimator
+
+class Controller(DimmerReportMixin):
+	def __init__(self, sim):
+		self.sim = sim
+		self.latestLatencies = PercentileEstimator(95)
+		self.dimmer = 0.5
+		self.controlLoop = sim.every(1, lambda: self.endControlPeriod(self.dimmer), delay = 0)
+
+	def __str__(self):
+		return "controller"
+
+def test_suspend_without_latencies():
+	sim = SimulatorKernel(outputDirectory = None)
+	rows = []
+	sim.output = lambda issuer, row: rows.append(row)
+	controller = Controller(sim)
+
+	def report():
+		controller.latestLatencies.append(2)
+		controller.resumeControlLoop()
+	sim.add(2.5, report)
+	sim.run(until = 3)
+
+	# Periods skipped while suspended are reported with NaN values
+	assert [ [ None if math.isnan(value) else value for value in row ] for row in rows ] == [
+		[ 0, None, None, 0.5, 0.5 ],
+		[ 1, None, None, 0.5, None ],
+		[ 2, None, None, 0.5, None ],
+		[ 3, 2, 2, 0.5, 0.5 ],
+		], rows
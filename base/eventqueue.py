@@ -0,0 +1,378 @@
+from __future__ import division
+
+from bisect import insort
+from functools import partial
+from heapq import heapify, heappop, heappush, nsmallest
+
+## @package base.eventqueue Event queue backends for the simulation kernel.
+# All backends store EventHandle entries, i.e., [time, sequence number,
+# handler, arguments] lists, and return them ordered by time, then sequence
+# number. Hence, all backends trigger events in exactly the same order.
+#
+# A backend's constructor receives timeScale, the number of entry time units
+# per second, i.e., 1 for a float clock, or the number of ticks per second for
+# an integer clock. A backend has to provide:
+# <ul>
+#   <li>push(entry), to add an entry;</li>
+#   <li>pushMany(entries), to add a list of entries, in bulk;</li>
+#   <li>pop(), to remove and return the smallest entry, raising IndexError if
+#     empty;</li>
+#   <li>peek(), to return the smallest entry without removing it, None if
+#     empty;</li>
+#   <li>popBefore(limit), to remove and return the smallest entry only if it is
+#     smaller than limit, otherwise return None. The kernel only calls it with
+#     limit at the current time, and never pushes entries before the current
+#     time;</li>
+#   <li>compact(), to drop entries whose handler is None, i.e., cancelled;</li>
+#   <li>__len__(), to return the number of stored entries.</li>
+# </ul>
+
+## Binary heap event queue.
+# O(log n) push and pop, with both implemented in C by the heapq module.
+class HeapEventQueue(object):
+	## Constructor
+	# @param timeScale entry time units per second, unused
+	def __init__(self, timeScale = 1):
+		## heap of entries
+		self.heap = []
+		# Bind heapq functions directly, saving a Python-level call per event
+		## add an entry
+		self.push = partial(heappush, self.heap)
+		## remove and return the smallest entry
+		self.pop = partial(heappop, self.heap)
+
+	## Add a list of entries
+	# @param entries entries to add
+	def pushMany(self, entries):
+		heap = self.heap
+		if len(entries) > len(heap):
+			# Heapifying all entries is O(n), cheaper than pushing each
+			heap.extend(entries)
+			heapify(heap)
+		else:
+			for entry in entries:
+				heappush(heap, entry)
+
+	## Return the smallest entry without removing it
+	# @return smallest entry, None if empty
+	def peek(self):
+		heap = self.heap
+		return heap[0] if heap else None
+
+	## Remove and return the smallest entry, if it is smaller than limit
+	# @param limit entry to compare against
+	# @return smallest entry or None
+	def popBefore(self, limit):
+		heap = self.heap
+		if heap and heap[0] < limit:
+			return heappop(heap)
+		return None
+
+	## Drop cancelled entries
+	def compact(self):
+		# Rebuild in-place, push and pop are bound to the list
+		self.heap[:] = [ entry for entry in self.heap if entry[2] is not None ]
+		heapify(self.heap)
+
+	def __len__(self):
+		return len(self.heap)
+
+## Calendar event queue, as described in R. Brown, "Calendar queues: a fast
+# O(1) priority queue implementation for the simulation event set problem",
+# CACM, 1988.
+# Entries are hashed by time into buckets (days) of fixed width, each bucket
+# being a small heap. Pop scans the buckets starting with the day of the last
+# popped entry. The number of buckets and their width are adapted as the
+# queue grows and shrinks.
+class CalendarEventQueue(object):
+	## Constructor
+	# @param timeScale entry time units per second
+	# @param numBuckets initial number of buckets
+	# @param bucketWidth initial bucket width in seconds
+	def __init__(self, timeScale = 1, numBuckets = 2, bucketWidth = 1.0):
+		## number of stored entries
+		self.count = 0
+		## time from which pop() scans buckets; no entry can be before it
+		self.lastTime = 0.0
+		## smallest number of buckets, below which the queue does not shrink
+		self.minBuckets = numBuckets
+		self._setup(numBuckets, bucketWidth * timeScale)
+
+	## (Re-)initialize buckets
+	def _setup(self, numBuckets, bucketWidth):
+		## buckets, each a heap of entries
+		self.buckets = [ [] for _ in range(numBuckets) ]
+		## number of buckets, i.e., days in a year
+		self.numBuckets = numBuckets
+		## bucket width, i.e., length of a day
+		self.bucketWidth = bucketWidth
+
+	## Add an entry
+	# @param entry entry to add
+	def push(self, entry):
+		day = int(entry[0] / self.bucketWidth)
+		heappush(self.buckets[day % self.numBuckets], entry)
+		self.count += 1
+		# An entry may be pushed back after having been popped
+		if entry[0] < self.lastTime:
+			self.lastTime = entry[0]
+		if self.count > 2 * self.numBuckets:
+			self._resize(2 * self.numBuckets)
+
+	## Add a list of entries
+	# @param entries entries to add
+	def pushMany(self, entries):
+		numBuckets = self.numBuckets
+		while self.count + len(entries) > 2 * numBuckets:
+			numBuckets *= 2
+		if numBuckets != self.numBuckets:
+			# Resize only once, re-estimating bucket width on all entries
+			self.buckets[0].extend(entries)
+			self.count += len(entries)
+			self.lastTime = min([ self.lastTime ] + [ entry[0] for entry in entries ])
+			self._resize(numBuckets)
+			return
+		for entry in entries:
+			self.push(entry)
+
+	## Remove and return the smallest entry
+	# @return smallest entry
+	def pop(self):
+		if self.count == 0:
+			raise IndexError('pop from empty event queue')
+		return self._popFrom(self._smallestBucket())
+
+	## Return the smallest entry without removing it
+	# @return smallest entry, None if empty
+	def peek(self):
+		if self.count == 0:
+			return None
+		return self._smallestBucket()[0]
+
+	## Find the bucket holding the smallest entry
+	# @return bucket, which must exist
+	def _smallestBucket(self):
+		buckets = self.buckets
+		numBuckets = self.numBuckets
+		bucketWidth = self.bucketWidth
+
+		# Look for an entry of the current day, then the next day, etc.
+		day = int(self.lastTime / bucketWidth)
+		for _ in range(numBuckets):
+			bucket = buckets[day % numBuckets]
+			if bucket and int(bucket[0][0] / bucketWidth) == day:
+				return bucket
+			day += 1
+
+		# Nothing within a year, search directly
+		entry = min(bucket[0] for bucket in buckets if bucket)
+		day = int(entry[0] / bucketWidth)
+		return buckets[day % numBuckets]
+
+	## Remove and return the smallest entry, if it is smaller than limit
+	# @param limit entry to compare against
+	# @return smallest entry or None
+	def popBefore(self, limit):
+		# No entry is before the current time, hence a smaller entry can only
+		# be in the bucket of the limit's day
+		day = int(limit[0] / self.bucketWidth)
+		bucket = self.buckets[day % self.numBuckets]
+		if bucket and bucket[0] < limit:
+			return self._popFrom(bucket)
+		return None
+
+	## Remove and return the smallest entry of a bucket
+	def _popFrom(self, bucket):
+		entry = heappop(bucket)
+		self.lastTime = entry[0]
+		self.count -= 1
+		if self.count < self.numBuckets // 2 and self.numBuckets > self.minBuckets:
+			self._resize(self.numBuckets // 2)
+		return entry
+
+	## Change the number of buckets and re-estimate bucket width
+	# @param numBuckets new number of buckets
+	def _resize(self, numBuckets):
+		entries = [ entry for bucket in self.buckets for entry in bucket ]
+
+		# Bucket width is three times the average separation of the earliest
+		# entries, as recommended by Brown
+		bucketWidth = self.bucketWidth
+		times = [ entry[0] for entry in nsmallest(25, entries) ]
+		separations = [ b - a for a, b in zip(times, times[1:]) if b > a ]
+		if separations:
+			bucketWidth = 3 * sum(separations) / len(separations)
+
+		self._setup(numBuckets, bucketWidth)
+		for entry in entries:
+			day = int(entry[0] / bucketWidth)
+			self.buckets[day % numBuckets].append(entry)
+		for bucket in self.buckets:
+			heapify(bucket)
+
+	## Drop cancelled entries
+	def compact(self):
+		for bucket in self.buckets:
+			bucket[:] = [ entry for entry in bucket if entry[2] is not None ]
+			heapify(bucket)
+		self.count = sum(len(bucket) for bucket in self.buckets)
+
+	def __len__(self):
+		return self.count
+
+## Timing wheel event queue.
+# The near future is divided into fixed-size slots (ticks) of a wheel. Adding
+# an entry to the wheel is an O(1) list append; entries that do not fit in the
+# wheel are kept in an overflow heap. When the wheel turns to the next non-empty
+# tick, the entries of that tick are sorted once, then popped in order.
+# Suits the event mix of the simulator, which is mostly made of short delays,
+# e.g., time-slices and think-times, plus a few long periodic loops.
+class TimingWheelEventQueue(object):
+	## Constructor
+	# @param timeScale entry time units per second
+	# @param resolution duration of a tick in seconds
+	# @param numSlots number of ticks in the wheel
+	def __init__(self, timeScale = 1, resolution = 0.01, numSlots = 4096):
+		## duration of a tick, in entry time units
+		self.resolution = resolution * timeScale
+		## number of slots in the wheel
+		self.numSlots = numSlots
+		## slots of the wheel; slot i holds entries of the single tick within
+		# the wheel that is equal to i modulo numSlots
+		self.slots = [ [] for _ in range(numSlots) ]
+		## tick that is currently being popped
+		self.currentTick = 0
+		## sorted entries of the current tick (and possibly before)
+		self.current = []
+		## index of the next entry to pop from current
+		self.currentIndex = 0
+		## heap of entries too far in the future for the wheel
+		self.overflow = []
+		## number of stored entries
+		self.count = 0
+
+	## Add an entry
+	# @param entry entry to add
+	def push(self, entry):
+		tick = int(entry[0] / self.resolution)
+		if tick <= self.currentTick:
+			insort(self.current, entry, self.currentIndex)
+		elif tick < self.currentTick + self.numSlots:
+			self.slots[tick % self.numSlots].append(entry)
+		else:
+			heappush(self.overflow, entry)
+		self.count += 1
+
+	## Add a list of entries
+	# @param entries entries to add
+	def pushMany(self, entries):
+		overflowing = []
+		endTick = self.currentTick + self.numSlots
+		for entry in entries:
+			tick = int(entry[0] / self.resolution)
+			if tick <= self.currentTick:
+				self.push(entry)
+			elif tick < endTick:
+				# Slots are only sorted when the wheel turns to them
+				self.slots[tick % self.numSlots].append(entry)
+				self.count += 1
+			else:
+				overflowing.append(entry)
+		if len(overflowing) > len(self.overflow):
+			self.overflow.extend(overflowing)
+			heapify(self.overflow)
+		else:
+			for entry in overflowing:
+				heappush(self.overflow, entry)
+		self.count += len(overflowing)
+
+	## Remove and return the smallest entry
+	# @return smallest entry
+	def pop(self):
+		if self.currentIndex == len(self.current):
+			self._turn()
+		entry = self.current[self.currentIndex]
+		self.currentIndex += 1
+		self.count -= 1
+		return entry
+
+	## Return the smallest entry without removing it
+	# @return smallest entry, None if empty
+	def peek(self):
+		if self.currentIndex == len(self.current):
+			if self.count == 0:
+				return None
+			self._turn()
+		return self.current[self.currentIndex]
+
+	## Remove and return the smallest entry, if it is smaller than limit
+	# @param limit entry to compare against
+	# @return smallest entry or None
+	def popBefore(self, limit):
+		if self.currentIndex == len(self.current):
+			if self.count == 0:
+				return None
+			self._turn()
+		if self.current[self.currentIndex] < limit:
+			return self.pop()
+		return None
+
+	## Turn the wheel to the next non-empty tick
+	def _turn(self):
+		if self.count == 0:
+			raise IndexError('pop from empty event queue')
+
+		slots = self.slots
+		numSlots = self.numSlots
+		resolution = self.resolution
+
+		nextTick = None
+		for tick in range(self.currentTick + 1, self.currentTick + numSlots):
+			if slots[tick % numSlots]:
+				nextTick = tick
+				break
+		if self.overflow:
+			overflowTick = int(self.overflow[0][0] / resolution)
+			if nextTick is None or overflowTick < nextTick:
+				nextTick = overflowTick
+
+		current = slots[nextTick % numSlots]
+		slots[nextTick % numSlots] = []
+
+		# Move overflowing entries that now fit in the wheel
+		overflow = self.overflow
+		endTick = nextTick + numSlots
+		while overflow and int(overflow[0][0] / resolution) < endTick:
+			entry = heappop(overflow)
+			tick = int(entry[0] / resolution)
+			if tick == nextTick:
+				current.append(entry)
+			else:
+				slots[tick % numSlots].append(entry)
+
+		current.sort()
+		self.current = current
+		self.currentIndex = 0
+		self.currentTick = nextTick
+
+	## Drop cancelled entries
+	def compact(self):
+		self.current = [ entry for entry in self.current[self.currentIndex:] \
+			if entry[2] is not None ]
+		self.currentIndex = 0
+		for slot in self.slots:
+			slot[:] = [ entry for entry in slot if entry[2] is not None ]
+		self.overflow = [ entry for entry in self.overflow if entry[2] is not None ]
+		heapify(self.overflow)
+		self.count = len(self.current) + len(self.overflow) + \
+			sum(len(slot) for slot in self.slots)
+
+	def __len__(self):
+		return self.count
+
+## Event queue backends, by name
+EVENT_QUEUES = {
+	'heap': HeapEventQueue,
+	'calendar': CalendarEventQueue,
+	'wheel': TimingWheelEventQueue,
+}
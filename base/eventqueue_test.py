@@ -0,0 +1,90 @@
+import random
+
+from eventqueue import EVENT_QUEUES
+from kernel import EventHandle
+
+def check_same_order(eventQueueName):
+	rng = random.Random(1)
+	reference = EVENT_QUEUES['heap']()
+	eventQueue = EVENT_QUEUES[eventQueueName]()
+
+	now = 0.0
+	sequenceNumber = 0
+	popped = []
+	for _ in range(0, 20000):
+		action = rng.random()
+		if action < 0.55 or not len(reference):
+			# Mix of simultaneous, short, medium and long delays
+			delay = rng.choice([ 0.0, 0.01, rng.expovariate(1.0), 0.5, 60.0, 1000.0 ])
+			entry = EventHandle((now + delay, sequenceNumber, sequenceNumber))
+			sequenceNumber += 1
+			reference.push(entry)
+			eventQueue.push(EventHandle(entry))
+		elif action < 0.6:
+			limit = EventHandle((now, sequenceNumber, None))
+			expected = reference.popBefore(limit)
+			actual = eventQueue.popBefore(limit)
+			assert expected == actual, (expected, actual)
+		else:
+			assert reference.peek() == eventQueue.peek()
+			expected = reference.pop()
+			actual = eventQueue.pop()
+			assert expected == actual, (expected, actual)
+			now = actual[0]
+			popped.append(actual)
+		assert len(reference) == len(eventQueue)
+
+	while len(reference):
+		assert reference.pop() == eventQueue.pop()
+	assert len(eventQueue) == 0
+	assert eventQueue.peek() is None
+	assert len(popped) > 1000
+
+def test_same_order():
+	for eventQueueName in EVENT_QUEUES:
+		yield check_same_order, eventQueueName
+
+def check_compact(eventQueueName):
+	eventQueue = EVENT_QUEUES[eventQueueName]()
+	for i in range(0, 100):
+		eventQueue.push(EventHandle((i * 0.3, i, i if i % 3 else None)))
+	eventQueue.compact()
+
+	assert len(eventQueue) == 66, len(eventQueue)
+	assert [ eventQueue.pop()[2] for _ in range(0, 66) ] == \
+		[ i for i in range(0, 100) if i % 3 ]
+
+def test_compact():
+	for eventQueueName in EVENT_QUEUES:
+		yield check_compact, eventQueueName
+
+def check_push_many(eventQueueName):
+	rng = random.Random(1)
+	reference = EVENT_QUEUES['heap']()
+	eventQueue = EVENT_QUEUES[eventQueueName]()
+
+	# Bulk-push into empty and non-empty queues, including entries due now
+	now = 0.0
+	sequenceNumber = 0
+	for numEntries in [ 1000, 10, 3000 ]:
+		entries = []
+		for _ in range(0, numEntries):
+			delay = rng.choice([ 0.0, 0.01, rng.expovariate(1.0), 60.0, 1000.0 ])
+			entries.append(EventHandle((now + delay, sequenceNumber, sequenceNumber)))
+			sequenceNumber += 1
+		for entry in entries:
+			reference.push(entry)
+		eventQueue.pushMany([ EventHandle(entry) for entry in entries ])
+		assert len(reference) == len(eventQueue)
+		for _ in range(0, 500):
+			expected = reference.pop()
+			assert eventQueue.pop() == expected
+			now = expected[0]
+
+	while len(reference):
+		assert reference.pop() == eventQueue.pop()
+	assert len(eventQueue) == 0
+
+def test_push_many():
+	for eventQueueName in EVENT_QUEUES:
+		yield check_push_many, eventQueueName
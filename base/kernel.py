@@ -1,73 +1,713 @@
-from __future__ import print_function
+from __future__ import division, print_function
 
-from collections import defaultdict, deque
+from collections import OrderedDict, deque, namedtuple
+from fnmatch import fnmatch
+from functools import partial
 import os
+import resource
 import sys
+import time
+
+from .eventqueue import EVENT_QUEUES
+from .output import OUTPUT_FORMATS, ThreadedOutputWriter, issuerName
+from .profiler import EventProfiler
+
+## Log levels, as in the logging module
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+## Log levels, by name
+LOG_LEVELS = {
+	'DEBUG': DEBUG,
+	'INFO': INFO,
+	'WARNING': WARNING,
+	'ERROR': ERROR,
+}
+
+## Handle to a pending event, as returned by SimulatorKernel.add().
+# It is also the entry stored in the event queue, i.e., a [time, sequence
+# number, handler, arguments] list, so that the queue can be ordered with the
+# fast built-in list comparison. A None handler marks a cancelled or triggered
+# event.
+class EventHandle(list):
+	__slots__ = ()
+
+	## Time at which the event is scheduled, in units of the kernel's clock,
+	# i.e., seconds or ticks
+	@property
+	def time(self):
+		return self[0]
+
+## Handle to a periodic event, as returned by SimulatorKernel.every().
+class PeriodicHandle(object):
+	__slots__ = ('period', 'what', 'ticker', 'nextTime', 'backfill')
+
+	## Constructor
+	# @param period period of the event, in seconds
+	# @param what event handler
+	def __init__(self, period, what):
+		## period of the event, in seconds
+		self.period = period
+		## event handler, None if cancelled
+		self.what = what
+		## ticker triggering the event, None if suspended or cancelled
+		self.ticker = None
+		## time at which the event is due next, in units of the kernel's clock
+		self.nextTime = None
+		## callable to call for each trigger skipped while suspended
+		self.backfill = None
+
+## Single event fanning out to all subscribers of the same period that are due
+# at the same time.
+class _Ticker(object):
+	__slots__ = ('sim', 'period', 'key', 'entry', 'subscriptions')
+
+	## Constructor
+	# @param sim kernel to which the ticker is attached
+	# @param period period of the ticker, in seconds
+	def __init__(self, sim, period):
+		## kernel to which the ticker is attached
+		self.sim = sim
+		## period of the ticker, in seconds
+		self.period = period
+		## (period, time) identifying the pending event of the ticker
+		self.key = None
+		## handle of the pending event of the ticker
+		self.entry = None
+		## subscriptions, as PeriodicHandle, in registration order
+		self.subscriptions = []
+
+	## Event handler, calls all subscribers in registration order
+	def fire(self):
+		sim = self.sim
+		subscriptions = list(self.subscriptions)
+		# Reschedule first, so that subscriptions made by subscribers join
+		# the next tick, after the current subscribers
+		nextTime = sim._advance(self.key[1], self.period)
+		sim._scheduleTicker(self, nextTime)
+		tracer = sim.tracer
+		profiler = sim.profiler
+		for subscription in subscriptions:
+			# Skip subscriptions suspended or cancelled by a previous subscriber
+			if subscription.ticker is not None:
+				subscription.nextTime = nextTime
+				# Subscribers are traced and profiled as if they were events
+				if tracer is not None:
+					tracer.record(sim.now, subscription.what)
+				if profiler is None:
+					subscription.what()
+				else:
+					profiler.call(subscription.what)
+
+	## Pretty-print the ticker's name
+	def __str__(self):
+		return "ticker"
+
+## Progress of a running simulation, as passed to the heartbeat callback.
+# <ul>
+#   <li>now: current simulation time, in seconds;</li>
+#   <li>until: time limit of the simulation, in seconds;</li>
+#   <li>numEvents: number of events triggered so far;</li>
+#   <li>eventsPerSecond: events triggered per wall-clock second, since the
+#     previous heartbeat;</li>
+#   <li>speedup: simulated seconds per wall-clock second, since the previous
+#     heartbeat;</li>
+#   <li>pendingEvents: number of events waiting to be triggered;</li>
+#   <li>rss: resident set size of the process, in bytes;</li>
+#   <li>eta: estimated wall-clock seconds until the time limit is reached.</li>
+# </ul>
+Progress = namedtuple('Progress', [ 'now', 'until', 'numEvents', 'eventsPerSecond',
+	'speedup', 'pendingEvents', 'rss', 'eta' ])
 
 ## Simulation kernel.
 # Implements an event-driven simulator
 class SimulatorKernel:
 	## Constructor
-	# @param outputDirectory folder where CSV files should be written to. None disables CSV files
-	def __init__(self, outputDirectory = '.'):
-		## events indexed by time
-		self.events = defaultdict(list)
-		## reverse index from event handlers to time index, to allow easy update
-		self.whatToTime = {}
-		## current simulation time
+	# @param outputDirectory folder where output files should be written to. None disables output files
+	# @param eventQueue name of the event queue backend, one of EVENT_QUEUES
+	# @param clockResolution None to keep time as float seconds, otherwise
+	# keep time as an integer number of ticks of this many seconds, e.g., 1e-9.
+	# An integer clock makes events that should coincide actually coincide,
+	# independently of floating-point rounding.
+	# @param profile whether to measure the number of events and the time
+	# spent in each event handler, and print a table of them at the end of
+	# run(); when False, profiling costs nothing
+	# @param heartbeatInterval wall-clock seconds between two calls to
+	# heartbeat(), None to disable
+	# @param wallClockBudget wall-clock seconds after which run() stops
+	# triggering events, None for no limit
+	# @param tracer optional EventTracer, in which each triggered event is
+	# recorded
+	# @param flushPolicy when to write buffered output rows to files, one of
+	# base.output.FLUSH_POLICIES
+	# @param outputFormat format of output files, one of
+	# base.output.OUTPUT_FORMATS
+	# @param asyncOutput whether to format and write output rows in a
+	# background thread
+	# @param metrics optional base.metrics.MetricsRegistry, in which each row
+	# of numbers passed to output() is recorded, even if output files are
+	# disabled
+	# @param requestTracer optional base.tracing.RequestTracer, in which the
+	# marks of sampled requests are recorded
+	# @param immediateLane whether to keep events scheduled with zero delay in
+	# a FIFO deque beside the event queue; False pushes them on the event
+	# queue, e.g., to measure what the deque saves. Events are triggered in
+	# the same order either way.
+	# @param updatableEvents whether update() can be used, which requires
+	# indexing events without arguments by handler each time one is added
+	def __init__(self, outputDirectory = '.', eventQueue = 'heap', clockResolution = None,
+			profile = False, heartbeatInterval = None, wallClockBudget = None,
+			tracer = None, flushPolicy = 'size', outputFormat = 'csv', asyncOutput = False,
+			metrics = None, requestTracer = None, immediateLane = True,
+			updatableEvents = False):
+		## number of ticks per second of the integer clock, None for a float clock
+		self.ticksPerSecond = None
+		if clockResolution is not None:
+			self.ticksPerSecond = int(round(1 / clockResolution))
+		## pending events, as an event queue of [time, sequence number, handler,
+		# arguments] entries; the sequence number ensures that events scheduled
+		# for the same time are triggered in FIFO order
+		self.events = EVENT_QUEUES[eventQueue](timeScale = self.ticksPerSecond or 1)
+		## pending events scheduled with zero delay, in FIFO order. These are
+		# due at the current time, hence need no ordering by time; they are
+		# all triggered before time advances.
+		self.immediateEvents = deque()
+		## whether events scheduled with zero delay go to immediateEvents
+		self.immediateLane = immediateLane
+		## sequence number to give to the next event
+		self.nextSequenceNumber = 0
+		## reverse index from event handlers to queue entries, to allow easy
+		# update; None unless updatableEvents, so that add() does not pay for it
+		self.whatToTime = {} if updatableEvents else None
+		## tickers of periodic events, by (period, time of next tick)
+		self.tickers = {}
+		## suspended periodic events, in order of suspension
+		self.suspendedPeriodics = OrderedDict()
+		## number of cancelled entries still in the queues
+		self.numCancelledEvents = 0
+		## current simulation time, in seconds
 		self.now = 0.0
-		## cache of open file descriptors: for each issuer, this dictionary maps
-		# to a file descriptor
-		self.outputFiles = {}
+		## current simulation time, in ticks of the integer clock
+		self.nowTicks = 0
+		## number of events triggered so far
+		self.numEvents = 0
 		## output directory
 		self.outputDirectory = outputDirectory
+		## writer of output rows, None if output is disabled
+		self.outputWriter = None
+		if outputDirectory is not None:
+			self.outputWriter = OUTPUT_FORMATS[outputFormat](outputDirectory,
+				flushPolicy = flushPolicy)
+			if asyncOutput:
+				self.outputWriter = ThreadedOutputWriter(self.outputWriter)
+		## output policy overrides, as (issuer name pattern, policy factory) pairs
+		self.outputPolicyFactories = []
+		## output policies of streams, by issuer name; None for writing all rows
+		self.outputPolicies = {}
+		## registry of in-memory time series, None if disabled
+		self.metrics = metrics
+		## wall-clock seconds between heartbeats, None to disable
+		self.heartbeatInterval = heartbeatInterval
+		## wall-clock seconds the simulation may take, None for no limit
+		self.wallClockBudget = wallClockBudget
+		## whether the simulation was stopped because the wall-clock budget was exceeded
+		self.wallClockBudgetExceeded = False
+		## number of events between two reads of the wall-clock
+		self.wallClockCheckPeriod = 1024
+		## wall-clock time at which events started being triggered
+		self.wallClockStarted = None
+		## wall-clock time, number of events and simulation time of the last heartbeat
+		self.lastHeartbeat = None
+		## messages below this level are not logged, unless overridden per issuer
+		self.logLevel = INFO
+		## log level overrides, as (issuer name pattern, level) pairs
+		self.issuerLogLevels = []
+		## lowest level that may be logged, to quickly discard messages
+		self.minLogLevel = self.logLevel
+		## cache of log levels of issuers, by issuer name
+		self.issuerLogLevelCache = {}
+		## file to which log records are written, None for standard error
+		self.logFile = None
+		## log records not yet written to the log file
+		self.logBuffer = []
+		## number of log records to buffer before writing them
+		self.logBufferSize = 100
+		## recorder of triggered events, None if tracing is disabled
+		self.tracer = tracer
+		## recorder of the marks of sampled requests, None if disabled
+		self.requestTracer = requestTracer
+		## whether traceMark() records anything, so that entities can skip
+		# calling it when tracing is disabled
+		self.tracing = tracer is not None or requestTracer is not None
+		## profiler of event handlers, None if profiling is disabled
+		self.profiler = None
+		if profile:
+			self.profiler = EventProfiler()
+			self.profiler.ignore(_Ticker.fire)
+			# Shadow the method only for this instance, to leave output() intact
+			# when profiling is disabled
+			self.output = partial(self.profiler.callNested, 'SimulatorKernel.output',
+				self.output)
 
 	## Adds a new event
 	# @param delay non-negative float representing in how much time should the
 	# event be triggered. Can be zero, in which case the simulator will trigger
 	# the event a bit later, at the current simulation time.
 	# @param what Event handler, can be a function, class method or lambda
+	# @param args arguments to call the event handler with. Passing a bound
+	# method and its arguments, e.g., add(delay, self.onCompleted, request),
+	# is cheaper than creating a closure, e.g., a lambda, for each event.
+	# @return handle which can be passed to cancel()
 	# @see Callable
-	def add(self, delay, what):
-		self.events[self.now + delay].append(what)
-		self.whatToTime[what] = self.now + delay
+	# @note Events with arguments are not replaced by update().
+	def add(self, delay, what, *args):
+		if self.ticksPerSecond is None:
+			time = self.now + delay
+		else:
+			time = self.nowTicks + int(round(delay * self.ticksPerSecond))
+		entry = EventHandle((time, self.nextSequenceNumber, what, args))
+		self.nextSequenceNumber += 1
+		if delay == 0 and self.immediateLane:
+			self.immediateEvents.append(entry)
+		else:
+			self.events.push(entry)
+		if self.whatToTime is not None and not args:
+			self.whatToTime[what] = entry
+		return entry
+
+	## Adds many new events at once
+	# Equivalent to calling add() for each event, in order, but builds the
+	# event queue in bulk, e.g., in O(n) instead of O(n log n) for the heap.
+	# @param events iterable of (delay, what, *args) tuples, as taken by add()
+	# @return list of handles which can be passed to cancel()
+	def addMany(self, events):
+		ticksPerSecond = self.ticksPerSecond
+		if ticksPerSecond is None:
+			now = self.now
+		else:
+			now = self.nowTicks
+		sequenceNumber = self.nextSequenceNumber
+		whatToTime = self.whatToTime
+		immediateLane = self.immediateLane
+		immediateEntries = []
+		entries = []
+		handles = []
+		for event in events:
+			delay = event[0]
+			what = event[1]
+			args = tuple(event[2:])
+			if ticksPerSecond is None:
+				time = now + delay
+			else:
+				time = now + int(round(delay * ticksPerSecond))
+			entry = EventHandle((time, sequenceNumber, what, args))
+			sequenceNumber += 1
+			if delay == 0 and immediateLane:
+				immediateEntries.append(entry)
+			else:
+				entries.append(entry)
+			if whatToTime is not None and not args:
+				whatToTime[what] = entry
+			handles.append(entry)
+		self.nextSequenceNumber = sequenceNumber
+		self.immediateEvents.extend(immediateEntries)
+		self.events.pushMany(entries)
+		return handles
+
+	## Adds a new periodic event
+	# All periodic events with the same period that are due at the same time
+	# share a single event in the queue. They are triggered one after the
+	# other, in the order in which they were added.
+	# @param period positive float representing how often the event should be
+	# triggered
+	# @param what Event handler, can be a function, class method or lambda
+	# @param delay in how much time should the event be triggered the first
+	# time; by default, after one period. Can be zero.
+	# @return handle which can be passed to cancel(), suspend() and resume()
+	# @note Times of the event are computed by repeatedly adding period, as if
+	# what re-added itself with add() each time it is triggered.
+	def every(self, period, what, delay = None):
+		if delay is None:
+			delay = period
+		handle = PeriodicHandle(period, what)
+		self._subscribe(handle, self._advance(self._nowInClock(), delay))
+		return handle
+
+	## Suspend a periodic event
+	# Used by an entity that becomes idle, so that its periodic event no longer
+	# takes up simulation time. Triggers that are skipped while suspended can be
+	# made up for, e.g., by outputting the rows that the periodic event would
+	# have output. Making up is done lazily, when the event is resumed or at
+	# the end of run(), whichever comes first.
+	# @param handle handle returned by every()
+	# @param backfill optional callable, called with the time in seconds of
+	# each skipped trigger
+	def suspend(self, handle, backfill = None):
+		if handle.ticker is None:
+			return
+		self._unsubscribe(handle)
+		handle.backfill = backfill
+		self.suspendedPeriodics[handle] = None
+
+	## Resume a suspended periodic event
+	# Triggers skipped so far are made up for, then the event continues to be
+	# triggered at the same times as if it had never been suspended.
+	# @param handle handle passed to suspend()
+	def resume(self, handle):
+		if handle not in self.suspendedPeriodics:
+			return
+		del self.suspendedPeriodics[handle]
+		self._backfill(handle)
+		handle.backfill = None
+		self._subscribe(handle, handle.nextTime)
+
+	## Make up for triggers skipped by a suspended periodic event, up to the
+	# current time
+	# @param handle suspended handle
+	def _backfill(self, handle):
+		now = self._nowInClock()
+		nextTime = handle.nextTime
+		while nextTime <= now:
+			if handle.backfill is not None:
+				if self.ticksPerSecond is None:
+					handle.backfill(nextTime)
+				else:
+					handle.backfill(nextTime / self.ticksPerSecond)
+			nextTime = self._advance(nextTime, handle.period)
+		handle.nextTime = nextTime
+
+	## Subscribe a periodic event to the ticker due at a given time
+	# @param handle periodic event handle
+	# @param time time of the next trigger, in units of the kernel's clock
+	def _subscribe(self, handle, time):
+		ticker = self.tickers.get((handle.period, time))
+		if ticker is None:
+			ticker = self._scheduleTicker(_Ticker(self, handle.period), time)
+		ticker.subscriptions.append(handle)
+		handle.ticker = ticker
+		handle.nextTime = time
+
+	## Unsubscribe a periodic event from its ticker, cancelling the ticker if
+	# it has no subscriptions left
+	# @param handle periodic event handle
+	def _unsubscribe(self, handle):
+		ticker = handle.ticker
+		ticker.subscriptions.remove(handle)
+		handle.ticker = None
+		if not ticker.subscriptions and self.tickers.get(ticker.key) is ticker:
+			del self.tickers[ticker.key]
+			self.cancel(ticker.entry)
+
+	## Schedule the next tick of a ticker, merging it with an existing ticker
+	# if both are due at the same time
+	# @param ticker ticker to schedule
+	# @param time time of the tick, in units of the kernel's clock
+	# @return ticker that holds the subscriptions
+	def _scheduleTicker(self, ticker, time):
+		if self.tickers.get(ticker.key) is ticker:
+			del self.tickers[ticker.key]
+		key = (ticker.period, time)
+		existingTicker = self.tickers.get(key)
+		if existingTicker is not None:
+			# The existing ticker was scheduled earlier, hence fires first
+			for subscription in ticker.subscriptions:
+				subscription.ticker = existingTicker
+			existingTicker.subscriptions.extend(ticker.subscriptions)
+			ticker.subscriptions = []
+			return existingTicker
+		ticker.key = key
+		self.tickers[key] = ticker
+		ticker.entry = self._addAt(time, ticker.fire)
+		return ticker
+
+	## Adds a new event at a given time
+	# @param time time of the event, in units of the kernel's clock, not
+	# before the current time
+	# @param what Event handler
+	# @return handle which can be passed to cancel()
+	def _addAt(self, time, what):
+		entry = EventHandle((time, self.nextSequenceNumber, what, ()))
+		self.nextSequenceNumber += 1
+		if time == self._nowInClock() and self.immediateLane:
+			self.immediateEvents.append(entry)
+		else:
+			self.events.push(entry)
+		if self.whatToTime is not None:
+			self.whatToTime[what] = entry
+		return entry
+
+	## Current time in units of the kernel's clock, i.e., seconds or ticks
+	def _nowInClock(self):
+		if self.ticksPerSecond is None:
+			return self.now
+		return self.nowTicks
+
+	## Compute a time after a delay
+	# @param time time in units of the kernel's clock
+	# @param delay delay in seconds
+	# @return time in units of the kernel's clock
+	def _advance(self, time, delay):
+		if self.ticksPerSecond is None:
+			return time + delay
+		return time + int(round(delay * self.ticksPerSecond))
 
 	## Update an existing event or add a new event
 	# @param delay in how much time should the event be triggered
 	# @param what Callable to call for handling this event. Can be a function,
 	# class method or lambda
+	# @return handle which can be passed to cancel()
 	# @note Deletes the previously existing event that is handled by what.
-	# The current implementation stores at most one such event.
+	# The current implementation stores at most one such event. Only available
+	# if the kernel was constructed with updatableEvents.
 	def update(self, delay, what):
-		if what in self.whatToTime:
-			oldTime = self.whatToTime[what]
-			events = self.events[oldTime]
-			events.remove(what)
-			if len(events) == 0:
-				del self.events[oldTime]
+		if self.whatToTime is None:
+			raise RuntimeError("update() requires a kernel constructed with updatableEvents = True")
+		entry = self.whatToTime.get(what)
+		if entry is not None:
+			self.cancel(entry)
+		return self.add(delay, what)
+
+	## Cancel a pending event
+	# @param handle handle returned by add(), update() or every()
+	# @note Cancelling an event that was already triggered or cancelled has no
+	# effect. A periodic event is cancelled for all its future occurrences. Cancelled events are only marked as such and skipped when they
+	# reach the front of the queue; the queue is compacted when more than half
+	# of it is made of cancelled events.
+	def cancel(self, handle):
+		if isinstance(handle, PeriodicHandle):
+			if handle.ticker is not None:
+				self._unsubscribe(handle)
+			self.suspendedPeriodics.pop(handle, None)
+			handle.what = None
+			return
+		what = handle[2]
+		if what is None:
+			return
+		handle[2] = None
+		if self.whatToTime is not None and self.whatToTime.get(what) is handle:
 			del self.whatToTime[what]
-		self.add(delay, what)
+
+		self.numCancelledEvents += 1
+		if self.numCancelledEvents > 64 and self.numCancelledEvents * 2 > \
+				len(self.events) + len(self.immediateEvents):
+			# Rebuild in-place, run() holds references to the queues
+			self.events.compact()
+			immediateEvents = [ entry for entry in self.immediateEvents \
+				if entry[2] is not None ]
+			self.immediateEvents.clear()
+			self.immediateEvents.extend(immediateEvents)
+			self.numCancelledEvents = 0
 
 	## Run the simulation
-	# @param until time limit to stop simulation
+	# Events scheduled after the time limit are left untouched, so that the
+	# simulation can be continued by calling run() again with a later limit.
+	# If the wall-clock budget is exceeded, run() returns early, as if no
+	# events remained, and sets wallClockBudgetExceeded.
+	# Suspended periodic events are made up for up to the time at which the
+	# simulation stopped.
+	# @param until time limit to stop simulation; events scheduled exactly at
+	# this time are triggered
+	# @note If events remain after until, the simulation time is advanced to
+	# until. If no events remain, it is left at the time of the last event,
+	# unless periodic events are suspended.
 	def run(self, until = 2000):
+		try:
+			if self._dispatch(until = until):
+				self.log(self, "Handled {0} events", self.numEvents)
+				# Suspended periodic events would still be pending
+				if self.suspendedPeriodics and until != float('inf') and \
+						not self.wallClockBudgetExceeded:
+					self._advanceTo(until)
+			for handle in self.suspendedPeriodics:
+				self._backfill(handle)
+		finally:
+			self.flushLog()
+			self._advanceOutputPolicies()
+			if self.outputWriter is not None:
+				self.outputWriter.close()
+			if self.requestTracer is not None:
+				self.requestTracer.flush()
+		if self.profiler is not None:
+			self.profiler.report()
+
+	## Run the simulation for some more time
+	# @param duration how much simulation time to advance
+	# @see run()
+	def runFor(self, duration):
+		self.run(until = self.now + duration)
+
+	## Run the simulation until a condition holds
+	# @param predicate callable taking no arguments, tested after each event
+	# @param until optional time limit to stop simulation, even if predicate
+	# does not hold
+	# @return True if the predicate holds, False if the simulation stopped
+	# because no events remain or the time limit was reached
+	def runUntil(self, predicate, until = float('inf')):
+		self._dispatch(until = until, predicate = predicate)
+		return bool(predicate())
+
+	## Trigger the next event
+	# @return True if an event was triggered, False if no events remain
+	def step(self):
+		numEvents = self.numEvents
+		self._dispatch(until = float('inf'), maxEvents = 1)
+		return self.numEvents > numEvents
+
+	## Trigger events in order
+	# @param until time limit
+	# @param predicate optional callable, stop as soon as it returns True
+	# @param maxEvents optional maximum number of events to trigger
+	# @return True if no events remain
+	def _dispatch(self, until, predicate = None, maxEvents = None):
+		if self.now > until:
+			return False
+
 		numEvents = 0
-		while self.events:
-			prevNow = self.now
-			self.now = min(self.events)
-			#if int(prevNow / 100) < int(self.now / 100):
-			#	self.log(self, "progressing, handled {0} events", numEvents)
-			events = self.events[self.now]
-			event = events.pop(0)
-			del self.whatToTime[event]
-			if len(events) == 0:
-				del self.events[self.now]
-
-			if self.now > until:
-				return
-			event()
+		ticksPerSecond = self.ticksPerSecond
+		if ticksPerSecond is None:
+			untilTime = until
+		else:
+			untilTime = until * ticksPerSecond
+		peek = self.events.peek
+		pop = self.events.pop
+		popBefore = self.events.popBefore
+		immediateEvents = self.immediateEvents
+		whatToTime = self.whatToTime
+		profiler = self.profiler
+		tracer = self.tracer
+		wallClockCheckPeriod = None
+		if self.heartbeatInterval is not None or self.wallClockBudget is not None:
+			wallClockCheckPeriod = self.wallClockCheckPeriod
+			if self.wallClockStarted is None:
+				self.wallClockStarted = time.time()
+				self.lastHeartbeat = (self.wallClockStarted, self.numEvents, self.now)
+			if self.wallClockBudgetExceeded:
+				return False
+		exhausted = False
+		while True:
+			# Immediate events are due now, but must still come after events
+			# scheduled earlier for the same time. Neither can be after until.
+			if immediateEvents:
+				entry = popBefore(immediateEvents[0])
+				if entry is None:
+					entry = immediateEvents.popleft()
+			else:
+				# Look before popping, so that events after until are left
+				# untouched in the queue
+				entry = peek()
+				if entry is None:
+					exhausted = True
+					break
+				if entry[0] > untilTime and entry[2] is not None:
+					self._advanceTo(until)
+					break
+				pop()
+			event = entry[2]
+			if event is None:
+				self.numCancelledEvents -= 1
+				continue
+			entry[2] = None # mark as triggered
+			if ticksPerSecond is None:
+				self.now = entry[0]
+			else:
+				self.nowTicks = entry[0]
+				self.now = entry[0] / ticksPerSecond
+			if whatToTime is not None and whatToTime.get(event) is entry:
+				del whatToTime[event]
+
+			args = entry[3]
+			if tracer is not None:
+				tracer.record(self.now, event, args)
+			if profiler is None:
+				event(*args)
+			else:
+				profiler.call(event, *args)
 			numEvents += 1
-		self.log(self, "Handled {0} events", numEvents)
+			if wallClockCheckPeriod is not None and numEvents % wallClockCheckPeriod == 0 \
+					and self._checkWallClock(until, self.numEvents + numEvents):
+				break
+			if predicate is not None and predicate():
+				break
+			if maxEvents is not None and numEvents >= maxEvents:
+				break
+
+		self.numEvents += numEvents
+		return exhausted
+
+	## Advance the simulation time, without triggering events
+	# @param until new simulation time, in seconds
+	def _advanceTo(self, until):
+		if self.ticksPerSecond is None:
+			self.now = float(until)
+		else:
+			self.nowTicks = int(round(until * self.ticksPerSecond))
+			self.now = self.nowTicks / self.ticksPerSecond
+
+	## Send heartbeats and enforce the wall-clock budget
+	# @param until time limit of the simulation
+	# @param numEvents number of events triggered so far
+	# @return True if the simulation has to stop
+	def _checkWallClock(self, until, numEvents):
+		wallNow = time.time()
+		if self.heartbeatInterval is not None and \
+				wallNow - self.lastHeartbeat[0] >= self.heartbeatInterval:
+			self.heartbeat(self._progress(until, numEvents, wallNow))
+			self.lastHeartbeat = (wallNow, numEvents, self.now)
+		if self.wallClockBudget is not None and \
+				wallNow - self.wallClockStarted >= self.wallClockBudget:
+			self.warning(self, "Wall-clock budget of {0}s exceeded, stopping after {1} events",
+				self.wallClockBudget, numEvents)
+			self.wallClockBudgetExceeded = True
+			return True
+		return False
+
+	## Measure the progress of the simulation since the last heartbeat
+	# @param until time limit of the simulation
+	# @param numEvents number of events triggered so far
+	# @param wallNow current wall-clock time
+	# @return Progress
+	def _progress(self, until, numEvents, wallNow):
+		lastWallTime, lastNumEvents, lastNow = self.lastHeartbeat
+		elapsed = max(wallNow - lastWallTime, 1e-9)
+		speedup = (self.now - lastNow) / elapsed
+		eta = float('nan')
+		if speedup > 0:
+			eta = (until - self.now) / speedup
+		return Progress(
+			now = self.now,
+			until = until,
+			numEvents = numEvents,
+			eventsPerSecond = (numEvents - lastNumEvents) / elapsed,
+			speedup = speedup,
+			pendingEvents = len(self.events) + len(self.immediateEvents) - \
+				self.numCancelledEvents,
+			rss = _residentSetSize(),
+			eta = eta)
+
+	## Report the progress of the simulation.
+	# Called every heartbeatInterval wall-clock seconds while the simulation
+	# runs. By default, logs the progress; can be overridden, e.g., by assigning
+	# a callable taking a Progress to the kernel's heartbeat attribute.
+	# @param progress Progress of the simulation
+	def heartbeat(self, progress):
+		self.log(self, "progress: {0:.1f}s of {1:.1f}s, {2} events, {3:.0f} events/s, " + \
+			"{4:.1f}x real-time, {5} pending events, RSS {6:.0f} MiB, ETA {7:.0f}s",
+			progress.now, progress.until, progress.numEvents, progress.eventsPerSecond,
+			progress.speedup, progress.pendingEvents, progress.rss / 2**20, progress.eta)
+		# Heartbeats are meant to be seen while the simulation runs
+		self.flushLog()
+
+	## Record a mark in the trace, if tracing is enabled.
+	# Marks are points in time that are not events, but which help to
+	# understand the trace, e.g., a request arriving at a server. Marks
+	# referring to a request are also recorded by the request tracer, if the
+	# request is sampled.
+	# @param issuer entity recording the mark
+	# @param name name of the mark
+	# @param request optional request that the mark refers to
+	def traceMark(self, issuer, name, request = None):
+		if self.tracer is not None:
+			self.tracer.mark(self.now, issuer, name, request)
+		if self.requestTracer is not None and request is not None:
+			self.requestTracer.stamp(self.now, issuer, name, request)
 
 	## Log a simulation message.
 	# This function is designed to simplify logging inside the simulator. It
@@ -78,31 +718,231 @@ class SimulatorKernel:
 	# @param issuer something that can be rendered as a string through str()
 	# @param message the message, first input to String.format
 	# @param *args,**kwargs additional arguments to pass to String.format
+	# @note Logs at INFO level.
+	# @see logAt()
 	def log(self, issuer, message, *args, **kwargs):
-		print("{0:.6f}".format(self.now), str(issuer), \
-			message.format(*args, **kwargs), file = sys.stderr)
+		if INFO >= self.minLogLevel:
+			self.logAt(INFO, issuer, message, *args, **kwargs)
+
+	## Log a simulation message at DEBUG level
+	# @see logAt()
+	def debug(self, issuer, message, *args, **kwargs):
+		if DEBUG >= self.minLogLevel:
+			self.logAt(DEBUG, issuer, message, *args, **kwargs)
+
+	## Log a simulation message at WARNING level
+	# @see logAt()
+	def warning(self, issuer, message, *args, **kwargs):
+		if WARNING >= self.minLogLevel:
+			self.logAt(WARNING, issuer, message, *args, **kwargs)
+
+	## Log a simulation message at a given level.
+	# The message is only formatted if it is logged, hence callers should pass
+	# arguments instead of formatting the message themselves. Records are
+	# buffered; they are written when the buffer is full, at the end of run(),
+	# and immediately for WARNING and above.
+	# @param level level of the message, one of LOG_LEVELS
+	# @param issuer something that can be rendered as a string through str()
+	# @param message the message, first input to String.format
+	# @param *args,**kwargs additional arguments to pass to String.format
+	def logAt(self, level, issuer, message, *args, **kwargs):
+		if level < self.minLogLevel:
+			return
+		if self.issuerLogLevels:
+			if level < self._issuerLogLevel(str(issuer)):
+				return
+		elif level < self.logLevel:
+			return
+
+		self.logBuffer.append("{0:.6f} {1} {2}\n".format(self.now, issuer,
+			message.format(*args, **kwargs)))
+		if level >= WARNING or len(self.logBuffer) >= self.logBufferSize:
+			self.flushLog()
+
+	## Set which messages to log
+	# @param level messages below this level are not logged
+	# @param issuer optional issuer name or shell-style pattern, e.g., "server*",
+	# to set the level for matching issuers only. Patterns set later take
+	# precedence.
+	def setLogLevel(self, level, issuer = None):
+		if issuer is None:
+			self.logLevel = level
+		else:
+			self.issuerLogLevels.append((issuer, level))
+		self.minLogLevel = min([ self.logLevel ] + \
+			[ issuerLevel for _, issuerLevel in self.issuerLogLevels ])
+		self.issuerLogLevelCache = {}
+
+	## Compute the log level of an issuer
+	# @param issuerName issuer rendered as a string
+	# @return level below which the issuer's messages are not logged
+	def _issuerLogLevel(self, issuerName):
+		level = self.issuerLogLevelCache.get(issuerName)
+		if level is None:
+			level = self.logLevel
+			for pattern, patternLevel in self.issuerLogLevels:
+				if fnmatch(issuerName, pattern):
+					level = patternLevel
+			self.issuerLogLevelCache[issuerName] = level
+		return level
+
+	## Write buffered log records to the log file
+	def flushLog(self):
+		logFile = self.logFile or sys.stderr
+		if self.logBuffer:
+			logFile.write(''.join(self.logBuffer))
+			self.logBuffer = []
+		logFile.flush()
 
 	## Output simulation data.
 	# This function is designed to simplify outputting metrics from a simulated
 	# entity. It prints the given line to a file, whose name is derived based on
 	# the issuer (currently "sim-{issuer}.csv").
-	# @param issuer something that can be rendered as a string through str()
-	# @param outputLine the line to output
+	# @param issuer something that can be rendered as a string through str(), or
+	# a name as bytes, see base.output.issuerName()
+	# @param outputLine the line to output, or a tuple of numbers, which are
+	# written as comma-separated values with 5 decimals, or in binary form,
+	# depending on the output format
 	# @note outputLine is written verbatimly to the output file, plus a newline
-	# is added.
+	# is added. Lines are buffered, and written according to the flush policy,
+	# or when run() returns. Formatting tuples of numbers is also deferred, so
+	# that it is done in batches.
+	# @note Tuples of numbers are also recorded in the metrics registry, if
+	# any, independently of output policies.
 	def output(self, issuer, outputLine):
-		if self.outputDirectory == None:
+		if self.outputWriter is None and self.metrics is None:
+			return
+		name = issuerName(issuer)
+		if self.metrics is not None and isinstance(outputLine, tuple):
+			self.metrics.record(name, outputLine)
+		if self.outputWriter is None:
 			return
-		if issuer not in self.outputFiles:
-			outputFilename = 'sim-' + str(issuer) + '.csv'
-			outputFilename = os.path.join(self.outputDirectory, outputFilename)
-			self.outputFiles[issuer] = open(outputFilename, 'w')
-		outputFile = self.outputFiles[issuer]
-		outputFile.write(outputLine + "\n")
+		if self.outputPolicyFactories and isinstance(outputLine, tuple):
+			policy = self._outputPolicy(name)
+			if policy is not None:
+				for row in policy.rows(outputLine):
+					self.outputWriter.write(name, row, self.now)
+				return
+		self.outputWriter.write(name, outputLine, self.now)
 
-		# kills performance, but reduces experimenter's impatience :D
-		outputFile.flush()
+	## Name the columns of the rows of numbers that an issuer outputs, so that
+	# they are recorded as named time series in the metrics registry
+	# @param issuer something that can be rendered as a string through str()
+	# @param columns column names, starting with the one of the time column
+	def describeOutput(self, issuer, columns):
+		if self.metrics is not None:
+			self.metrics.describe(issuerName(issuer), columns)
+
+	## Set the output policy of some issuers.
+	# A policy decides which rows of numbers output() writes, e.g., only some
+	# of them, or aggregates of them per period. Lines of text are always
+	# written. Policies must be set before the issuers output rows.
+	# @param policy callable creating the policy of a stream, e.g., as
+	# returned by base.output.outputPolicy(), None for writing all rows
+	# @param issuer pattern of issuer names, e.g., "*-rt"
+	# @note If several patterns match, the last one set applies.
+	def setOutputPolicy(self, policy, issuer = '*'):
+		self.outputPolicyFactories.append((issuer, policy))
+
+	## Get the output policy of an issuer, creating it on first use
+	# @param issuerName issuer rendered as a string
+	# @return policy, None for writing all rows
+	def _outputPolicy(self, issuerName):
+		try:
+			return self.outputPolicies[issuerName]
+		except KeyError:
+			factory = None
+			for pattern, patternFactory in self.outputPolicyFactories:
+				if fnmatch(issuerName, pattern):
+					factory = patternFactory
+			policy = self.outputPolicies[issuerName] = \
+				None if factory is None else factory()
+			return policy
+
+	## Write the rows of output policies for periods that ended
+	# @param finish whether the simulation is finished, i.e., whether to write
+	# the rows of periods that did not end yet
+	def _advanceOutputPolicies(self, finish = False):
+		if self.outputWriter is None:
+			return
+		for issuerName, policy in self.outputPolicies.items():
+			if policy is None:
+				continue
+			rows = policy.finish(self.now) if finish else policy.advance(self.now)
+			for row in rows:
+				self.outputWriter.write(issuerName, row, self.now)
+
+	## Close all output files, after writing buffered log records, output
+	# rows, including the rows of output policies for the current period, and
+	# marks of sampled requests.
+	# Calling output() afterwards reopens files, appending to them.
+	def close(self):
+		self.flushLog()
+		self._advanceOutputPolicies(finish = True)
+		if self.outputWriter is not None:
+			self.outputWriter.close()
+		if self.requestTracer is not None:
+			self.requestTracer.flush()
+
+	## Fork the simulation.
+	# Creates a child process which continues from the current state of the
+	# simulation, i.e., the kernel, all simulated entities and their random
+	# number generators, as a copy-on-write copy of this process. Hence, an
+	# expensive warm-up can be simulated once, then the child can be changed,
+	# e.g., use another load-balancing algorithm, and continue independently.
+	#
+	# The child writes its output to a new folder, in which output files
+	# written so far are copied, so that they are complete. The parent
+	# continues with its output untouched.
+	# @param outputDirectory folder where the child writes output files. None
+	# disables output files in the child
+	# @return like os.fork(): child process ID in the parent, 0 in the child
+	# @note The child should terminate with os._exit(), after calling close().
+	def fork(self, outputDirectory):
+		# Copy in the parent, so that the child does not see parent's output
+		# written after the fork
+		if self.outputWriter is not None:
+			self.outputWriter.flush()
+			if outputDirectory is not None:
+				self.outputWriter.copyTo(outputDirectory)
+		if self.requestTracer is not None and outputDirectory is not None:
+			self.requestTracer.copyTo(outputDirectory)
+		# Otherwise, buffered log records would be written by both processes
+		self.flushLog()
+		sys.stdout.flush()
+		sys.stderr.flush()
+
+		pid = os.fork()
+		if pid == 0:
+			# Output policies are not finished, the child continues them
+			if self.outputWriter is not None:
+				self.outputWriter.close()
+			self.outputDirectory = outputDirectory
+			if outputDirectory is None:
+				self.outputWriter = None
+			elif self.outputWriter is not None:
+				# Continue the copied files
+				self.outputWriter.outputDirectory = outputDirectory
+			if outputDirectory is None:
+				self.requestTracer = None
+				self.tracing = self.tracer is not None
+			elif self.requestTracer is not None:
+				self.requestTracer.outputDirectory = outputDirectory
+		return pid
 
 	## Pretty-print the simulator kernel's name
 	def __str__(self):
 		return "kernel"
+
+## Resident set size of the current process
+# @return size in bytes; on systems without /proc, the peak size
+def _residentSetSize():
+	try:
+		with open('/proc/self/statm') as statm:
+			return int(statm.read().split()[1]) * resource.getpagesize()
+	except (IOError, OSError):
+		# ru_maxrss is in bytes on Mac OS X, in kilobytes elsewhere
+		maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		if sys.platform == 'darwin':
+			return maxrss
+		return maxrss * 1024
@@ -63,7 +63,7 @@ def test_update_event():
 
 	eventsExecuted = []
 
-	sim = SimulatorKernel()
+	sim = SimulatorKernel(updatableEvents = True)
 	sim.add(0, toRun)
 	# The above assertion WOULD fail, so add an event to update it
 	sim.update(100, toRun)
@@ -71,6 +71,17 @@ def test_update_event():
 
 	assert eventsExecuted == [ 100 ], eventsExecuted
 
+def test_update_requires_opt_in():
+	sim = SimulatorKernel(outputDirectory = None)
+	sim.add(0, lambda: None)
+	assert sim.whatToTime is None
+	try:
+		sim.update(100, lambda: None)
+	except RuntimeError:
+		pass
+	else:
+		assert False, "update() should require updatableEvents"
+
 def test_output():
 	import base64
 	import os
@@ -79,9 +90,10 @@ def test_output():
 	sim = SimulatorKernel()
 	sim.output(issuer, "hello")
 	sim.output(issuer, "world")
+	sim.close()
 
 	expected = "hello\nworld\n"
-	resultFileName = 'sim-' + issuer + '.csv'
+	resultFileName = 'sim-' + issuer.decode() + '.csv'
 	result = open(resultFileName).read()
 	os.remove(resultFileName)
 	
@@ -95,3 +107,381 @@ def test_no_output():
 
 	# No calls to output methods should have been made
 	assert not m.mock_calls, m.mock_calls
+
+def test_same_time_events_are_fifo():
+	eventsExecuted = []
+
+	sim = SimulatorKernel(outputDirectory = None)
+	for mark in range(0, 20):
+		sim.add(10, lambda mark = mark: eventsExecuted.append(mark))
+	sim.add(5, lambda: sim.add(5, lambda: eventsExecuted.append('late')))
+	sim.run()
+
+	assert eventsExecuted == list(range(0, 20)) + [ 'late' ], eventsExecuted
+
+def test_add_many():
+	eventsExecuted = []
+
+	sim = SimulatorKernel(outputDirectory = None)
+	sim.add(10, lambda: eventsExecuted.append('before'))
+	handles = sim.addMany([ (delay, lambda mark = mark: eventsExecuted.append(mark)) \
+		for mark, delay in enumerate([ 10, 0, 5, 10, 0 ]) ])
+	sim.add(10, lambda: eventsExecuted.append('after'))
+	sim.cancel(handles[2])
+	sim.run()
+
+	# Same order as if added one by one
+	assert eventsExecuted == [ 1, 4, 'before', 0, 3, 'after' ], eventsExecuted
+
+def test_add_with_arguments():
+	def mark(value = 'updated'):
+		eventsExecuted.append(value)
+
+	eventsExecuted = []
+
+	sim = SimulatorKernel(outputDirectory = None, updatableEvents = True)
+	sim.add(10, mark, 'first')
+	sim.add(0, mark, 'immediate')
+	sim.addMany([ (10, mark, 'second'), (20, mark, 'third') ])
+	# Events with arguments are not replaced by update()
+	sim.update(15, mark)
+	sim.run()
+
+	assert eventsExecuted == [ 'immediate', 'first', 'second', 'updated', 'third' ], \
+		eventsExecuted
+
+def test_cancel_event():
+	eventsExecuted = []
+
+	sim = SimulatorKernel(outputDirectory = None)
+	handle = sim.add(100, lambda: eventsExecuted.append('cancelled'))
+	sim.add(50, lambda: eventsExecuted.append('kept'))
+	sim.cancel(handle)
+	sim.cancel(handle) # cancelling twice has no effect
+	sim.run()
+
+	assert eventsExecuted == [ 'kept' ], eventsExecuted
+	assert sim.numCancelledEvents == 0
+
+def test_cancel_compacts_queue():
+	sim = SimulatorKernel(outputDirectory = None)
+	handles = [ sim.add(i, lambda: None) for i in range(0, 1000) ]
+	for handle in handles[:900]:
+		sim.cancel(handle)
+
+	assert len(sim.events) < 500, len(sim.events)
+	assert len(sim.events) - sim.numCancelledEvents == 100
+
+def test_immediate_events_after_same_time_events():
+	eventsExecuted = []
+
+	sim = SimulatorKernel(outputDirectory = None)
+	sim.add(5, lambda: sim.add(0, lambda: eventsExecuted.append('immediate')))
+	sim.add(5, lambda: eventsExecuted.append('scheduled'))
+	sim.add(0, lambda: eventsExecuted.append('start'))
+	sim.run()
+
+	assert eventsExecuted == [ 'start', 'scheduled', 'immediate' ], eventsExecuted
+	assert sim.now == 5
+
+def check_event_queue(eventQueue, immediateLane = True):
+	import random
+
+	def runRandomly(sim, rng, eventsExecuted):
+		eventsExecuted.append(sim.now)
+		delay = rng.choice([ 0, 0.01, rng.expovariate(1.0), 100 ])
+		sim.add(delay, lambda: runRandomly(sim, rng, eventsExecuted))
+
+	eventsExecuted = []
+	sim = SimulatorKernel(outputDirectory = None, eventQueue = eventQueue,
+		immediateLane = immediateLane)
+	for i in range(0, 20):
+		runRandomly(sim, random.Random(i), eventsExecuted)
+	sim.run(until = 1000)
+
+	return eventsExecuted
+
+def test_event_queues():
+	expected = check_event_queue('heap')
+	assert len(expected) > 500, len(expected)
+	for eventQueue in [ 'calendar', 'wheel' ]:
+		assert check_event_queue(eventQueue) == expected, eventQueue
+
+def test_without_immediate_lane():
+	expected = check_event_queue('heap')
+	for eventQueue in [ 'heap', 'calendar', 'wheel' ]:
+		assert check_event_queue(eventQueue, immediateLane = False) == expected, eventQueue
+
+def check_resumed_runs(eventQueue):
+	import random
+
+	rng = random.Random(1)
+	eventsExecuted = []
+	sim = SimulatorKernel(outputDirectory = None, eventQueue = eventQueue)
+	until = 0
+	for i in range(0, 200):
+		# Add events from outside the simulation, between runs
+		for j in range(0, rng.randint(0, 5)):
+			name = (i, j)
+			sim.add(rng.choice([ 0, 0.5, rng.expovariate(0.2), 50 ]),
+				lambda name = name: eventsExecuted.append((name, sim.now)))
+		until += rng.expovariate(0.5)
+		sim.run(until = until)
+	sim.run(until = float('inf'))
+
+	times = [ time for _, time in eventsExecuted ]
+	assert times == sorted(times), eventQueue
+	return eventsExecuted
+
+def test_event_queues_resumed_runs():
+	expected = check_resumed_runs('heap')
+	assert len(expected) > 400, len(expected)
+	for eventQueue in [ 'calendar', 'wheel' ]:
+		assert check_resumed_runs(eventQueue) == expected, eventQueue
+
+def test_event_queues_add_between_runs():
+	for eventQueue in [ 'heap', 'calendar', 'wheel' ]:
+		eventsExecuted = []
+		sim = SimulatorKernel(outputDirectory = None, eventQueue = eventQueue)
+		sim.add(15, lambda: eventsExecuted.append(('late', sim.now)))
+		sim.add(1, lambda: eventsExecuted.append(('early', sim.now)))
+		sim.run(until = 10)
+		sim.add(2, lambda: eventsExecuted.append(('added', sim.now)))
+		sim.run(until = 20)
+		assert eventsExecuted == [ ('early', 1), ('added', 12), ('late', 15) ], \
+			(eventQueue, eventsExecuted)
+
+def test_run_until_leaves_queue_untouched():
+	for eventQueue in [ 'heap', 'calendar', 'wheel' ]:
+		sim = SimulatorKernel(outputDirectory = None, eventQueue = eventQueue)
+		handle = sim.add(15, lambda: None)
+		sim.run(until = 10)
+		assert sim.now == 10.0 and type(sim.now) is float, sim.now
+		assert sim.events.peek() is handle
+		assert len(sim.events) == 1
+
+def check_integer_clock(clockResolution):
+	eventsExecuted = []
+
+	sim = SimulatorKernel(outputDirectory = None, clockResolution = clockResolution)
+	sim.add(0.1, lambda: sim.add(0.2, lambda: eventsExecuted.append(('a', sim.now))))
+	sim.add(0.15, lambda: sim.add(0.15, lambda: eventsExecuted.append(('b', sim.now))))
+	sim.run()
+
+	return eventsExecuted
+
+def test_integer_clock():
+	# With a float clock, 0.1 + 0.2 > 0.15 + 0.15
+	assert check_integer_clock(None) == [ ('b', 0.3), ('a', 0.1 + 0.2) ]
+	# With an integer clock, both coincide and are triggered in FIFO order
+	assert check_integer_clock(1e-9) == [ ('a', 0.3), ('b', 0.3) ]
+
+def test_integer_clock_event_queues():
+	for eventQueue in [ 'calendar', 'wheel' ]:
+		sim = SimulatorKernel(outputDirectory = None, eventQueue = eventQueue,
+			clockResolution = 1e-6)
+		sim.add(1.5, lambda: sim.add(0.5, lambda: None))
+		sim.run()
+		assert sim.now == 2.0, sim.now
+		assert sim.nowTicks == 2000000, sim.nowTicks
+
+def test_integer_clock_run_until():
+	sim = SimulatorKernel(outputDirectory = None, clockResolution = 0.001)
+	sim.add(2, lambda: None)
+	# 1.001 * 1000 is slightly below 1001, the time limit must not be truncated
+	sim.run(until = 1.001)
+	assert sim.nowTicks == 1001, sim.nowTicks
+	assert sim.now == 1.001, sim.now
+
+def test_resume_run():
+	def runPeriodically(sim, period, eventsExecuted):
+		assertShouldRunPeriodically(sim, period, eventsExecuted)
+		sim.add(period, lambda: runPeriodically(sim, period, eventsExecuted))
+
+	eventsExecuted = []
+	sim = SimulatorKernel(outputDirectory = None)
+	runPeriodically(sim, 100, eventsExecuted)
+	sim.run(until = 450)
+	assert sim.now == 450, sim.now
+	sim.runFor(550)
+	assert sim.now == 1000, sim.now
+
+	assert eventsExecuted == list(range(0, 1001, 100)), eventsExecuted
+
+def test_step():
+	eventsExecuted = []
+
+	sim = SimulatorKernel(outputDirectory = None)
+	sim.add(100, lambda: assertShouldRunAt(sim, 100, eventsExecuted))
+	sim.add(200, lambda: assertShouldRunAt(sim, 200, eventsExecuted))
+
+	assert sim.step()
+	assert eventsExecuted == [ 100 ], eventsExecuted
+	assert sim.step()
+	assert eventsExecuted == [ 100, 200 ], eventsExecuted
+	assert not sim.step()
+	assert sim.now == 200
+
+def test_run_until_predicate():
+	eventsExecuted = []
+
+	sim = SimulatorKernel(outputDirectory = None)
+	for i in range(1, 10):
+		sim.add(i, lambda: eventsExecuted.append(sim.now))
+
+	assert sim.runUntil(lambda: len(eventsExecuted) == 3)
+	assert sim.now == 3, sim.now
+	assert not sim.runUntil(lambda: len(eventsExecuted) == 100, until = 5)
+	assert sim.now == 5, sim.now
+	assert not sim.runUntil(lambda: len(eventsExecuted) == 100)
+	assert eventsExecuted == list(range(1, 10)), eventsExecuted
+
+def test_fork():
+	import os
+	import shutil
+	import tempfile
+
+	def runPeriodically(sim, period):
+		sim.output('periodic', str(sim.now))
+		sim.add(period, lambda: runPeriodically(sim, period))
+
+	parentDirectory = tempfile.mkdtemp()
+	childDirectory = tempfile.mkdtemp()
+	try:
+		sim = SimulatorKernel(outputDirectory = parentDirectory)
+		runPeriodically(sim, 1)
+		sim.run(until = 3)
+
+		pid = sim.fork(childDirectory)
+		if pid == 0:
+			exitCode = 1
+			try:
+				sim.output('periodic', 'child')
+				sim.run(until = 5)
+				sim.close()
+				exitCode = 0
+			finally:
+				os._exit(exitCode)
+
+		_, status = os.waitpid(pid, 0)
+		assert status == 0, status
+
+		sim.run(until = 4)
+		sim.close()
+
+		parentOutput = open(os.path.join(parentDirectory, 'sim-periodic.csv')).read()
+		childOutput = open(os.path.join(childDirectory, 'sim-periodic.csv')).read()
+	finally:
+		shutil.rmtree(parentDirectory)
+		shutil.rmtree(childDirectory)
+
+	assert parentOutput == "0.0\n1.0\n2.0\n3.0\n4.0\n", parentOutput
+	assert childOutput == "0.0\n1.0\n2.0\n3.0\nchild\n4.0\n5.0\n", childOutput
+
+def test_heartbeat():
+	sim = SimulatorKernel(outputDirectory = None, heartbeatInterval = 0)
+	sim.wallClockCheckPeriod = 10
+	progresses = []
+	sim.heartbeat = progresses.append
+	def tick():
+		sim.add(1, tick)
+	sim.add(1, tick)
+	sim.run(until = 100)
+
+	assert len(progresses) == 10, progresses
+	assert [ progress.numEvents for progress in progresses ] == list(range(10, 101, 10))
+	assert progresses[-1].now == 100
+	assert progresses[-1].until == 100
+	assert progresses[-1].pendingEvents == 1
+	assert progresses[-1].rss > 0
+
+	# Default heartbeat only logs
+	del sim.heartbeat
+	sim.run(until = 110)
+
+def test_wall_clock_budget():
+	sim = SimulatorKernel(outputDirectory = None, wallClockBudget = 0)
+	sim.wallClockCheckPeriod = 10
+	def tick():
+		sim.add(1, tick)
+	sim.add(1, tick)
+	sim.run(until = 100)
+	assert sim.wallClockBudgetExceeded
+	assert sim.numEvents == 10, sim.numEvents
+	assert sim.now == 10
+
+	sim.run(until = 200)
+	assert sim.numEvents == 10, sim.numEvents
+
+def test_every():
+	sim = SimulatorKernel(outputDirectory = None)
+	eventsExecuted = []
+	sim.every(1, lambda: eventsExecuted.append(('a', sim.now)))
+	sim.every(1, lambda: eventsExecuted.append(('b', sim.now)))
+	sim.every(0.5, lambda: eventsExecuted.append(('c', sim.now)), delay = 0)
+	sim.run(until = 2)
+
+	assert eventsExecuted == [ ('c', 0), ('c', 0.5),
+		('a', 1), ('b', 1), ('c', 1), ('c', 1.5),
+		('a', 2), ('b', 2), ('c', 2) ], eventsExecuted
+	# All subscribers of the same period share one event
+	assert sim.numEvents == 7, sim.numEvents
+
+def test_every_merge_and_cancel():
+	sim = SimulatorKernel(outputDirectory = None)
+	eventsExecuted = []
+	handle = sim.every(1, lambda: eventsExecuted.append(('a', sim.now)))
+	sim.add(0.5, lambda: sim.every(1, lambda: eventsExecuted.append(('b', sim.now)), delay = 1.5))
+	sim.add(2.5, lambda: sim.cancel(handle))
+	sim.run(until = 4)
+
+	# b was scheduled for time 2 before a, hence triggers first, like with add()
+	assert eventsExecuted == [ ('a', 1), ('b', 2), ('a', 2), ('b', 3), ('b', 4) ], \
+		eventsExecuted
+
+def test_suspend_resume():
+	sim = SimulatorKernel(outputDirectory = None)
+	eventsExecuted = []
+	handle = sim.every(1, lambda: eventsExecuted.append(('tick', sim.now)))
+	sim.add(1.5, lambda: sim.suspend(handle,
+		lambda time: eventsExecuted.append(('backfill', time))))
+	sim.add(4, lambda: sim.resume(handle))
+	sim.add(4.5, lambda: sim.suspend(handle))
+	sim.add(5.5, lambda: sim.resume(handle))
+	sim.add(6.5, lambda: sim.suspend(handle,
+		lambda time: eventsExecuted.append(('backfill', time))))
+	sim.run(until = 9)
+
+	assert eventsExecuted == [ ('tick', 1),
+		('backfill', 2), ('backfill', 3), ('backfill', 4), # on resume
+		# tick at 5 skipped without backfill callback
+		('tick', 6),
+		('backfill', 7), ('backfill', 8), ('backfill', 9) # at end of run
+		], eventsExecuted
+	# The ticker is not scheduled while suspended
+	assert sim.numEvents == 5 + 2, sim.numEvents
+
+def test_log_levels():
+	from StringIO import StringIO
+	from kernel import DEBUG, WARNING
+
+	class Unprintable:
+		def __str__(self):
+			assert False, "Message should not have been formatted"
+
+	sim = SimulatorKernel(outputDirectory = None)
+	sim.logFile = StringIO()
+	sim.setLogLevel(WARNING)
+	sim.setLogLevel(DEBUG, 'server*')
+
+	sim.log('lb', "not logged {0}", Unprintable())
+	sim.debug('server1', "logged {0}", 1)
+	sim.warning('lb', "logged {0}", 2)
+	sim.debug('lb', "not logged {0}", Unprintable())
+	sim.log('server2', "logged {0}", 3)
+
+	# Info messages are buffered until a warning or the end of the run
+	assert sim.logFile.getvalue().splitlines() == [
+		'0.000000 server1 logged 1', '0.000000 lb logged 2' ], sim.logFile.getvalue()
+	sim.run()
+	assert sim.logFile.getvalue().splitlines()[2] == '0.000000 server2 logged 3'
@@ -0,0 +1,141 @@
+from __future__ import division
+
+from array import array
+from bisect import bisect_left
+
+## @package base.metrics In-memory metrics of the simulation kernel.
+# Entities output rows of numbers through SimulatorKernel.output(), whose first
+# column is the simulation time. Besides being written to files, these rows can
+# be recorded in a metrics registry, which splits them into named time series
+# kept in memory, so that they can be queried while the simulation runs, e.g.,
+# by parameter-search code, without reading output files.
+
+## Time series of (time, value) samples, kept in a fixed-size ring buffer.
+# Once the ring buffer is full, the oldest samples are overwritten.
+class TimeSeries(object):
+	## Constructor
+	# @param capacity number of samples to keep
+	def __init__(self, capacity):
+		## number of samples to keep
+		self.capacity = capacity
+		## ring buffer of sample times
+		self.times = array('d', [ 0.0 ]) * capacity
+		## ring buffer of sample values
+		self.values = array('d', [ 0.0 ]) * capacity
+		## number of samples appended so far, including overwritten ones
+		self.numSamples = 0
+
+	## Append a sample
+	# @param time simulation time of the sample
+	# @param value value of the sample
+	def append(self, time, value):
+		index = self.numSamples % self.capacity
+		self.times[index] = time
+		self.values[index] = value
+		self.numSamples += 1
+
+	## Number of samples kept
+	def __len__(self):
+		return min(self.numSamples, self.capacity)
+
+	## Get the samples kept, oldest first
+	# @param since if not None, only return samples taken at this time or later
+	# @return list of (time, value) pairs
+	# @note Samples are assumed to be appended in order of time.
+	def samples(self, since = None):
+		start = self.numSamples % self.capacity if self.numSamples > self.capacity else 0
+		times = self.times[start:len(self)] + self.times[:start]
+		values = self.values[start:len(self)] + self.values[:start]
+		first = 0 if since is None else bisect_left(times, since)
+		return list(zip(times[first:], values[first:]))
+
+	## Get the latest sample
+	# @return (time, value) pair, None if no sample was appended
+	def last(self):
+		if self.numSamples == 0:
+			return None
+		index = (self.numSamples - 1) % self.capacity
+		return self.times[index], self.values[index]
+
+## Registry of the time series of all issuers.
+# A row (time, value1, value2, ...) output by an issuer appends a sample to
+# one time series for each value column. Series are identified by the issuer
+# name and a column name, as described by the issuer, or the column index,
+# e.g., "2", for columns that were not described.
+class MetricsRegistry(object):
+	## Constructor
+	# @param capacity number of samples to keep in each time series
+	def __init__(self, capacity = 4096):
+		## number of samples to keep in each time series
+		self.capacity = capacity
+		## time series, by (issuer name, column name)
+		self.series = {}
+		## column names, by issuer name
+		self.columns = {}
+		## time series of the value columns of rows, by issuer name
+		self.issuerSeries = {}
+
+	## Name the columns of the rows output by an issuer.
+	# Can be called again, e.g., when an issuer changes the width of its rows,
+	# in which case later rows are recorded according to the new names.
+	# @param issuer issuer name
+	# @param columns column names, including the one of the time column
+	def describe(self, issuer, columns):
+		columns = tuple(columns)
+		if self.columns.get(issuer) != columns:
+			self.columns[issuer] = columns
+			self.issuerSeries.pop(issuer, None)
+
+	## Record a row of numbers
+	# @param issuer issuer name
+	# @param row tuple of numbers, whose first one is the simulation time
+	def record(self, issuer, row):
+		issuerSeries = self.issuerSeries.get(issuer)
+		if issuerSeries is None or len(issuerSeries) != len(row) - 1:
+			issuerSeries = self._describeSeries(issuer, len(row))
+		time = row[0]
+		for series, value in zip(issuerSeries, row[1:]):
+			series.append(time, value)
+
+	## Get the time series of the value columns of an issuer, creating them
+	# @param issuer issuer name
+	# @param width number of columns of rows, including the time column
+	# @return list of time series
+	def _describeSeries(self, issuer, width):
+		columns = self.columns.get(issuer, ())
+		issuerSeries = []
+		for index in range(1, width):
+			column = columns[index] if index < len(columns) else str(index)
+			series = self.series.get((issuer, column))
+			if series is None:
+				series = self.series[issuer, column] = TimeSeries(self.capacity)
+			issuerSeries.append(series)
+		self.issuerSeries[issuer] = issuerSeries
+		return issuerSeries
+
+	## Get the samples of a time series
+	# @param issuer something that can be rendered as a string through str()
+	# @param column column name
+	# @param since if not None, only return samples taken at this time or later
+	# @return list of (time, value) pairs, oldest first; empty if nothing was
+	# recorded in this series
+	def query(self, issuer, column, since = None):
+		series = self.series.get((str(issuer), column))
+		if series is None:
+			return []
+		return series.samples(since)
+
+	## Get the latest sample of a time series
+	# @param issuer something that can be rendered as a string through str()
+	# @param column column name
+	# @return (time, value) pair, None if nothing was recorded in this series
+	def last(self, issuer, column):
+		series = self.series.get((str(issuer), column))
+		if series is None:
+			return None
+		return series.last()
+
+	## Get the names of all time series
+	# @return sorted list of (issuer name, column name) pairs
+	def names(self):
+		return sorted(self.series)
@@ -0,0 +1,58 @@
+from __future__ import print_function
+
+from kernel import SimulatorKernel
+from metrics import MetricsRegistry, TimeSeries
+
+def test_time_series():
+	series = TimeSeries(capacity = 3)
+	assert series.last() is None
+	assert series.samples() == []
+
+	for i in range(0, 5):
+		series.append(i, i * 0.5)
+	assert len(series) == 3
+	assert series.samples() == [ (2, 1.0), (3, 1.5), (4, 2.0) ]
+	assert series.samples(since = 3) == [ (3, 1.5), (4, 2.0) ]
+	assert series.last() == (4, 2.0)
+
+def test_registry():
+	metrics = MetricsRegistry(capacity = 2)
+	metrics.describe('server1', ('time', 'latency', 'utilization'))
+	metrics.record('server1', (1, 0.5, 0.25))
+	metrics.record('server1', (2, 0.75, 0.5))
+	metrics.record('server1', (3, 1.0, 1.0))
+	assert metrics.query('server1', 'latency') == [ (2, 0.75), (3, 1.0) ]
+	assert metrics.last('server1', 'utilization') == (3, 1.0)
+	assert metrics.query('server1', 'unknown') == []
+	assert metrics.last('server2', 'latency') is None
+
+	# Columns that were not described are named by index
+	metrics.record('lb', (1, 10, 20))
+	assert metrics.names() == [ ('lb', '1'), ('lb', '2'),
+		('server1', 'latency'), ('server1', 'utilization') ]
+
+	# Series are continued when columns move
+	metrics.describe('lb', ('time', 'weight-b', 'weight-a'))
+	metrics.record('lb', (2, 0.25, 0.75))
+	metrics.describe('lb', ('time', 'weight-a'))
+	metrics.record('lb', (3, 1.0))
+	assert metrics.query('lb', 'weight-a') == [ (2, 0.75), (3, 1.0) ]
+	assert metrics.query('lb', 'weight-b') == [ (2, 0.25) ]
+
+def test_registry_in_kernel():
+	metrics = MetricsRegistry()
+	sim = SimulatorKernel(outputDirectory = None, metrics = metrics)
+	sim.describeOutput('server1-arl', ('time', 'queueLength'))
+
+	def runPeriodically():
+		sim.output('server1-arl', (sim.now, sim.now * 2))
+		sim.output('final-results', 'not a row')
+		sim.add(1, runPeriodically)
+	runPeriodically()
+
+	# Series can be queried while the simulation runs
+	sim.run(until = 1)
+	assert metrics.query('server1-arl', 'queueLength') == [ (0, 0), (1, 2) ]
+	sim.run(until = 2)
+	assert metrics.last('server1-arl', 'queueLength') == (2, 4)
+	assert metrics.names() == [ ('server1-arl', 'queueLength') ]
@@ -0,0 +1,738 @@
+from __future__ import division
+
+from array import array
+from bisect import bisect_right
+from functools import partial
+import os
+import shutil
+import struct
+import sys
+import threading
+try:
+	from queue import Queue
+except ImportError: # pragma: no cover
+	from Queue import Queue
+
+## @package base.output Output writers for the simulation kernel.
+# A writer receives rows of simulation data, each tagged with the issuer that
+# produced it, and stores them in the files of an output directory. Rows are
+# either lines of text, written verbatim, or tuples of numbers.
+#
+# Rows are buffered and written in batches, according to a flush policy:
+# <ul>
+#   <li>'line', to write and flush each row as soon as it is output, e.g., to
+#     tail files while the simulation runs;</li>
+#   <li>'size', to write buffered rows once there are bufferSize of them;</li>
+#   <li>'time', to write buffered rows once the simulation time advanced by
+#     flushInterval seconds since they were last written.</li>
+# </ul>
+# With all policies, buffered rows are written by flush() and close().
+
+## Names of flush policies
+FLUSH_POLICIES = ('line', 'size', 'time')
+
+## Format rows as CSV
+# @param rows lines or tuples of numbers; numbers are written with 5 decimals
+# @param formats cache of format strings of rows of numbers, by number of
+# values
+# @return text, with a newline after each row
+def formatRows(rows, formats):
+	lines = []
+	for row in rows:
+		if isinstance(row, tuple):
+			rowFormat = formats.get(len(row))
+			if rowFormat is None:
+				rowFormat = formats[len(row)] = \
+					','.join([ '{' + str(i) + ':.5f}' for i in range(len(row)) ]) + '\n'
+			lines.append(rowFormat.format(*row))
+		else:
+			lines.append(row + '\n')
+	return ''.join(lines)
+
+## Compute the name under which an issuer's rows are written, which names
+# its output files
+# @param issuer something that can be rendered as a string through str(), or
+# a name as bytes, e.g., as returned by base64 functions under Python 3
+# @return name, as a string
+def issuerName(issuer):
+	if isinstance(issuer, bytes):
+		return issuer.decode('utf-8')
+	return str(issuer)
+
+## Compute the name of a .npy file written by NpyOutputWriter
+# @param issuer name of the issuer
+# @param part part of the output of the issuer
+# @param column index of the column
+# @return file name, relative to the output directory
+def npyFilename(issuer, part, column):
+	if part == 0:
+		return 'sim-{0}.c{1}.npy'.format(issuer, column)
+	return 'sim-{0}.{1}.c{2}.npy'.format(issuer, part, column)
+
+## Memory-map the output of an issuer written by NpyOutputWriter
+# @param outputDirectory folder in which the output was written
+# @param issuer name of the issuer
+# @return list with, for each part of the output, the list of its columns,
+# as read-only 1-D arrays
+def loadNpyOutput(outputDirectory, issuer):
+	import numpy as np
+
+	parts = []
+	part = 0
+	while True:
+		columns = []
+		while True:
+			filename = os.path.join(outputDirectory,
+				npyFilename(issuer, part, len(columns)))
+			if not os.path.exists(filename):
+				break
+			columns.append(np.load(filename, mmap_mode = 'r'))
+		if not columns:
+			return parts
+		parts.append(columns)
+		part += 1
+
+## Writes the rows of each issuer to a CSV file, named "sim-{issuer}.csv".
+# Tuples of numbers are written as comma-separated values with 5 decimals.
+class CsvOutputWriter(object):
+	## Constructor
+	# @param outputDirectory folder in which to write files
+	# @param flushPolicy when to write buffered rows, one of FLUSH_POLICIES
+	# @param bufferSize number of buffered rows, over all issuers, after which
+	# they are written with the 'size' policy
+	# @param flushInterval simulation seconds after which buffered rows are
+	# written with the 'time' policy
+	def __init__(self, outputDirectory, flushPolicy = 'size', bufferSize = 8192,
+			flushInterval = 10.0):
+		if flushPolicy not in FLUSH_POLICIES:
+			raise ValueError("Unknown flush policy '{0}'".format(flushPolicy))
+		## folder in which files are written
+		self.outputDirectory = outputDirectory
+		## when to write buffered rows
+		self.flushPolicy = flushPolicy
+		## number of buffered rows after which they are written ('size' policy)
+		self.bufferSize = bufferSize
+		## simulation seconds after which buffered rows are written ('time' policy)
+		self.flushInterval = flushInterval
+		## open files, by file name relative to the output directory
+		self.files = {}
+		## names of files created so far, relative to the output directory;
+		# they are appended to when reopened
+		self.filenames = set()
+		## buffered rows, by issuer name
+		self.buffers = {}
+		## number of buffered rows, over all issuers
+		self.numBufferedRows = 0
+		## simulation time at which buffered rows were last written
+		self.lastFlushTime = 0.0
+		## format strings of rows of numbers, by number of values
+		self.formats = {}
+
+	## Output a row
+	# Rows are buffered, then written if the flush policy says so. Formatting
+	# tuples of numbers is deferred until rows are written, so that rows are
+	# formatted in batches.
+	# @param issuer name of the issuer
+	# @param row line to output, without newline, or tuple of numbers
+	# @param now current simulation time, in seconds
+	def write(self, issuer, row, now):
+		flushPolicy = self.flushPolicy
+		if flushPolicy == 'line':
+			# Nothing else is buffered, only the issuer's files need flushing
+			for outputFile in self._writeRows(issuer, [ row ]):
+				outputFile.flush()
+			self.lastFlushTime = now
+			return
+
+		buffer = self.buffers.get(issuer)
+		if buffer is None:
+			buffer = self.buffers[issuer] = []
+		buffer.append(row)
+		self.numBufferedRows += 1
+
+		if flushPolicy == 'size':
+			if self.numBufferedRows >= self.bufferSize:
+				self.flush(now)
+		elif now - self.lastFlushTime >= self.flushInterval:
+			self.flush(now)
+
+	## Write all buffered rows, and flush files
+	# @param now current simulation time, in seconds, if known
+	def flush(self, now = None):
+		for issuer, rows in self.buffers.items():
+			self._writeRows(issuer, rows)
+		for outputFile in self.files.values():
+			outputFile.flush()
+		self.buffers = {}
+		self.numBufferedRows = 0
+		if now is not None:
+			self.lastFlushTime = now
+
+	## Write rows of an issuer to its file
+	# @param issuer name of the issuer
+	# @param rows lines or tuples of numbers
+	# @return list of the files written to
+	def _writeRows(self, issuer, rows):
+		outputFile = self._file('sim-' + issuer + '.csv')
+		outputFile.write(formatRows(rows, self.formats))
+		return [ outputFile ]
+
+	## Get an open file, opening it if needed
+	# @param filename name of the file, relative to the output directory
+	# @param binary whether to open the file in binary mode, for reading and
+	# writing
+	# @return file object
+	def _file(self, filename, binary = False):
+		outputFile = self.files.get(filename)
+		if outputFile is None:
+			# Files closed earlier, e.g., at the end of run(), are continued
+			if binary:
+				mode = 'r+b' if filename in self.filenames else 'w+b'
+			else:
+				mode = 'a' if filename in self.filenames else 'w'
+			outputFile = open(os.path.join(self.outputDirectory, filename), mode)
+			self.files[filename] = outputFile
+			self.filenames.add(filename)
+		return outputFile
+
+	## Copy the files written so far to another folder, e.g., before forking
+	# @param outputDirectory destination folder
+	def copyTo(self, outputDirectory):
+		self.flush()
+		for filename in self.filenames:
+			shutil.copyfile(os.path.join(self.outputDirectory, filename),
+				os.path.join(outputDirectory, filename))
+
+	## Write all buffered rows and close all files.
+	# Outputting rows afterwards reopens files, appending to them.
+	def close(self):
+		self.flush()
+		for outputFile in self.files.values():
+			outputFile.close()
+		self.files = {}
+
+## Writes the rows of numbers of each issuer column by column, to one NumPy
+# .npy file per column, named "sim-{issuer}.c{column}.npy", which analysis
+# can memory-map, e.g., with loadNpyOutput().
+#
+# Each file holds a 1-D array of 64-bit floats, with one value per output
+# row. The number of columns of an issuer is fixed by its first row. If it
+# changes, e.g., because the load-balancer got a new backend, the following
+# rows go to a new part, "sim-{issuer}.1.c{column}.npy",
+# "sim-{issuer}.2.c{column}.npy", etc. Buffered rows are appended to a typed
+# array, each column of which is written to its file in one go, then the
+# shape in the file header is updated; no number is ever formatted as text.
+#
+# Lines of text, e.g., final results, are written to CSV files, as by
+# CsvOutputWriter.
+class NpyOutputWriter(CsvOutputWriter):
+	## Size of the header of .npy files, including the magic string, in bytes.
+	# It fits any shape, so that the header can be rewritten in place.
+	HEADER_SIZE = 128
+
+	## Constructor
+	# @see CsvOutputWriter.__init__()
+	def __init__(self, outputDirectory, **kwargs):
+		CsvOutputWriter.__init__(self, outputDirectory, **kwargs)
+		## for each issuer, a [part, number of columns, number of rows] list
+		# describing the .npy files being written
+		self.schemas = {}
+
+	## Write rows of an issuer to its files
+	# @param issuer name of the issuer
+	# @param rows lines or tuples of numbers
+	# @return list of the files written to
+	def _writeRows(self, issuer, rows):
+		outputFiles = []
+		lines = []
+		values = None
+		for row in rows:
+			if not isinstance(row, tuple):
+				lines.append(row)
+				continue
+			schema = self.schemas.get(issuer)
+			if schema is None:
+				schema = self.schemas[issuer] = [ 0, len(row), 0 ]
+			elif schema[1] != len(row):
+				self._writeValues(issuer, values, outputFiles)
+				values = None
+				schema[:] = [ schema[0] + 1, len(row), 0 ]
+			if values is None:
+				values = array('d')
+			values.extend(row)
+		self._writeValues(issuer, values, outputFiles)
+		if lines:
+			outputFiles += CsvOutputWriter._writeRows(self, issuer, lines)
+		return outputFiles
+
+	## Append values to the .npy files being written for an issuer
+	# @param issuer name of the issuer
+	# @param values array of values in row-major order, None if none
+	# @param outputFiles list to which the files written to are appended
+	def _writeValues(self, issuer, values, outputFiles):
+		if not values:
+			return
+		schema = self.schemas[issuer]
+		part, numColumns, numRows = schema
+		numRows += len(values) // numColumns
+		schema[2] = numRows
+
+		header = self._header(numRows)
+		for column in range(numColumns):
+			outputFile = self._file(npyFilename(issuer, part, column), binary = True)
+			outputFile.seek(0, os.SEEK_END)
+			if outputFile.tell() == 0:
+				outputFile.write(header)
+			values[column::numColumns].tofile(outputFile)
+			outputFile.seek(0)
+			outputFile.write(header)
+			outputFiles.append(outputFile)
+
+	## Build the header of a .npy file holding a column, version 1.0
+	# @param numRows number of values of the column
+	# @return header, as bytes
+	def _header(self, numRows):
+		descr = '<f8' if sys.byteorder == 'little' else '>f8'
+		header = "{{'descr': '{0}', 'fortran_order': False, 'shape': ({1},), }}". \
+			format(descr, numRows)
+		header = header.ljust(self.HEADER_SIZE - 10 - 1) + '\n'
+		return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+## Kinds of records of output containers
+STREAM, VALUES, LINE = 0, 1, 2
+## Header of records of output containers: kind, stream ID, count
+RECORD_HEADER = struct.Struct('<BII')
+## Size of a number in VALUES records, in bytes
+VALUE_SIZE = 8
+
+## Writes the rows of all issuers to a single container file, "sim.bin".
+# Each issuer's rows form a stream, identified by a small integer. The file
+# is a sequence of records, each starting with a header made of the record
+# kind, the stream ID and a count:
+# <ul>
+#   <li>STREAM records declare a stream, followed by count bytes of its name,
+#     in UTF-8;</li>
+#   <li>VALUES records hold a row of numbers, followed by count 64-bit
+#     floats;</li>
+#   <li>LINE records hold a line of text, followed by count bytes of UTF-8,
+#     without newline.</li>
+# </ul>
+# The file is only ever appended to, hence a whole simulation, however many
+# entities it has, uses a single file descriptor. Use OutputContainer to read
+# streams back, or to extract them as the CSV files CsvOutputWriter would
+# have written.
+class ContainerOutputWriter(CsvOutputWriter):
+	## Name of the container file, relative to the output directory
+	FILENAME = 'sim.bin'
+
+	## Constructor
+	# @see CsvOutputWriter.__init__()
+	def __init__(self, outputDirectory, **kwargs):
+		CsvOutputWriter.__init__(self, outputDirectory, **kwargs)
+		## stream IDs, by issuer name
+		self.streamIds = {}
+		## structs packing a VALUES record, by number of values
+		self.structs = {}
+
+	## Write rows of an issuer to the container
+	# @param issuer name of the issuer
+	# @param rows lines or tuples of numbers
+	# @return list of the files written to
+	def _writeRows(self, issuer, rows):
+		records = []
+		streamId = self.streamIds.get(issuer)
+		if streamId is None:
+			streamId = self.streamIds[issuer] = len(self.streamIds)
+			name = issuer.encode('utf-8')
+			records.append(RECORD_HEADER.pack(STREAM, streamId, len(name)) + name)
+
+		structs = self.structs
+		for row in rows:
+			if isinstance(row, tuple):
+				recordStruct = structs.get(len(row))
+				if recordStruct is None:
+					recordStruct = structs[len(row)] = \
+						struct.Struct(RECORD_HEADER.format + str(len(row)) + 'd')
+				records.append(recordStruct.pack(VALUES, streamId, len(row), *row))
+			else:
+				line = row.encode('utf-8')
+				records.append(RECORD_HEADER.pack(LINE, streamId, len(line)) + line)
+
+		outputFile = self._file(self.FILENAME, binary = True)
+		outputFile.seek(0, os.SEEK_END)
+		outputFile.write(b''.join(records))
+		return [ outputFile ]
+
+## Reads streams from a file written by ContainerOutputWriter.
+# The file is indexed lazily, on first access, by reading record headers
+# only; rows are read when a stream is iterated.
+class OutputContainer(object):
+	## Constructor
+	# @param filename name of the container file
+	def __init__(self, filename):
+		## name of the container file
+		self.filename = filename
+		## for each stream name, a list of (kind, offset, count) of its records,
+		# None until the file is indexed
+		self.index = None
+
+	## Index the records of the file
+	def _scan(self):
+		names = {}
+		index = {}
+		with open(self.filename, 'rb') as containerFile:
+			offset = 0
+			while True:
+				header = containerFile.read(RECORD_HEADER.size)
+				if len(header) < RECORD_HEADER.size:
+					break
+				kind, streamId, count = RECORD_HEADER.unpack(header)
+				offset += RECORD_HEADER.size
+				size = count * VALUE_SIZE if kind == VALUES else count
+				if kind == STREAM:
+					name = containerFile.read(count).decode('utf-8')
+					names[streamId] = name
+					index[name] = []
+				else:
+					index[names[streamId]].append((kind, offset, count))
+					containerFile.seek(size, os.SEEK_CUR)
+				offset += size
+		self.index = index
+
+	## Names of the streams in the container, i.e., issuer names
+	# @return sorted list of names
+	def streams(self):
+		if self.index is None:
+			self._scan()
+		return sorted(self.index)
+
+	## Iterate over the rows of a stream
+	# @param stream name of the stream
+	# @return generator of lines or tuples of numbers, in output order
+	def rows(self, stream):
+		if self.index is None:
+			self._scan()
+		with open(self.filename, 'rb') as containerFile:
+			for kind, offset, count in self.index[stream]:
+				containerFile.seek(offset)
+				if kind == VALUES:
+					yield struct.unpack('<' + str(count) + 'd',
+						containerFile.read(count * VALUE_SIZE))
+				else:
+					yield containerFile.read(count).decode('utf-8')
+
+	## Write a stream as the CSV file that CsvOutputWriter would have written
+	# @param stream name of the stream
+	# @param outputDirectory folder in which to write "sim-{stream}.csv"
+	def extractCsv(self, stream, outputDirectory):
+		with open(os.path.join(outputDirectory, 'sim-' + stream + '.csv'), 'w') as csvFile:
+			csvFile.write(formatRows(self.rows(stream), {}))
+
+## Hands rows to another writer running in a background thread.
+# Rows are collected in batches, which are put into a bounded queue, drained
+# by the background thread. The thread formats and writes rows, overlapping
+# I/O with the simulation. If it falls behind, putting a batch blocks until
+# there is room in the queue, which bounds memory usage.
+#
+# flush() and close() wait for the thread to write all rows, hence output is
+# durable when they return. Errors raised by the background thread are
+# raised again in the simulation thread, by the next call.
+class ThreadedOutputWriter(object):
+	## Constructor
+	# @param writer writer to which rows are handed, e.g., a CsvOutputWriter
+	# @param batchSize number of rows handed to the thread at once; 1 with the
+	# 'line' flush policy, so that rows are written without delay
+	# @param queueSize number of batches that may wait to be written
+	def __init__(self, writer, batchSize = 1024, queueSize = 16):
+		## writer to which rows are handed
+		self.writer = writer
+		## number of rows handed to the thread at once
+		self.batchSize = 1 if writer.flushPolicy == 'line' else batchSize
+		## number of batches that may wait to be written
+		self.queueSize = queueSize
+		## rows not yet handed to the thread, as (issuer, row, now) tuples
+		self.batch = []
+		## queue of batches, None until the thread is started
+		self.queue = None
+		## ID of the process that started the thread; a forked child has to
+		# start its own thread
+		self.pid = None
+		## exception raised by the thread, if any
+		self.error = None
+
+	## Folder in which files are written
+	@property
+	def outputDirectory(self):
+		return self.writer.outputDirectory
+
+	@outputDirectory.setter
+	def outputDirectory(self, outputDirectory):
+		self.writer.outputDirectory = outputDirectory
+
+	## Output a row
+	# @see CsvOutputWriter.write()
+	def write(self, issuer, row, now):
+		batch = self.batch
+		batch.append((issuer, row, now))
+		if len(batch) >= self.batchSize:
+			self._put(batch)
+			self.batch = []
+
+	## Hand a batch to the thread, starting it if needed
+	# @param batch list of (issuer, row, now) tuples, or a callable to call in
+	# the thread
+	def _put(self, batch):
+		if self.error is not None:
+			error, self.error = self.error, None
+			raise error
+		if self.pid != os.getpid():
+			self.queue = Queue(self.queueSize)
+			self.pid = os.getpid()
+			thread = threading.Thread(target = self._run, name = 'output-writer')
+			thread.daemon = True
+			thread.start()
+		self.queue.put(batch)
+
+	## Body of the thread
+	def _run(self):
+		queue = self.queue
+		writer = self.writer
+		while True:
+			batch = queue.get()
+			try:
+				if callable(batch):
+					batch()
+				elif self.error is None:
+					for issuer, row, now in batch:
+						writer.write(issuer, row, now)
+			except Exception as e:
+				self.error = e
+			finally:
+				queue.task_done()
+
+	## Call a method of the writer in the thread, after all rows handed so far,
+	# and wait for it to return
+	# @param method method of the writer
+	# @param *args arguments to call the method with
+	def _callAndWait(self, method, *args):
+		if self.batch:
+			self._put(self.batch)
+			self.batch = []
+		self._put(lambda: method(*args))
+		self.queue.join()
+		if self.error is not None:
+			error, self.error = self.error, None
+			raise error
+
+	## Write all rows, and flush files
+	# @param now current simulation time, in seconds, if known
+	def flush(self, now = None):
+		self._callAndWait(self.writer.flush, now)
+
+	## Copy the files written so far to another folder, e.g., before forking
+	# @param outputDirectory destination folder
+	def copyTo(self, outputDirectory):
+		self._callAndWait(self.writer.copyTo, outputDirectory)
+
+	## Write all rows and close all files.
+	# Outputting rows afterwards reopens files, appending to them.
+	def close(self):
+		self._callAndWait(self.writer.close)
+
+## Output writers, by name of the output format
+OUTPUT_FORMATS = {
+	'container': ContainerOutputWriter,
+	'csv': CsvOutputWriter,
+	'npy': NpyOutputWriter,
+}
+
+## Keeps every k-th row of a stream, starting with the first one.
+class SampledOutput(object):
+	## Constructor
+	# @param every keep one row out of this many
+	def __init__(self, every):
+		## keep one row out of this many
+		self.every = int(every)
+		## number of rows seen so far
+		self.numRows = 0
+
+	## Filter a row
+	# @param row tuple of numbers
+	# @return list of rows to write
+	def rows(self, row):
+		self.numRows += 1
+		if (self.numRows - 1) % self.every == 0:
+			return [ row ]
+		return []
+
+	## Rows to write for periods that ended, as time advances without rows
+	# @param now current simulation time, in seconds
+	# @return list of rows to write
+	def advance(self, now):
+		return []
+
+	## Rows to write at the end of the simulation
+	# @param now current simulation time, in seconds
+	# @return list of rows to write
+	def finish(self, now):
+		return []
+
+## Base class of policies aggregating the rows of a stream per period.
+# The first value of each row is its time. Rows are aggregated in periods
+# of fixed length, starting at multiples of the period. One row is written
+# per period, including periods without rows, as soon as a row of a later
+# period arrives or time advances past the period. The first value of a
+# written row is the time at which its period ends.
+class _PeriodicOutput(object):
+	## Constructor
+	# @param period length of periods, in seconds
+	# @param column index of the aggregated value in rows
+	def __init__(self, period, column):
+		## length of periods, in seconds
+		self.period = float(period)
+		## index of the aggregated value in rows
+		self.column = column
+		## time at which the current period ends, None before the first row
+		self.periodEnd = None
+
+	## Aggregate a row
+	# @param row tuple of numbers
+	# @return list of rows to write, for the periods that ended before row
+	def rows(self, row):
+		now = row[0]
+		if self.periodEnd is None:
+			self.periodEnd = (now // self.period + 1) * self.period
+			self._startPeriod(self.periodEnd - self.period)
+		rows = self.advance(now)
+		self._add(now, row[self.column])
+		return rows
+
+	## Write rows of the periods that ended
+	# @param now current simulation time, in seconds; a period ending exactly
+	# at this time ended
+	# @return list of rows to write
+	def advance(self, now):
+		rows = []
+		while self.periodEnd is not None and now >= self.periodEnd:
+			rows.append(self._endPeriod(self.periodEnd))
+			self._startPeriod(self.periodEnd)
+			self.periodEnd += self.period
+		return rows
+
+	## Write the rows of the periods that ended, and of the current period, as
+	# if it ended now
+	# @param now current simulation time, in seconds
+	# @return list of rows to write
+	def finish(self, now):
+		rows = self.advance(now)
+		if self.periodEnd is not None and now > self.periodEnd - self.period:
+			rows.append(self._endPeriod(now))
+			self.periodEnd = None
+		return rows
+
+## Writes the time-weighted mean and the maximum of a value per period, e.g.,
+# of a queue length, which holds from the time of its row until the next row.
+# Written rows are (period end, mean, maximum). The value is 0 before the
+# first row.
+class TimeWeightedOutput(_PeriodicOutput):
+	## Constructor
+	# @param period length of periods, in seconds
+	# @param column index of the value in rows, by default the one following
+	# time, as in the "-arl" stream of servers
+	def __init__(self, period, column = 1):
+		_PeriodicOutput.__init__(self, period, column)
+		## current value
+		self.value = 0.0
+		## time at which the value was last changed, or the period started
+		self.lastTime = None
+		## integral of the value over the current period, up to lastTime
+		self.area = 0.0
+		## maximum value over the current period
+		self.maximum = 0.0
+		## time at which the current period started
+		self.periodStart = None
+
+	def _startPeriod(self, periodStart):
+		self.periodStart = periodStart
+		self.lastTime = periodStart
+		self.area = 0.0
+		self.maximum = self.value
+
+	def _add(self, now, value):
+		self.area += self.value * (now - self.lastTime)
+		self.lastTime = now
+		self.value = value
+		self.maximum = max(self.maximum, value)
+
+	def _endPeriod(self, periodEnd):
+		area = self.area + self.value * (periodEnd - self.lastTime)
+		return (periodEnd, area / (periodEnd - self.periodStart), self.maximum)
+
+## Writes a histogram of a value per period, e.g., of response times.
+# Written rows are (period end, number of values, count of bin 0, count of
+# bin 1, ...), where bin i counts values below bins[i], and not below
+# bins[i - 1]; the last bin counts values not below the last bound.
+class HistogramOutput(_PeriodicOutput):
+	## Default upper bounds of bins, in seconds
+	BINS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10)
+
+	## Constructor
+	# @param period length of periods, in seconds
+	# @param column index of the value in rows, by default the third one, as
+	# the response time in the "-rt" stream of servers
+	# @param bins increasing upper bounds of bins
+	def __init__(self, period, column = 2, bins = BINS):
+		_PeriodicOutput.__init__(self, period, column)
+		## upper bounds of bins
+		self.bins = bins
+		## counts of the current period, one per bin plus one for larger values
+		self.counts = None
+
+	def _startPeriod(self, periodStart):
+		self.counts = [ 0 ] * (len(self.bins) + 1)
+
+	def _add(self, now, value):
+		self.counts[bisect_right(self.bins, value)] += 1
+
+	def _endPeriod(self, periodEnd):
+		return (periodEnd, sum(self.counts)) + tuple(self.counts)
+
+## Output policies, by name. None stands for writing all rows.
+OUTPUT_POLICIES = {
+	'raw': None,
+	'sample': SampledOutput,
+	'timeweighted': TimeWeightedOutput,
+	'histogram': HistogramOutput,
+}
+
+## Parse an output policy
+# @param spec policy name, optionally followed by a colon and its parameter,
+# i.e., the k of 'sample' or the period of 'timeweighted' and 'histogram',
+# e.g., "sample:10" or "histogram:1"
+# @return callable creating the policy of a stream, None for 'raw'
+# @throw ValueError if the policy is unknown, or its parameter is missing or
+# invalid, i.e., k is not an integer of at least 1 or the period is not
+# positive
+def outputPolicy(spec):
+	name, _, parameter = spec.partition(':')
+	if name not in OUTPUT_POLICIES:
+		raise ValueError("Unknown output policy '{0}'; choose among {1}".format(
+			name, ' '.join(sorted(OUTPUT_POLICIES))))
+	policy = OUTPUT_POLICIES[name]
+	if policy is None:
+		return None
+	if not parameter:
+		raise ValueError("Output policy '{0}' needs a parameter".format(name))
+	try:
+		value = float(parameter)
+	except ValueError:
+		raise ValueError("Output policy '{0}' needs a number, got '{1}'".format(
+			name, parameter))
+	if policy is SampledOutput:
+		if not value >= 1 or value % 1 != 0:
+			raise ValueError("Output policy 'sample' needs an integer of at least 1, " + \
+				"got '{0}'".format(parameter))
+	elif not value > 0:
+		raise ValueError("Output policy '{0}' needs a positive period, got '{1}'".format(
+			name, parameter))
+	return partial(policy, value)
@@ -0,0 +1,221 @@
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+
+from kernel import SimulatorKernel
+from output import ContainerOutputWriter, CsvOutputWriter, HistogramOutput, \
+	NpyOutputWriter, OutputContainer, ThreadedOutputWriter, loadNpyOutput, outputPolicy
+
+def readOutput(outputDirectory, issuer):
+	with open(os.path.join(outputDirectory, 'sim-' + issuer + '.csv')) as outputFile:
+		return outputFile.read()
+
+def test_flush_policies():
+	outputDirectory = tempfile.mkdtemp()
+	try:
+		writer = CsvOutputWriter(outputDirectory, flushPolicy = 'line')
+		writer.write('line', 'hello', 0)
+		assert readOutput(outputDirectory, 'line') == "hello\n"
+		# Only the file of the issuer is flushed
+		writer.write('other', 'world', 0)
+		otherFile = writer.files['sim-other.csv']
+		flushes = []
+		otherFile.flush = lambda: flushes.append('other')
+		writer.write('line', 'again', 0)
+		assert readOutput(outputDirectory, 'line') == "hello\nagain\n"
+		assert not flushes
+		del otherFile.flush
+		writer.close()
+
+		writer = CsvOutputWriter(outputDirectory, flushPolicy = 'size', bufferSize = 3)
+		writer.write('size', (1, 2.5), 0)
+		writer.write('size', 'hello', 0)
+		assert not os.path.exists(os.path.join(outputDirectory, 'sim-size.csv'))
+		writer.write('size', (3, float('nan')), 0)
+		assert readOutput(outputDirectory, 'size') == \
+			"1.00000,2.50000\nhello\n3.00000,nan\n"
+
+		writer = CsvOutputWriter(outputDirectory, flushPolicy = 'time', flushInterval = 10)
+		writer.write('time', (1,), 5)
+		assert not os.path.exists(os.path.join(outputDirectory, 'sim-time.csv'))
+		writer.write('time', (2,), 10)
+		assert readOutput(outputDirectory, 'time') == "1.00000\n2.00000\n"
+	finally:
+		shutil.rmtree(outputDirectory)
+
+def test_close_at_end_of_run():
+	def runPeriodically(sim):
+		sim.output('periodic', (sim.now, 1))
+		sim.add(1, lambda: runPeriodically(sim))
+
+	outputDirectory = tempfile.mkdtemp()
+	try:
+		sim = SimulatorKernel(outputDirectory = outputDirectory)
+		runPeriodically(sim)
+		sim.run(until = 1)
+		assert not sim.outputWriter.files
+		assert readOutput(outputDirectory, 'periodic') == "0.00000,1.00000\n1.00000,1.00000\n"
+
+		# Files are continued by a resumed run
+		sim.run(until = 2)
+		assert readOutput(outputDirectory, 'periodic') == \
+			"0.00000,1.00000\n1.00000,1.00000\n2.00000,1.00000\n"
+	finally:
+		shutil.rmtree(outputDirectory)
+
+def test_npy_output():
+	import numpy as np
+
+	outputDirectory = tempfile.mkdtemp()
+	try:
+		writer = NpyOutputWriter(outputDirectory, bufferSize = 2)
+		writer.write('rt', (1, 0.5), 1)
+		writer.write('rt', (2, 0.25), 2)
+		writer.write('rt', (3, float('nan')), 3)
+		writer.write('lb', (1, 2, 3), 1)
+		writer.write('lb', (2, 3, 4, 5), 2)
+		writer.write('final-results', 'hello', 3)
+		writer.close()
+
+		# Files are continued when reopened
+		writer.write('rt', (4, 1.0), 4)
+		writer.close()
+
+		# One file per column
+		assert os.path.exists(os.path.join(outputDirectory, 'sim-rt.c1.npy'))
+		(times, latencies), = loadNpyOutput(outputDirectory, 'rt')
+		assert times.shape == (4,), times.shape
+		assert times.tolist() == [ 1, 2, 3, 4 ], times
+		assert latencies[[ 0, 1, 3 ]].tolist() == [ 0.5, 0.25, 1.0 ], latencies
+		assert np.isnan(latencies[2]), latencies
+
+		lb = loadNpyOutput(outputDirectory, 'lb')
+		assert [ [ column.tolist() for column in part ] for part in lb ] == \
+			[ [ [ 1 ], [ 2 ], [ 3 ] ], [ [ 2 ], [ 3 ], [ 4 ], [ 5 ] ] ], lb
+		assert readOutput(outputDirectory, 'final-results') == "hello\n"
+	finally:
+		shutil.rmtree(outputDirectory)
+
+def test_container_output():
+	outputDirectory = tempfile.mkdtemp()
+	try:
+		writer = ContainerOutputWriter(outputDirectory, bufferSize = 2)
+		writer.write('server0-rt', (1, 0.5, 0.25), 1)
+		writer.write('server1-rt', (2, 1.5, 0.5), 2)
+		writer.write('final-results', 'numRequests', 3)
+		writer.close()
+		# Files are continued when reopened
+		writer.write('server0-rt', (4, float('nan'), 1), 4)
+		writer.close()
+		assert os.listdir(outputDirectory) == [ 'sim.bin' ]
+
+		container = OutputContainer(os.path.join(outputDirectory, 'sim.bin'))
+		assert container.streams() == [ 'final-results', 'server0-rt', 'server1-rt' ]
+		assert list(container.rows('server1-rt')) == [ (2, 1.5, 0.5) ]
+		assert list(container.rows('final-results')) == [ 'numRequests' ]
+
+		container.extractCsv('server0-rt', outputDirectory)
+		assert readOutput(outputDirectory, 'server0-rt') == \
+			"1.00000,0.50000,0.25000\n4.00000,nan,1.00000\n"
+	finally:
+		shutil.rmtree(outputDirectory)
+
+def test_threaded_output():
+	outputDirectory = tempfile.mkdtemp()
+	try:
+		writer = ThreadedOutputWriter(CsvOutputWriter(outputDirectory), batchSize = 2,
+			queueSize = 1)
+		for i in range(0, 5):
+			writer.write('rt', (i, 0.5), i)
+		writer.write('final-results', 'hello', 5)
+		writer.close()
+		assert readOutput(outputDirectory, 'rt') == ''.join([ "{0}.00000,0.50000\n".format(i) \
+			for i in range(0, 5) ])
+		assert readOutput(outputDirectory, 'final-results') == "hello\n"
+
+		# Errors of the background thread are raised in the caller
+		writer.write('rt', 'not', 6)
+		writer.write('rt', None, 7)
+		try:
+			writer.flush()
+			assert False, "Expected an error"
+		except TypeError:
+			pass
+	finally:
+		shutil.rmtree(outputDirectory)
+
+def test_threaded_output_fork():
+	outputDirectory = tempfile.mkdtemp()
+	childDirectory = tempfile.mkdtemp()
+	try:
+		sim = SimulatorKernel(outputDirectory = outputDirectory, asyncOutput = True)
+		sim.output('periodic', 'parent')
+		sim.run(until = 1)
+
+		pid = sim.fork(childDirectory)
+		if pid == 0:
+			exitCode = 1
+			try:
+				sim.output('periodic', 'child')
+				sim.close()
+				exitCode = 0
+			finally:
+				os._exit(exitCode)
+		_, status = os.waitpid(pid, 0)
+		assert status == 0, status
+
+		assert readOutput(outputDirectory, 'periodic') == "parent\n"
+		assert readOutput(childDirectory, 'periodic') == "parent\nchild\n"
+	finally:
+		shutil.rmtree(outputDirectory)
+		shutil.rmtree(childDirectory)
+
+def test_output_policies():
+	sample = outputPolicy('sample:3')()
+	assert [ len(sample.rows((i,))) for i in range(0, 7) ] == [ 1, 0, 0, 1, 0, 0, 1 ]
+	assert outputPolicy('raw') is None
+
+	# Invalid parameters are rejected when parsing
+	for spec in [ 'sample:0', 'sample:-2', 'sample:1.5', 'sample:nan', 'sample:x', 'sample',
+			'timeweighted:0', 'histogram:-1', 'unknown:1' ]:
+		try:
+			outputPolicy(spec)
+		except ValueError:
+			pass
+		else:
+			assert False, "{0} should be rejected".format(spec)
+
+	# Queue length 0 until 0.5, 2 until 1.5, then 1
+	timeWeighted = outputPolicy('timeweighted:1')()
+	assert timeWeighted.rows((0.5, 2)) == []
+	assert timeWeighted.rows((1.5, 1)) == [ (1.0, 1.0, 2) ]
+	assert timeWeighted.advance(3.0) == [ (2.0, 1.5, 2), (3.0, 1.0, 1) ]
+	assert timeWeighted.finish(3.5) == [ (3.5, 1.0, 1) ]
+
+	histogram = HistogramOutput(2, bins = (0.1, 1))
+	assert histogram.rows((0.5, 0.4, 0.1)) == []
+	assert histogram.rows((1.0, 0.5, 0.5)) == []
+	assert histogram.rows((4.5, 0.5, 4.0)) == [ (2.0, 2, 0, 2, 0), (4.0, 0, 0, 0, 0) ]
+	assert histogram.finish(5.0) == [ (5.0, 1, 0, 0, 1) ]
+
+def test_output_policies_in_kernel():
+	outputDirectory = tempfile.mkdtemp()
+	try:
+		sim = SimulatorKernel(outputDirectory = outputDirectory)
+		sim.setOutputPolicy(outputPolicy('timeweighted:1'), '*-arl')
+		sim.add(0.5, lambda: sim.output('server1-arl', (sim.now, 4)))
+		sim.add(0.5, lambda: sim.output('server1-rt', (sim.now, 1)))
+		sim.add(2.5, lambda: None)
+		sim.run(until = 2)
+		assert readOutput(outputDirectory, 'server1-arl') == \
+			"1.00000,2.00000,4.00000\n2.00000,4.00000,4.00000\n"
+		assert readOutput(outputDirectory, 'server1-rt') == "0.50000,1.00000\n"
+
+		# The last period is written when closing
+		sim.run(until = 3)
+		sim.close()
+		assert readOutput(outputDirectory, 'server1-arl').endswith("2.50000,4.00000,4.00000\n")
+	finally:
+		shutil.rmtree(outputDirectory)
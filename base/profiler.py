@@ -0,0 +1,153 @@
+from __future__ import division, print_function
+
+import inspect
+import os
+import sys
+import time
+
+## @package base.profiler Per-handler profiler for the simulation kernel.
+
+## Profiler of event handlers.
+# Counts triggered events and the wall-clock time spent in each event handler,
+# grouped by handler and by class of the entity the handler belongs to (the
+# issuer). Handlers are profiled inclusively, i.e., time spent in functions
+# called by a handler is also accounted to the handler. Some of these
+# functions, e.g., SimulatorKernel.output(), can additionally be profiled on
+# their own with callNested().
+class EventProfiler(object):
+	## Constructor
+	# @param timer function returning the current wall-clock time in seconds
+	def __init__(self, timer = time.time):
+		## function returning the current wall-clock time
+		self.timer = timer
+		## for each (code, issuer class) pair, a list of the number of events
+		# and the total time spent handling them
+		self.stats = {}
+		## for each name given to callNested(), a list of the number of calls
+		# and the total time spent
+		self.nestedStats = {}
+		## code of handlers that are not accounted
+		self.ignored = set()
+
+	## Do not account a handler, e.g., because it only calls other handlers,
+	# which are accounted
+	# @param function function or method of the handler
+	def ignore(self, function):
+		self.ignored.add(inspectHandler(function)[0])
+
+	## Call an event handler and account its execution time
+	# @param event event handler
+	# @param *args arguments to pass to the event handler
+	def call(self, event, *args):
+		code, issuer = inspectHandler(event)
+		if code in self.ignored:
+			event(*args)
+			return
+
+		timer = self.timer
+		started = timer()
+		event(*args)
+		elapsed = timer() - started
+
+		key = (code, None if issuer is None else issuer.__class__)
+		stat = self.stats.get(key)
+		if stat is None:
+			stat = self.stats[key] = [ 0, 0.0 ]
+		stat[0] += 1
+		stat[1] += elapsed
+
+	## Call a function from within an event handler and account its execution
+	# time separately, under a given name
+	# @param name name under which to account the function
+	# @param function function to call
+	# @param *args,**kwargs arguments to pass to the function
+	# @return what the function returns
+	def callNested(self, name, function, *args, **kwargs):
+		timer = self.timer
+		started = timer()
+		try:
+			return function(*args, **kwargs)
+		finally:
+			stat = self.nestedStats.get(name)
+			if stat is None:
+				stat = self.nestedStats[name] = [ 0, 0.0 ]
+			stat[0] += 1
+			stat[1] += timer() - started
+
+	## Profiling results of event handlers, the most expensive first
+	# @return list of (handler, issuer, number of events, total time) tuples
+	def results(self):
+		rows = [ describeHandler(*key) + tuple(stat) \
+			for key, stat in self.stats.items() ]
+		rows.sort(key = lambda row: (-row[3], row[0], row[1]))
+		return rows
+
+	## Profiling results of nested functions, the most expensive first
+	# @return list of (name, number of calls, total time) tuples
+	def nestedResults(self):
+		rows = [ (name,) + tuple(stat) for name, stat in self.nestedStats.items() ]
+		rows.sort(key = lambda row: (-row[2], row[0]))
+		return rows
+
+	## Print profiling results as a table
+	# @param outputFile file to print to, by default standard error
+	def report(self, outputFile = None):
+		if outputFile is None:
+			outputFile = sys.stderr
+		rows = self.results()
+		nestedRows = [ (name, '(nested)', numCalls, totalTime) \
+			for name, numCalls, totalTime in self.nestedResults() ]
+		totalTime = sum(row[3] for row in rows)
+
+		handlerWidth = max([ len('handler') ] + [ len(row[0]) for row in rows + nestedRows ])
+		issuerWidth = max([ len('issuer') ] + [ len(row[1]) for row in rows + nestedRows ])
+		print('handler'.ljust(handlerWidth), 'issuer'.ljust(issuerWidth),
+			'calls'.rjust(10), 'total[s]'.rjust(10), 'mean[us]'.rjust(10),
+			'share'.rjust(7), file = outputFile)
+		for handler, issuer, numCalls, handlerTime in rows + nestedRows:
+			print(handler.ljust(handlerWidth), issuer.ljust(issuerWidth),
+				str(numCalls).rjust(10),
+				'{0:.3f}'.format(handlerTime).rjust(10),
+				'{0:.1f}'.format(handlerTime / numCalls * 1e6).rjust(10),
+				'{0:.1%}'.format(handlerTime / totalTime if totalTime else 0).rjust(7),
+				file = outputFile)
+		print('total'.ljust(handlerWidth), ''.ljust(issuerWidth),
+			str(sum(row[2] for row in rows)).rjust(10),
+			'{0:.3f}'.format(totalTime).rjust(10), file = outputFile)
+
+## Find what identifies an event handler
+# Bound methods and lambdas are created anew for each event, hence handlers
+# are identified by their code instead.
+# @param event event handler
+# @return code of the handler, or the handler itself if it has none, and the
+# object the handler belongs to, None for plain functions
+def inspectHandler(event):
+	function = getattr(event, '__func__', event)
+	issuer = getattr(event, '__self__', None)
+	code = getattr(function, '__code__', None)
+	if issuer is None and code is not None and 'self' in code.co_freevars:
+		# Lambda or nested function defined inside a method
+		issuer = function.__closure__[code.co_freevars.index('self')].cell_contents
+	return code or function, issuer
+
+## Give human-readable names to a handler
+# @param code code object of the handler, or the handler itself if it has none
+# @param issuerClass class of the object the handler belongs to, None for
+# plain functions
+# @return tuple of handler name and issuer name
+def describeHandler(code, issuerClass):
+	if not hasattr(code, 'co_name'):
+		return getattr(code, '__name__', repr(code)), '-'
+
+	issuer = '-'
+	if issuerClass is not None:
+		issuer = issuerClass.__name__
+		# Class defining the method, which may be a base class of the issuer
+		for cls in inspect.getmro(issuerClass):
+			method = cls.__dict__.get(code.co_name)
+			if getattr(method, '__code__', None) is code:
+				return cls.__name__ + '.' + code.co_name, issuer
+
+	# Lambdas and nested functions are only distinguishable by their location
+	return '{0} ({1}:{2})'.format(code.co_name,
+		os.path.basename(code.co_filename), code.co_firstlineno), issuer
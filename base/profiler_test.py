@@ -0,0 +1,64 @@
+from __future__ import print_function
+
+from StringIO import StringIO
+
+from kernel import SimulatorKernel
+from profiler import EventProfiler
+
+class Ticker:
+	def __init__(self, sim):
+		self.sim = sim
+		self.sim.add(0, self.tick)
+
+	def tick(self):
+		self.sim.output(self, str(self.sim.now))
+		self.sim.add(1, self.tick)
+		self.sim.add(0.5, lambda: self.sim.now)
+
+	def __str__(self):
+		return "ticker"
+
+def test_profile_handlers():
+	sim = SimulatorKernel(outputDirectory = None, profile = True)
+	Ticker(sim)
+	sim.add(0, lambda: None)
+	sim.run(until = 10)
+
+	results = sim.profiler.results()
+	rows = dict(((handler.split(' ')[0], issuer), numEvents) \
+		for handler, issuer, numEvents, _ in results)
+	assert rows[('Ticker.tick', 'Ticker')] == 11, results
+	assert rows[('<lambda>', 'Ticker')] == 10, results
+	assert rows[('<lambda>', '-')] == 1, results
+	assert sum(rows.values()) == sim.numEvents
+
+	nestedResults = sim.profiler.nestedResults()
+	assert nestedResults[0][:2] == ('SimulatorKernel.output', 11), nestedResults
+
+def test_report():
+	times = iter(range(100))
+	profiler = EventProfiler(timer = lambda: next(times))
+	profiler.call(lambda: None)
+	profiler.callNested('output', lambda: None)
+
+	outputFile = StringIO()
+	profiler.report(outputFile)
+	lines = outputFile.getvalue().splitlines()
+	assert len(lines) == 4, lines
+	assert lines[1].split()[-3:] == [ '1.000', '1000000.0', '100.0%' ], lines
+	assert lines[2].startswith('output'), lines
+
+def test_profiling_disabled():
+	sim = SimulatorKernel(outputDirectory = None)
+	assert sim.profiler is None
+	assert 'output' not in vars(sim)
+
+def test_profile_periodic_events():
+	sim = SimulatorKernel(outputDirectory = None, profile = True)
+	ticker = Ticker(sim)
+	sim.every(1, ticker.__str__)
+	sim.run(until = 3)
+
+	handlers = [ handler for handler, _, _, _ in sim.profiler.results() ]
+	assert 'Ticker.__str__' in handlers, handlers
+	assert '_Ticker.fire' not in handlers, handlers
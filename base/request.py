@@ -1,3 +1,8 @@
+## Default completion callback, which ignores completion
+# @param request completed request
+def _ignoreCompletion(request):
+	pass
+
 ## Represents a request sent to an entity, waiting for a reply. This class has
 # little logic, its use is basically as a dictionary.
 # @note If a request needs to traverse an entity, a <b>new</b> request should be
@@ -17,8 +22,10 @@ class Request(object):
 		## ID of this request for pretty-printing
 		self.requestId = Request.lastRequestId
 		Request.lastRequestId += 1
-		## Callable to call when request has completed
-		self.onCompleted = lambda: ()
+		## Callable to call when request has completed, with the request as
+		# argument. Entities set it to one of their bound methods, saving a
+		# closure per request.
+		self.onCompleted = _ignoreCompletion
 		## Request originating this request
 		self.originalRequest = None
 		## Original request creation time
@@ -0,0 +1,294 @@
+from __future__ import division
+
+from array import array
+import math
+
+## @package base.sketch Streaming quantile estimators.
+
+## Summarizes a stream of non-negative numbers, e.g., response times, in
+# bounded memory, so that their percentiles, average, standard deviation,
+# minimum and maximum can be computed at the end, without keeping the numbers.
+#
+# Percentiles are estimated as in DDSketch: numbers are counted in bins whose
+# bounds grow geometrically, so that any number in a bin is within
+# relativeAccuracy of the bin's representative value. Hence, a percentile is
+# estimated within relativeAccuracy of the one numpy.percentile() computes,
+# e.g., with relativeAccuracy = 0.01, a p99 of 2 s is estimated between 1.98 s
+# and 2.02 s. The number of bins only depends on the range of
+# the numbers, e.g., about 1000 bins for numbers from 0.1 ms to 1000 s with an
+# accuracy of 1%, and is capped by maxBins, in which case the lowest bins are
+# collapsed, losing accuracy for low percentiles only.
+#
+# The average, standard deviation, minimum and maximum are exact. Sketches
+# with the same accuracy can be merged, e.g., to summarize the response times
+# of all clients.
+#
+# A sketch can be used in place of a list to which numbers are appended.
+class QuantileSketch(object):
+	## Constructor
+	# @param relativeAccuracy relative error of percentiles, between 0 and 1
+	# @param maxBins maximum number of bins to keep
+	# @param minValue numbers below this are counted as zero
+	def __init__(self, relativeAccuracy = 0.01, maxBins = 2048, minValue = 1e-9):
+		## relative error of percentiles
+		self.relativeAccuracy = relativeAccuracy
+		## ratio between the bounds of a bin
+		self.gamma = (1 + relativeAccuracy) / (1 - relativeAccuracy)
+		## logarithm of gamma, to compute bin indexes
+		self.logGamma = math.log(self.gamma)
+		## maximum number of bins to keep
+		self.maxBins = maxBins
+		## numbers below this are counted as zero
+		self.minValue = minValue
+		## number of numbers in each bin, by bin index; bin i holds numbers in
+		# (gamma^(i-1), gamma^i]
+		self.bins = {}
+		## number of numbers counted as zero
+		self.zeroCount = 0
+		## number of numbers appended
+		self.count = 0
+		## average of the numbers appended
+		self.mean = 0.0
+		## sum of squared deviations from the average, as in Welford's algorithm
+		self.m2 = 0.0
+		## minimum of the numbers appended
+		self.min = float('inf')
+		## maximum of the numbers appended
+		self.max = float('-inf')
+
+	## Add a number
+	# @param value number to add
+	def append(self, value):
+		if value < self.minValue:
+			self.zeroCount += 1
+		else:
+			index = int(math.ceil(math.log(value) / self.logGamma))
+			try:
+				self.bins[index] += 1
+			except KeyError:
+				self.bins[index] = 1
+				if len(self.bins) > self.maxBins:
+					self._collapseLowestBins()
+
+		self.count += 1
+		delta = value - self.mean
+		self.mean += delta / self.count
+		self.m2 += delta * (value - self.mean)
+		if value < self.min:
+			self.min = value
+		if value > self.max:
+			self.max = value
+
+	## Add several numbers
+	# @param values iterable of numbers to add
+	def extend(self, values):
+		for value in values:
+			self.append(value)
+
+	## Add the numbers summarized by another sketch
+	# @param other sketch with the same relative accuracy and minimum value
+	def merge(self, other):
+		if other.gamma != self.gamma or other.minValue != self.minValue:
+			raise ValueError("Cannot merge sketches with different accuracies")
+		if other.count == 0:
+			return
+		for index, binCount in other.bins.items():
+			self.bins[index] = self.bins.get(index, 0) + binCount
+		while len(self.bins) > self.maxBins:
+			self._collapseLowestBins()
+		self.zeroCount += other.zeroCount
+
+		# Combine averages and squared deviations, as in Chan et al.
+		count = self.count + other.count
+		delta = other.mean - self.mean
+		self.m2 += other.m2 + delta * delta * self.count * other.count / count
+		self.mean += delta * other.count / count
+		self.count = count
+		self.min = min(self.min, other.min)
+		self.max = max(self.max, other.max)
+
+	## Fold the lowest bin into the next one
+	def _collapseLowestBins(self):
+		lowest, nextLowest = sorted(self.bins)[:2]
+		self.bins[nextLowest] += self.bins.pop(lowest)
+
+	## Number of numbers appended
+	def __len__(self):
+		return self.count
+
+	## Estimate a percentile.
+	# Like numpy.percentile(), interpolates linearly between the numbers of the
+	# closest ranks, as estimated by their bins.
+	# @param percentile percentile to estimate, between 0 and 100
+	# @return estimate, NaN if no number was appended
+	def percentile(self, percentile):
+		if self.count == 0:
+			return float('nan')
+		rank = percentile / 100 * (self.count - 1)
+		lower = int(rank)
+		lowerValue = self._valueAt(lower)
+		if rank == lower:
+			return lowerValue
+		return lowerValue + (rank - lower) * (self._valueAt(lower + 1) - lowerValue)
+
+	## Estimate the number of a rank
+	# @param rank 0-based rank
+	# @return representative value of the bin of this rank
+	def _valueAt(self, rank):
+		seen = self.zeroCount
+		if seen > rank:
+			return max(0.0, self.min)
+		for index in sorted(self.bins):
+			seen += self.bins[index]
+			if seen > rank:
+				value = 2 * self.gamma ** index / (self.gamma + 1)
+				return min(max(value, self.min), self.max)
+		return self.max # pragma: no cover
+
+	## Population standard deviation, as numpy.std()
+	# @return standard deviation, NaN if no number was appended
+	def stddev(self):
+		if self.count == 0:
+			return float('nan')
+		return math.sqrt(self.m2 / self.count)
+
+	## Average
+	# @return average, NaN if no number was appended
+	def average(self):
+		if self.count == 0:
+			return float('nan')
+		return self.mean
+
+## Estimates one percentile of the numbers appended since the last reset(),
+# e.g., of the latencies measured during a control period, in constant time
+# per number and in memory allocated once.
+#
+# Numbers are counted in a fixed array of bins whose bounds grow geometrically
+# from minValue to maxValue, as in QuantileSketch, so that any number in a bin
+# is within relativeAccuracy of the bin's representative value. Hence, for
+# numbers between minValue and maxValue, the percentile is estimated within
+# relativeAccuracy of the one numpy.percentile() computes, whatever the number
+# of numbers; smaller and larger numbers are counted in two extra bins, whose
+# representative values are the exact minimum and maximum.
+#
+# Appending a number takes one logarithm and one increment. Estimating the
+# percentile scans the bins from the one of the maximum downwards, hence visits
+# at most the bins between the percentile and the maximum, and never more than
+# the fixed number of bins, e.g., 1384 with the defaults, whatever the number
+# of numbers. reset() only clears the bins used since the previous reset().
+#
+# The average, minimum and maximum are exact.
+class PercentileEstimator(object):
+	## Constructor
+	# @param percentile percentile to estimate, between 0 and 100
+	# @param relativeAccuracy relative error of the percentile, between 0 and 1
+	# @param minValue lower bound of the numbers counted with relativeAccuracy
+	# @param maxValue upper bound of the numbers counted with relativeAccuracy
+	def __init__(self, percentile, relativeAccuracy = 0.01, minValue = 1e-6, maxValue = 1e6):
+		## percentile to estimate, between 0 and 100
+		self.percentile = percentile
+		## relative error of the percentile
+		self.relativeAccuracy = relativeAccuracy
+		## lower bound of the numbers counted with relativeAccuracy
+		self.minValue = minValue
+		## ratio between the bounds of a bin
+		self.gamma = (1 + relativeAccuracy) / (1 - relativeAccuracy)
+		## logarithm of gamma, to compute bin indexes
+		self.logGamma = math.log(self.gamma)
+		## logarithm of minValue, to compute bin indexes
+		self.logMinValue = math.log(minValue)
+		## index of the bin of numbers above maxValue; bin 0 holds numbers up to
+		# minValue, bin i holds numbers in (minValue gamma^(i-1), minValue gamma^i]
+		self.overflowIndex = int(math.ceil(math.log(maxValue / minValue) / self.logGamma)) + 1
+		## number of numbers in each bin, allocated once
+		self.bins = array('l', [ 0 ]) * (self.overflowIndex + 1)
+		## zeros to clear bins in place
+		self.zeros = array('l', [ 0 ]) * (self.overflowIndex + 1)
+		## index of the lowest bin used since the last reset()
+		self.lowIndex = self.overflowIndex
+		## index of the highest bin used since the last reset()
+		self.highIndex = 0
+		self.reset()
+
+	## Forget all numbers, e.g., at the beginning of a period
+	def reset(self):
+		if self.lowIndex <= self.highIndex:
+			self.bins[self.lowIndex:self.highIndex + 1] = \
+				self.zeros[self.lowIndex:self.highIndex + 1]
+		self.lowIndex = self.overflowIndex
+		self.highIndex = 0
+		## number of numbers appended
+		self.count = 0
+		## sum of numbers appended
+		self.total = 0.0
+		## minimum of numbers appended
+		self.min = float('nan')
+		## maximum of numbers appended
+		self.max = float('nan')
+
+	## Number of numbers appended since the last reset()
+	def __len__(self):
+		return self.count
+
+	## Add a number
+	# @param value number to add
+	def append(self, value):
+		self.count += 1
+		self.total += value
+		if not value >= self.min:
+			self.min = value
+		if not value <= self.max:
+			self.max = value
+
+		if value <= self.minValue:
+			index = 0
+		else:
+			index = min(int(math.ceil((math.log(value) - self.logMinValue) / self.logGamma)),
+				self.overflowIndex)
+		self.bins[index] += 1
+		if index < self.lowIndex:
+			self.lowIndex = index
+		if index > self.highIndex:
+			self.highIndex = index
+
+	## Estimate the percentile.
+	# Like numpy.percentile(), interpolates linearly between the numbers of the
+	# closest ranks, as estimated by their bins.
+	# @return estimate, NaN if no number was appended since the last reset()
+	def estimate(self):
+		if self.count == 0:
+			return float('nan')
+		rank = self.percentile / 100 * (self.count - 1)
+		lower = int(rank)
+		upper = min(lower + 1, self.count - 1)
+
+		bins = self.bins
+		upperValue = None
+		seen = self.count # numbers in the bins up to index
+		for index in range(self.highIndex, self.lowIndex - 1, -1):
+			seen -= bins[index]
+			if upperValue is None and seen <= upper:
+				upperValue = self._binValue(index)
+			if seen <= lower:
+				lowerValue = self._binValue(index)
+				break
+		return lowerValue + (rank - lower) * (upperValue - lowerValue)
+
+	## Representative value of a bin
+	# @param index bin index
+	# @return number within relativeAccuracy of all numbers in the bin, bounded
+	# by the minimum and maximum
+	def _binValue(self, index):
+		if index == 0:
+			return self.min
+		if index == self.overflowIndex:
+			return self.max
+		value = 2 * self.minValue * self.gamma ** index / (self.gamma + 1)
+		return min(max(value, self.min), self.max)
+
+	## Average of the numbers appended since the last reset()
+	# @return average, NaN if no number was appended
+	def average(self):
+		if self.count == 0:
+			return float('nan')
+		return self.total / self.count
@@ -0,0 +1,100 @@
+from __future__ import division
+
+import random
+
+import numpy as np
+
+from sketch import PercentileEstimator, QuantileSketch
+
+def test_accuracy():
+	rng = random.Random(1)
+	values = [ rng.lognormvariate(-1, 1) for _ in range(0, 20000) ]
+	sketch = QuantileSketch(relativeAccuracy = 0.01)
+	sketch.extend(values)
+
+	assert len(sketch) == len(values)
+	for percentile in (1, 50, 95, 99, 100):
+		exact = np.percentile(values, percentile)
+		estimate = sketch.percentile(percentile)
+		assert abs(estimate - exact) <= 0.01 * exact + 1e-12, (percentile, estimate, exact)
+	assert sketch.max == max(values)
+	assert abs(sketch.average() - np.mean(values)) < 1e-9
+	assert abs(sketch.stddev() - np.std(values)) < 1e-9
+	assert len(sketch.bins) < 1000, len(sketch.bins)
+
+def test_merge():
+	rng = random.Random(2)
+	values = [ rng.expovariate(1) for _ in range(0, 3000) ] + [ 0, 0 ]
+	merged = QuantileSketch()
+	for part in (values[:1000], values[1000:2000], [], values[2000:]):
+		sketch = QuantileSketch()
+		sketch.extend(part)
+		merged.merge(sketch)
+
+	whole = QuantileSketch()
+	whole.extend(values)
+	assert merged.bins == whole.bins
+	assert merged.zeroCount == whole.zeroCount == 2
+	assert merged.percentile(99) == whole.percentile(99)
+	assert merged.percentile(0) == 0
+	assert abs(merged.stddev() - np.std(values)) < 1e-9
+	assert (merged.min, merged.max) == (0, max(values))
+
+	try:
+		merged.merge(QuantileSketch(relativeAccuracy = 0.05))
+		assert False, "Expected an error"
+	except ValueError:
+		pass
+
+def test_bounded_bins():
+	sketch = QuantileSketch(maxBins = 16)
+	sketch.extend([ 2 ** i for i in range(-20, 20) ])
+	assert len(sketch.bins) == 16
+	# High percentiles are still accurate
+	assert abs(sketch.percentile(100) - 2 ** 19) <= 0.01 * 2 ** 19
+
+def test_empty():
+	sketch = QuantileSketch()
+	assert len(sketch) == 0
+	assert np.isnan(sketch.percentile(95))
+	assert np.isnan(sketch.average())
+	assert np.isnan(sketch.stddev())
+
+def test_percentile_estimator_fidelity():
+	estimator = PercentileEstimator(95, relativeAccuracy = 0.01)
+	rng = random.Random(3)
+	for numValues in (1, 2, 10, 64, 65, 300, 5000):
+		# Periods of various lengths, as seen by a replica controller
+		estimator.reset()
+		values = [ rng.lognormvariate(-1, 0.8) for _ in range(0, numValues) ]
+		for value in values:
+			estimator.append(value)
+
+		exact = np.percentile(values, 95)
+		assert abs(estimator.estimate() - exact) <= 0.01 * exact, \
+			(numValues, estimator.estimate(), exact)
+		assert len(estimator) == numValues
+		assert abs(estimator.average() - np.mean(values)) < 1e-9
+		assert estimator.max == max(values)
+
+	estimator.reset()
+	assert not estimator
+	assert np.isnan(estimator.estimate())
+	assert np.isnan(estimator.average())
+	assert np.isnan(estimator.max)
+	# Bins are cleared in place
+	assert not any(estimator.bins)
+
+def test_percentile_estimator_out_of_range():
+	estimator = PercentileEstimator(50, minValue = 1e-3, maxValue = 1e3)
+	for value in (0, 1e-4, 1, 1e4, 1e5):
+		estimator.append(value)
+	assert abs(estimator.estimate() - 1) <= 0.01
+	estimator.reset()
+	# Numbers above maxValue are represented by the maximum, below minValue by the minimum
+	estimator.append(1e4)
+	estimator.append(2e4)
+	assert estimator.estimate() == 2e4
+	estimator.reset()
+	estimator.append(0)
+	assert estimator.estimate() == 0
@@ -0,0 +1,333 @@
+from __future__ import division, print_function
+
+import json
+import os
+import shutil
+import struct
+
+from .profiler import describeHandler, inspectHandler
+from .request import Request
+
+## @package base.tracing Binary event and request traces for the simulation kernel.
+
+## Records events into a preallocated ring buffer of fixed-size binary records.
+# Each record holds the simulation time, the handler, the entity to which the
+# handler belongs and the request that the handler deals with, if any. The
+# handler and the entity are stored as small integer IDs, whose names are kept
+# aside. The request is identified by the ID of the original request, e.g., the
+# one created by the client, so that it can be followed across entities.
+#
+# Besides triggered events, entities can record marks, i.e., named points in
+# time that are not events, such as a request arriving at a server.
+#
+# Once the ring buffer is full, the oldest records are overwritten.
+class EventTracer(object):
+	## Format of a record: time, handler ID, entity ID, request ID
+	RECORD = struct.Struct('<dIIQ')
+
+	## Constructor
+	# @param capacity number of records to keep
+	def __init__(self, capacity = 1 << 20):
+		## number of records to keep
+		self.capacity = capacity
+		## ring buffer of records
+		self.buffer = bytearray(capacity * self.RECORD.size)
+		## number of records written so far, including overwritten ones
+		self.numRecords = 0
+		## handler ID, by (code, issuer class) or mark name
+		self.handlerIds = {}
+		## handler names, by handler ID
+		self.handlerNames = []
+		## entity ID, by id() of the entity
+		self.entityIds = {}
+		## entities, by entity ID; entity 0 stands for none
+		self.entities = [ None ]
+		## entity names, by entity ID
+		self.entityNames = [ '-' ]
+
+	## Record a triggered event
+	# @param now simulation time, in seconds
+	# @param event event handler
+	# @param args arguments the event handler is called with
+	def record(self, now, event, args = ()):
+		code, issuer = inspectHandler(event)
+		issuerClass = None if issuer is None else issuer.__class__
+		handlerId = self.handlerIds.get((code, issuerClass))
+		if handlerId is None:
+			handlerId = self._newHandler((code, issuerClass),
+				describeHandler(code, issuerClass)[0])
+		self._append(now, handlerId, self._entityId(issuer), _requestId(event, args))
+
+	## Record a mark
+	# @param now simulation time, in seconds
+	# @param issuer entity recording the mark
+	# @param name name of the mark
+	# @param request optional request that the mark refers to
+	def mark(self, now, issuer, name, request = None):
+		handlerId = self.handlerIds.get(name)
+		if handlerId is None:
+			handlerId = self._newHandler(name, name)
+		requestId = 0
+		if request is not None:
+			requestId = _rootRequest(request).requestId
+		self._append(now, handlerId, self._entityId(issuer), requestId)
+
+	## Write a record into the ring buffer
+	def _append(self, now, handlerId, entityId, requestId):
+		offset = (self.numRecords % self.capacity) * self.RECORD.size
+		self.RECORD.pack_into(self.buffer, offset, now, handlerId, entityId, requestId)
+		self.numRecords += 1
+
+	## Allocate a handler ID
+	def _newHandler(self, key, name):
+		handlerId = len(self.handlerNames)
+		self.handlerIds[key] = handlerId
+		self.handlerNames.append(name)
+		return handlerId
+
+	## Find or allocate the ID of an entity
+	def _entityId(self, entity):
+		if entity is None:
+			return 0
+		entityId = self.entityIds.get(id(entity))
+		if entityId is None:
+			entityId = len(self.entities)
+			self.entityIds[id(entity)] = entityId
+			# Keep a reference, so that the id() is not reused
+			self.entities.append(entity)
+			self.entityNames.append(str(entity))
+		return entityId
+
+	## Records still in the ring buffer, oldest first
+	# @return iterator over (time, handler name, entity name, request ID) tuples;
+	# the request ID is 0 if none
+	def records(self):
+		for now, handlerId, entityId, requestId in self._rawRecords():
+			yield now, self.handlerNames[handlerId], self.entityNames[entityId], requestId
+
+	## Records still in the ring buffer, oldest first
+	# @return iterator over (time, handler ID, entity ID, request ID) tuples
+	def _rawRecords(self):
+		for i in range(max(0, self.numRecords - self.capacity), self.numRecords):
+			yield self.RECORD.unpack_from(self.buffer,
+				(i % self.capacity) * self.RECORD.size)
+
+	## Export records in the Chrome trace event format, which can be opened
+	# with chrome://tracing or Perfetto.
+	# Each entity is shown as a thread, with one instant event per record. Each
+	# request is additionally shown as an asynchronous slice on each entity,
+	# from the first to the last record of that entity referring to it.
+	# @param outputFile file to write JSON to
+	def exportChromeTrace(self, outputFile):
+		traceEvents = []
+		for entityId, entityName in enumerate(self.entityNames):
+			traceEvents.append({ 'name': 'thread_name', 'ph': 'M', 'pid': 1,
+				'tid': entityId, 'args': { 'name': entityName } })
+
+		requestSpans = {}
+		for now, handlerId, entityId, requestId in self._rawRecords():
+			timestamp = now * 1e6
+			event = { 'name': self.handlerNames[handlerId], 'ph': 'i', 's': 't',
+				'ts': timestamp, 'pid': 1, 'tid': entityId }
+			if requestId:
+				event['args'] = { 'request': requestId }
+			if requestId and entityId:
+				span = requestSpans.get((requestId, entityId))
+				if span is None:
+					requestSpans[(requestId, entityId)] = [ timestamp, timestamp ]
+				else:
+					span[1] = timestamp
+			traceEvents.append(event)
+
+		for (requestId, entityId), (begin, end) in sorted(requestSpans.items()):
+			spanId = '{0}:{1}'.format(entityId, requestId)
+			for phase, timestamp in (('b', begin), ('e', end)):
+				traceEvents.append({ 'name': 'request {0}'.format(requestId),
+					'cat': 'request', 'ph': phase, 'id': spanId, 'ts': timestamp,
+					'pid': 1, 'tid': entityId })
+
+		json.dump({ 'traceEvents': traceEvents, 'displayTimeUnit': 'ms' }, outputFile)
+
+## Records the hops of a sample of requests into a compact binary log.
+# Entities stamp requests with marks, through SimulatorKernel.traceMark(),
+# e.g., when a client sends a request, when the load-balancer routes it, when
+# a server runs one time slice of it, etc. Only the marks of sampled requests
+# are recorded. A request is sampled based on the ID of its original request,
+# so that all its hops are recorded or none is, without consuming random
+# numbers of the simulation.
+#
+# The log, "requests.bin" in the output directory, is a sequence of records,
+# each starting with a byte telling its kind:
+# <ul>
+#   <li>NAME, followed by a name ID and the length of the name, both as
+#     unsigned 32-bit integers, then the UTF-8 encoded name, of a mark or of an
+#     entity, which later records refer to by ID;</li>
+#   <li>STAMP, followed by the simulation time as a double, the ID of the
+#     original request as an unsigned 64-bit integer, then the name IDs of the
+#     mark and the entity, as unsigned 32-bit integers.</li>
+# </ul>
+# All numbers are little-endian. Use loadRequestTrace() to read the log.
+class RequestTracer(object):
+	## Name of the log, in the output directory
+	FILENAME = 'requests.bin'
+	## Kinds of records
+	NAME, STAMP = 0, 1
+	## Format of a name record, without the name
+	NAME_RECORD = struct.Struct('<BII')
+	## Format of a stamp record
+	STAMP_RECORD = struct.Struct('<BdQII')
+
+	## Constructor
+	# @param outputDirectory folder where the log is written
+	# @param samplingRate fraction of requests to record, between 0 and 1
+	# @param bufferSize number of bytes to buffer before writing them
+	def __init__(self, outputDirectory, samplingRate = 0.01, bufferSize = 1 << 16):
+		## folder where the log is written
+		self.outputDirectory = outputDirectory
+		## fraction of requests to record
+		self.samplingRate = samplingRate
+		## hashes of request IDs below this are sampled
+		self.threshold = int(samplingRate * (1 << 32))
+		## number of bytes to buffer before writing them
+		self.bufferSize = bufferSize
+		## records not yet written
+		self.buffer = bytearray()
+		## name ID, by mark name or id() of the entity
+		self.nameIds = {}
+		## entities that were given a name ID, so that their id() is not reused
+		self.entities = []
+		## whether the log was created; until then, a log left by a previous
+		# run into the same folder is overwritten
+		self.created = False
+
+	## Tell whether a request is sampled
+	# @param requestId ID of the original request
+	# @return True if its marks are recorded
+	def sampled(self, requestId):
+		# Knuth's multiplicative hash spreads consecutive IDs evenly
+		return (requestId * 2654435761) & 0xffffffff < self.threshold
+
+	## Record a mark of a request, if it is sampled
+	# @param now simulation time, in seconds
+	# @param issuer entity recording the mark
+	# @param name name of the mark
+	# @param request request that the mark refers to
+	def stamp(self, now, issuer, name, request):
+		requestId = _rootRequest(request).requestId
+		if not self.sampled(requestId):
+			return
+		nameId = self.nameIds.get(name)
+		if nameId is None:
+			nameId = self._newName(name, name)
+		entityId = self.nameIds.get(id(issuer))
+		if entityId is None:
+			self.entities.append(issuer)
+			entityId = self._newName(id(issuer), str(issuer))
+		self.buffer += self.STAMP_RECORD.pack(self.STAMP, now, requestId, nameId, entityId)
+		if len(self.buffer) >= self.bufferSize:
+			self.flush()
+
+	## Allocate a name ID, writing the name into the log
+	def _newName(self, key, name):
+		nameId = len(self.nameIds)
+		self.nameIds[key] = nameId
+		encodedName = name.encode('utf-8')
+		self.buffer += self.NAME_RECORD.pack(self.NAME, nameId, len(encodedName))
+		self.buffer += encodedName
+		return nameId
+
+	## Write buffered records to the log
+	def flush(self):
+		if not self.buffer:
+			return
+		mode = 'ab' if self.created else 'wb'
+		with open(os.path.join(self.outputDirectory, self.FILENAME), mode) as logFile:
+			logFile.write(self.buffer)
+		self.created = True
+		self.buffer = bytearray()
+
+	## Copy the log written so far into another folder, e.g., when forking
+	# @param outputDirectory destination folder
+	def copyTo(self, outputDirectory):
+		self.flush()
+		filename = os.path.join(self.outputDirectory, self.FILENAME)
+		if os.path.exists(filename):
+			shutil.copyfile(filename, os.path.join(outputDirectory, self.FILENAME))
+
+## Read a log written by RequestTracer
+# @param filename path to the log
+# @return dict of the marks of each request, by original request ID; marks are
+# lists of (time, mark name, entity name) tuples, in the order they were
+# recorded
+def loadRequestTrace(filename):
+	with open(filename, 'rb') as logFile:
+		data = logFile.read()
+	names = {}
+	requests = {}
+	offset = 0
+	while offset < len(data):
+		kind, nameId, length = RequestTracer.NAME_RECORD.unpack_from(data, offset)
+		if kind == RequestTracer.NAME:
+			offset += RequestTracer.NAME_RECORD.size
+			names[nameId] = data[offset:offset + length].decode('utf-8')
+			offset += length
+		else:
+			_, now, requestId, nameId, entityId = \
+				RequestTracer.STAMP_RECORD.unpack_from(data, offset)
+			offset += RequestTracer.STAMP_RECORD.size
+			requests.setdefault(requestId, []).append((now, names[nameId], names[entityId]))
+	return requests
+
+## Split the time a request spent in a server, from the marks of the server:
+# "arrive", then "run" at the beginning of each time slice, "preempt" at the
+# end of each time slice that did not complete the request, and "complete".
+# @param marks marks of a request, as returned by loadRequestTrace()
+# @param server name of the server
+# @return (queueing, execution, preemption) tuple, i.e., the time waiting to
+# be first scheduled, the time being executed, and the time waiting to be
+# scheduled again after time slices expired; None if the request did not
+# complete in this server
+def splitServerTime(marks, server):
+	queueing, execution, preemption = 0, 0, 0
+	lastMark = lastTime = None
+	for now, name, entity in marks:
+		if entity != server:
+			continue
+		if name == 'run':
+			if lastMark == 'arrive':
+				queueing += now - lastTime
+			elif lastMark == 'preempt':
+				preemption += now - lastTime
+		elif name in ('preempt', 'complete'):
+			execution += now - lastTime
+			if name == 'complete':
+				return queueing, execution, preemption
+		lastMark, lastTime = name, now
+	return None
+
+## Follow a request to the request originating it
+# @param request request
+# @return original request
+def _rootRequest(request):
+	while request.originalRequest is not None:
+		request = request.originalRequest
+	return request
+
+## Find the request an event handler deals with, by looking into its arguments,
+# then into the variables it closes over
+# @param event event handler
+# @param args arguments the event handler is called with
+# @return ID of the original request, 0 if none
+def _requestId(event, args):
+	for value in args:
+		if isinstance(value, Request):
+			return _rootRequest(value).requestId
+	function = getattr(event, '__func__', event)
+	for cell in getattr(function, '__closure__', None) or ():
+		try:
+			value = cell.cell_contents
+		except ValueError: # empty cell
+			continue
+		if isinstance(value, Request):
+			return _rootRequest(value).requestId
+	return 0
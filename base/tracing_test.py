@@ -0,0 +1,111 @@
+from __future__ import print_function
+
+import json
+import os
+import shutil
+from StringIO import StringIO
+import tempfile
+
+from kernel import SimulatorKernel
+from request import Request
+from tracing import EventTracer, RequestTracer, loadRequestTrace, splitServerTime
+
+class Entity:
+	def __init__(self, sim):
+		self.sim = sim
+
+	def handle(self, request):
+		self.sim.traceMark(self, 'arrive', request)
+		self.sim.add(1, lambda: self.complete(request))
+
+	def complete(self, request):
+		pass
+
+	def __str__(self):
+		return "entity"
+
+def test_trace():
+	tracer = EventTracer(capacity = 16)
+	sim = SimulatorKernel(outputDirectory = None, tracer = tracer)
+	entity = Entity(sim)
+
+	original = Request()
+	request = Request()
+	request.originalRequest = original
+	sim.add(0.5, lambda: entity.handle(request))
+	sim.every(1, entity.__str__)
+	sim.run(until = 2)
+
+	records = list(tracer.records())
+	assert [ (now, handler, issuer) for now, handler, issuer, _ in records ] == [
+		(0.5, '<lambda> (tracing_test.py:35)', '-'),
+		(0.5, 'arrive', 'entity'),
+		(1.0, '_Ticker.fire', 'ticker'),
+		(1.0, 'Entity.__str__', 'entity'),
+		(1.5, '<lambda> (tracing_test.py:19)', 'entity'),
+		(2.0, '_Ticker.fire', 'ticker'),
+		(2.0, 'Entity.__str__', 'entity'),
+		], records
+	# Requests are identified by their original request
+	assert [ requestId for _, _, _, requestId in records ] == \
+		[ original.requestId, original.requestId, 0, 0, original.requestId, 0, 0 ]
+
+	outputFile = StringIO()
+	tracer.exportChromeTrace(outputFile)
+	traceEvents = json.loads(outputFile.getvalue())['traceEvents']
+	spans = [ (event['ph'], event['ts']) for event in traceEvents \
+		if event.get('cat') == 'request' ]
+	assert spans == [ ('b', 0.5e6), ('e', 1.5e6) ], spans
+
+def test_ring_buffer():
+	tracer = EventTracer(capacity = 4)
+	for i in range(10):
+		tracer.mark(i, None, 'mark')
+	assert [ now for now, _, _, _ in tracer.records() ] == [ 6, 7, 8, 9 ]
+
+def test_request_trace():
+	outputDirectory = tempfile.mkdtemp()
+	try:
+		requestTracer = RequestTracer(outputDirectory, samplingRate = 1, bufferSize = 64)
+		sim = SimulatorKernel(outputDirectory = None, requestTracer = requestTracer)
+		entity = Entity(sim)
+
+		original = Request()
+		request = Request()
+		request.originalRequest = original
+		sim.add(0.5, lambda: entity.handle(request))
+		sim.add(0.75, lambda: sim.traceMark(entity, 'no request'))
+		sim.run(until = 2)
+
+		requests = loadRequestTrace(os.path.join(outputDirectory, RequestTracer.FILENAME))
+		assert requests == { original.requestId: [ (0.5, 'arrive', 'entity') ] }, requests
+
+		# A new run into the same folder overwrites the log
+		requestTracer = RequestTracer(outputDirectory, samplingRate = 1, bufferSize = 64)
+		sim = SimulatorKernel(outputDirectory = None, requestTracer = requestTracer)
+		entity = Entity(sim)
+		sim.add(0.25, lambda: entity.handle(request))
+		sim.run(until = 2)
+
+		requests = loadRequestTrace(os.path.join(outputDirectory, RequestTracer.FILENAME))
+		assert requests == { original.requestId: [ (0.25, 'arrive', 'entity') ] }, requests
+	finally:
+		shutil.rmtree(outputDirectory)
+
+def test_request_sampling():
+	requestTracer = RequestTracer(None, samplingRate = 0.1)
+	sampled = [ requestId for requestId in range(1, 10001) if requestTracer.sampled(requestId) ]
+	assert 900 < len(sampled) < 1100, len(sampled)
+	assert not RequestTracer(None, samplingRate = 0).sampled(1)
+
+def test_split_server_time():
+	marks = [
+		(0.0, 'route', 'lb'),
+		(0.0, 'arrive', 'server1'),
+		(0.5, 'run', 'server1'),
+		(0.75, 'preempt', 'server1'),
+		(1.25, 'run', 'server1'),
+		(1.5, 'complete', 'server1'),
+	]
+	assert splitServerTime(marks, 'server1') == (0.5, 0.5, 0.5)
+	assert splitServerTime(marks[:-1], 'server1') is None
@@ -1,4 +1,6 @@
 from __future__ import division, print_function
+from array import array
+import numpy as np
 # for numpy >= 1.7
 #from numpy.random import choice
 
@@ -54,3 +56,28 @@ def normalize(numbers):
 	# How to normalize a zero vector is a matter of much debate
 		return [ float('nan') ] * len(numbers)
 	return [ n / s for n in numbers ]
+
+## Growable buffer of floats, e.g., latencies or response times, stored
+# compactly as C doubles, i.e., 8 bytes per number, instead of a list of float
+# objects, i.e., about 32 bytes per number. It is an array.array('d'), hence
+# supports append(), extend(), len(), iteration, sum(), max(), etc.
+class FloatBuffer(array):
+	## Constructor
+	# @param values optional iterable of initial numbers
+	def __new__(cls, values = ()):
+		return array.__new__(cls, 'd', values)
+
+	## Remove all numbers, keeping the buffer, e.g., at the end of a period
+	# @note Fails while a view returned by toNumpy() is alive.
+	def reset(self):
+		del self[:]
+
+	## Get the numbers as a NumPy array, without copying them
+	# @return read-write view on the buffer; while it is alive, the buffer
+	# cannot grow or be reset
+	def toNumpy(self):
+		return np.frombuffer(self, dtype = np.float64)
+
+	## Pretty-print the buffer
+	def __repr__(self):
+		return 'FloatBuffer({0})'.format(list(self))
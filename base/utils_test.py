@@ -21,3 +21,24 @@ def normalize_test():
     assert normalize([1, 2, 3]) == [1.0/6, 2.0/6, 3.0/6]
     assert normalize([0.5]) == [1.0]
     assert math.isnan(normalize([0, 0])[0])
+
+def FloatBuffer_test():
+    buffer = FloatBuffer()
+    assert not buffer
+    buffer.append(1)
+    buffer.extend(FloatBuffer([ 2.5, 3 ]))
+    assert list(buffer) == [ 1, 2.5, 3 ]
+    assert avg(buffer) == 6.5 / 3
+    assert maxOrNan(buffer) == 3
+    assert buffer.itemsize == 8
+
+    view = buffer.toNumpy()
+    assert view.tolist() == [ 1, 2.5, 3 ]
+    # The view shares memory with the buffer
+    view[0] = 4
+    assert buffer[0] == 4
+    del view
+
+    buffer.reset()
+    assert len(buffer) == 0
+    assert buffer.toNumpy().shape == (0,)
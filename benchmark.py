@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+from __future__ import division, print_function
+
+## @package benchmark Benchmarks for the simulator internals.
+# Must be run from the top folder, like the simulator, e.g.,
+# @code ./benchmark.py queue-operations --scenario scenarios/A.py @endcode
+
+import argparse
+import gc
+import mock
+import os
+import sys
+import time
+
+import base.eventqueue
+import base.kernel
+import simulator
+from plants import Server
+
+## Runs the simulator on a scenario, without writing any output
+# @param scenario file containing the scenario
+# @param extraArgs additional command-line arguments to pass to the simulator
+# @return the number of requests completed by the servers and the final results
+def runScenario(scenario, extraArgs = []):
+	counters = { 'requests': 0 }
+	originalOnCompleted = Server.onCompleted
+	def countingOnCompleted(server, request):
+		counters['requests'] += 1
+		originalOnCompleted(server, request)
+
+	argv = [ './simulator.py', '--lb', 'SQF', '--rc', 'mm_queueifac',
+		'--scenario', scenario ] + extraArgs
+	with mock.patch('sys.argv', argv), \
+			mock.patch('base.SimulatorKernel.output') as output, \
+			mock.patch.object(Server, 'onCompleted', countingOnCompleted):
+		simulator.main()
+	return counters['requests'], output.call_args
+
+## Runs a scenario, counting event queue operations
+# @param scenario file containing the scenario
+# @param immediateLane whether the kernel keeps zero-delay events in its
+# immediate-event deque, or pushes them on the heap
+# @return the number of completed requests, a dictionary of counters and the
+# final results
+def countQueueOperations(scenario, immediateLane):
+	counters = { 'adds': 0, 'heappush': 0, 'heappop': 0, 'immediate': 0 }
+	originalInit = base.kernel.SimulatorKernel.__init__
+	originalAdd = base.kernel.SimulatorKernel.add
+	originalHeappush = base.eventqueue.heappush
+	originalHeappop = base.eventqueue.heappop
+	def initWithImmediateLane(sim, *args, **kwargs):
+		kwargs['immediateLane'] = immediateLane
+		originalInit(sim, *args, **kwargs)
+	def countingAdd(sim, delay, what, *args):
+		counters['adds'] += 1
+		if delay == 0 and sim.immediateLane:
+			counters['immediate'] += 1
+		return originalAdd(sim, delay, what, *args)
+	def countingHeappush(heap, item):
+		counters['heappush'] += 1
+		originalHeappush(heap, item)
+	def countingHeappop(heap):
+		counters['heappop'] += 1
+		return originalHeappop(heap)
+
+	with mock.patch.object(base.kernel.SimulatorKernel, '__init__', initWithImmediateLane), \
+			mock.patch.object(base.kernel.SimulatorKernel, 'add', countingAdd), \
+			mock.patch('base.eventqueue.heappush', countingHeappush), \
+			mock.patch('base.eventqueue.heappop', countingHeappop):
+		numRequests, results = runScenario(scenario)
+	return numRequests, counters, results
+
+## Counts event queue operations per completed request, with and without the
+# zero-delay fast lane.
+# Events that go through the fast lane cost a deque append and popleft,
+# instead of a heap push and pop. Both runs must trigger the same events.
+def benchmarkQueueOperations(args):
+	print("scenario:", args.scenario, file = sys.stderr)
+	results = {}
+	for immediateLane, name in [ (False, 'without fast lane'), (True, 'with fast lane') ]:
+		numRequests, counters, results[name] = \
+			countQueueOperations(args.scenario, immediateLane)
+		heapOperations = counters['heappush'] + counters['heappop']
+		print("{0}: completed requests: {1}".format(name, numRequests), file = sys.stderr)
+		print("{0}: events per request: {1:.3f}".format(name,
+			counters['adds'] / numRequests), file = sys.stderr)
+		print("{0}: heap operations per request: {1:.3f}".format(name,
+			heapOperations / numRequests), file = sys.stderr)
+		print("{0}: zero-delay events added to the fast lane per request: {1:.3f}".format(name,
+			counters['immediate'] / numRequests), file = sys.stderr)
+	assert len(set(map(str, results.values()))) == 1, \
+		"Runs with and without fast lane produced different results"
+
+## Stands in for the kernel's event profiler to count the objects that each
+# event handler allocates and leaves allocated when it returns, e.g., the
+# closures, bound methods, argument tuples and event entries it schedules for
+# later hops. Temporaries freed before the handler returns are not counted.
+# Objects are counted with the garbage collector's allocation count, hence
+# only objects it tracks, i.e., containers such as functions, cells, bound
+# methods, tuples, lists and instances, not numbers or strings.
+# @note The garbage collector must be disabled, otherwise its collections
+# reset the count.
+class AllocationCounter(object):
+	def __init__(self):
+		## net number of objects allocated by event handlers
+		self.objects = 0
+		## depth of nested calls, e.g., handlers subscribed to a periodic event
+		self.depth = 0
+
+	## Call an event handler and count what it leaves allocated
+	# @param event event handler
+	# @param *args arguments to pass to the event handler
+	def call(self, event, *args):
+		self.depth += 1
+		objects = gc.get_count()[0]
+		try:
+			event(*args)
+		finally:
+			self.depth -= 1
+			if self.depth == 0:
+				self.objects += gc.get_count()[0] - objects
+
+	## Call a function from within an event handler
+	def callNested(self, name, function, *args, **kwargs):
+		return function(*args, **kwargs)
+
+## Measures object allocations per completed request.
+# Each event handler is run between two readings of the garbage collector's
+# allocation count, so that every object it allocates for a later hop,
+# including a bound method created by accessing a method, is counted once.
+def benchmarkAllocations(args):
+	counter = AllocationCounter()
+	originalInit = base.kernel.SimulatorKernel.__init__
+	def initWithAllocationCounter(sim, *args, **kwargs):
+		originalInit(sim, *args, **kwargs)
+		sim.profiler = counter
+
+	gcWasEnabled = gc.isenabled()
+	gc.disable()
+	try:
+		with mock.patch.object(base.kernel.SimulatorKernel, '__init__', initWithAllocationCounter):
+			numRequests, _ = runScenario(args.scenario)
+	finally:
+		if gcWasEnabled:
+			gc.enable()
+
+	print("scenario:", args.scenario, file = sys.stderr)
+	print("completed requests:", numRequests, file = sys.stderr)
+	print("objects allocated by event handlers per request: {0:.3f}".format(
+		counter.objects / numRequests), file = sys.stderr)
+
+## Compares the wall-clock time of event queue backends.
+# Also checks that all backends produce the same results.
+def benchmarkEventQueues(args):
+	scenarios = args.scenario.split(',')
+	for scenario in scenarios:
+		results = {}
+		for eventQueue in sorted(base.eventqueue.EVENT_QUEUES):
+			started = time.time()
+			_, results[eventQueue] = runScenario(scenario, [ '--eventQueue', eventQueue ])
+			print("{0}: {1}: {2:.1f}s".format(scenario, eventQueue, time.time() - started),
+				file = sys.stderr)
+		assert len(set(map(str, results.values()))) == 1, \
+			"Event queue backends produced different results"
+
+## Entry-point for benchmarks.
+def main():
+	benchmarks = {
+		'allocations': benchmarkAllocations,
+		'event-queues': benchmarkEventQueues,
+		'queue-operations': benchmarkQueueOperations,
+	}
+
+	parser = argparse.ArgumentParser( \
+		description='Benchmark simulator internals.', \
+		formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+	parser.add_argument('benchmark',
+		help = 'Benchmark to run: ' + ' '.join(sorted(benchmarks)))
+	parser.add_argument('--scenario',
+		help = 'Scenario to benchmark on; event-queues accepts a comma-separated list',
+		default = None)
+	args = parser.parse_args()
+
+	if args.benchmark not in benchmarks:
+		print("Unknown benchmark '{0}'".format(args.benchmark), file = sys.stderr)
+		parser.print_help()
+		quit()
+
+	if args.scenario is None:
+		if args.benchmark == 'event-queues':
+			args.scenario = ','.join([ os.path.join('scenarios', 'A.py'),
+				os.path.join('scenarios', 'autoscaling-support.py') ])
+		else:
+			args.scenario = os.path.join('scenarios', 'A.py')
+
+	started = time.time()
+	benchmarks[args.benchmark](args)
+	print("wall-clock time: {0:.1f}s".format(time.time() - started), file = sys.stderr)
+
+if __name__ == "__main__":
+	main() # pragma: no cover
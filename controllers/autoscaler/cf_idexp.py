@@ -31,6 +31,10 @@ class AutoScalerController(AbstractAutoScalerController):
 		## Controller ID for pretty-printing
 		self.name = name
 
+		# Name the columns of reports, for the metrics registry
+		self.sim.describeOutput(self, ('time', 'averageDimmer', 'minimumDimmer',
+			'control', 'roundedControl', 'desiredControl', 'action'))
+
 		self.lastTheta = {} # dictionary containing all the dimmers of the replicas
 		self.status = {}
 		
@@ -57,7 +61,7 @@ class AutoScalerController(AbstractAutoScalerController):
 			self.impulseTime = float('inf') # only apply impulse once
 				
 		# Report
-		valuesToOutput = [
+		valuesToOutput = (
 			self.sim.now, # time
 			average_dimmer, # average dimmer value
 			minimum_dimmer, # minimum dimmer value
@@ -65,9 +69,8 @@ class AutoScalerController(AbstractAutoScalerController):
 			float('nan'),
 			float('nan'),
 			action, # the effective action depends on infrastructure availability
-		]
-		self.sim.output(self, ','.join(["{0:.5f}".format(value) \
-			for value in valuesToOutput]))
+		)
+		self.sim.output(self, valuesToOutput)
 			
 		self.lastTheta = {}
 		return action
@@ -55,6 +55,10 @@ class AutoScalerController(AbstractAutoScalerController):
 		## Controller ID for pretty-printing
 		self.name = name
 
+		# Name the columns of reports, for the metrics registry
+		self.sim.describeOutput(self, ('time', 'averageDimmer', 'minimumDimmer',
+			'control', 'roundedControl', 'desiredControl', 'action'))
+
 		## control parameters
 		self.controlInterval = controlInterval # read from the autoscaler
 		self.proportionalGain = proportionalGain # read from command line
@@ -122,7 +126,7 @@ class AutoScalerController(AbstractAutoScalerController):
 						(self.controlInterval / self.resetTime) * (action - desiredControl)
 
 		# Report
-		valuesToOutput = [
+		valuesToOutput = (
 			self.sim.now, # time
 			self.average_dimmer, # average dimmer value
 			self.minimum_dimmer, # average dimmer value
@@ -130,9 +134,8 @@ class AutoScalerController(AbstractAutoScalerController):
 			round(nonquantizedControl), # the signal that one would want to apply
 			desiredControl, # the signal that may limit action (no +2/-2)
 			action, # the effective action depends on infrastructure availability
-		]
-		self.sim.output(self, ','.join(["{0:.5f}".format(value) \
-			for value in valuesToOutput]))
+		)
+		self.sim.output(self, valuesToOutput)
 		return action
 	
 	def __str__(self):
@@ -46,6 +46,9 @@ class AutoScalerController(AbstractAutoScalerController):
 		## Controller ID for pretty-printing
 		self.name = name
 
+		# Name the columns of reports, for the metrics registry
+		self.sim.describeOutput(self, ('time', 'theta', 'action'))
+
 		## control interval (read by autoscaler)
 		self.controlInterval = controlInterval
 
@@ -76,13 +79,12 @@ class AutoScalerController(AbstractAutoScalerController):
 			action = -1
 
 		# Report
-		valuesToOutput = [
+		valuesToOutput = (
 			self.sim.now,
 			self.lastTheta,
 			action,
-		]
-		self.sim.output(self, ','.join(["{0:.5f}".format(value) \
-			for value in valuesToOutput]))
+		)
+		self.sim.output(self, valuesToOutput)
 		return action
 	
 	def __str__(self):
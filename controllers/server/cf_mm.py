@@ -1,7 +1,7 @@
-import numpy as np
 import random as xxx_random # prevent accidental usage
 
-from base.utils import *
+from base.controller import DimmerReportMixin
+from base.sketch import PercentileEstimator
 
 def getName():
 	return 'mm'
@@ -38,7 +38,7 @@ def newInstance(sim, name):
 		args.rcMmPeriod, args.rcMmPole, args.rcMmRlsForgetting, \
 		args.rcSetpoint)
 
-class MMReplicaController:
+class MMReplicaController(DimmerReportMixin):
 	def __init__(self, sim, name, initialDimmer, percentile, period, pole, \
 		rlsForgetting, setpoint, seed = 1):
 		## control period (controller parameter)
@@ -55,15 +55,18 @@ class MMReplicaController:
 		self.alpha = 1
 		## Pole (controller parameter)
 		self.pole = pole
-		## latencies measured during last control period (controller input)
-		self.latestLatencies = []
+		## percentile of the latencies measured during last control period,
+		# updated as they are reported (controller input)
+		self.latestLatencies = PercentileEstimator(percentile)
 		## dimmer value (controller output)
 		self.dimmer = initialDimmer
 
 		## Reference to simulator
 		self.sim = sim
+		## handle of the periodic control event, None if not running
+		self.controlLoop = None
 		if self.controlPeriod > 0:
-			self.sim.add(0, self.runControlLoop)
+			self.controlLoop = self.sim.every(self.controlPeriod, self.runControlLoop, delay = 0)
 		
 		## Random number generator
 		self.random = xxx_random.Random()
@@ -72,6 +75,9 @@ class MMReplicaController:
 		## Controller ID for pretty-printing
 		self.name = name
 
+		# Name the columns of reports, for the metrics registry
+		self.describeReport()
+
 	## Runs the control loop.
 	# Basically retrieves self.lastestLatencies and computes a new self.dimmer.
 	# Ask Martina for details. :P
@@ -83,7 +89,7 @@ class MMReplicaController:
 			# Possible choices: max or avg latency control
 			#serviceTime = avg(self.latestLatencies) # avg latency
 			# serviceTime = max(self.latestLatencies) # max latency
-			serviceTime = np.percentile(self.latestLatencies, self.percentile)
+			serviceTime = self.latestLatencies.estimate()
 			serviceLevel = self.dimmer
 
 			# choice of the estimator:
@@ -109,20 +115,8 @@ class MMReplicaController:
 			self.dimmer = min(max(serviceLevel, 0.0), 1.0)
 			output_dimmer = self.dimmer
 		
-		# Report
-		valuesToOutput = [ \
-			self.sim.now, \
-			avg(self.latestLatencies), \
-			maxOrNan(self.latestLatencies), \
-			self.dimmer, \
-			output_dimmer, \
-		]
-		self.sim.output(self, ','.join(["{0:.5f}".format(value) \
-			for value in valuesToOutput]))
-
-		# Re-run later
-		self.latestLatencies = []
-		self.sim.add(self.controlPeriod, self.runControlLoop)
+		# Report, suspending the loop until reportData() if there were no latencies
+		self.endControlPeriod(output_dimmer)
 
 	def withOptional(self):
 		return self.random.random() <= self.dimmer, self.dimmer
@@ -130,6 +124,7 @@ class MMReplicaController:
 	def reportData(self, responseTime, queueLenght, timeY, timeN):
 	  # save only the latencies, the rest is not needed
 		self.latestLatencies.append(responseTime)
+		self.resumeControlLoop()
 	
 	def __str__(self):
 		return self.name
@@ -1,7 +1,7 @@
-import numpy as np
 import random as xxx_random # prevent accidental usage
 
-from base.utils import *
+from base.controller import DimmerReportMixin
+from base.sketch import PercentileEstimator
 
 def getName():
 	return 'mm_queue_feedforward'
@@ -33,7 +33,7 @@ def newInstance(sim, name):
 		args.rcMmQueueFeedforwardPeriod, args.rcSetpoint, \
 		args.rcMmQueueFeedforwardDiscountFactor)
 
-class MMQueueFeedforwardReplicaController:
+class MMQueueFeedforwardReplicaController(DimmerReportMixin):
 	def __init__(self, sim, name, initialDimmer, percentile, period, \
 		setpoint, discountFactor, seed = 1):
 		## control period (controller parameter)
@@ -42,8 +42,9 @@ class MMQueueFeedforwardReplicaController:
 		self.setpoint = setpoint
 		## percentile to control (controller parameter)
 		self.percentile = percentile
-		## latencies measured during last control period (controller input)
-		self.latestLatencies = []
+		## percentile of the latencies measured during last control period,
+		# updated as they are reported (controller input)
+		self.latestLatencies = PercentileEstimator(percentile)
 		## dimmer value (controller output)
 		self.dimmer = initialDimmer
 		## discount factor
@@ -57,8 +58,10 @@ class MMQueueFeedforwardReplicaController:
 
 		## Reference to simulator
 		self.sim = sim
+		## handle of the periodic control event, None if not running
+		self.controlLoop = None
 		if self.controlPeriod > 0:
-			self.sim.add(0, self.runControlLoop)
+			self.controlLoop = self.sim.every(self.controlPeriod, self.runControlLoop, delay = 0)
 		
 		## Random number generator
 		self.random = xxx_random.Random()
@@ -67,6 +70,9 @@ class MMQueueFeedforwardReplicaController:
 		## Controller ID for pretty-printing
 		self.name = name
 
+		# Name the columns of reports, for the metrics registry
+		self.describeReport()
+
 	## Runs the control loop.
 	# Basically retrieves self.lastestLatencies and computes a new self.dimmer.
 	# Ask Martina for details. :P
@@ -76,7 +82,7 @@ class MMQueueFeedforwardReplicaController:
 	
 		if self.latestLatencies:
 			# Possible choices: max or avg latency control
-			serviceTime = np.percentile(self.latestLatencies, self.percentile)
+			serviceTime = self.latestLatencies.estimate()
 			serviceLevel = self.dimmer
 
 			error = self.setpoint - serviceTime
@@ -90,20 +96,8 @@ class MMQueueFeedforwardReplicaController:
 			
 			output_dimmer = self.dimmer # replica is active, save correct value
 		
-		# Report
-		valuesToOutput = [ \
-			self.sim.now, \
-			avg(self.latestLatencies), \
-			maxOrNan(self.latestLatencies), \
-			self.dimmer, \
-			output_dimmer, \
-		]
-		self.sim.output(self, ','.join(["{0:.5f}".format(value) \
-			for value in valuesToOutput]))
-
-		# Re-run later
-		self.latestLatencies = []
-		self.sim.add(self.controlPeriod, self.runControlLoop)
+		# Report, suspending the loop until reportData() if there were no latencies
+		self.endControlPeriod(output_dimmer)
 
 	def withOptional(self):
 		return self.random.random() <= self.dimmer, self.dimmer
@@ -111,6 +105,7 @@ class MMQueueFeedforwardReplicaController:
 	def reportData(self, responseTime, queueLenght, timeY, timeN):
 	  # save all
 		self.latestLatencies.append(responseTime)
+		self.resumeControlLoop()
 		self.queueLenght = queueLenght
 		self.timeY = timeY
 		self.timeN = timeN
@@ -1,8 +1,8 @@
-import numpy as np
 import random as xxx_random # prevent accidental usage
 import math
 
-from base.utils import *
+from base.controller import DimmerReportMixin
+from base.sketch import PercentileEstimator
 
 def getName():
 	return 'mm_queueifac'
@@ -33,7 +33,7 @@ def newInstance(sim, name):
 		args.rcMmQueueInitialDimmer, args.rcPercentile, \
 		args.rcMmQueuePeriod, args.rcSetpoint, args.rcMmQueueDiscountFactor)
 
-class MMQueueFeedforwardFeedbackReplicaController:
+class MMQueueFeedforwardFeedbackReplicaController(DimmerReportMixin):
 	def __init__(self, sim, name, initialDimmer, percentile, period, \
 		setpoint, discountFactor, seed = 1):
 		## control period (controller parameter)
@@ -42,8 +42,9 @@ class MMQueueFeedforwardFeedbackReplicaController:
 		self.setpoint = setpoint
 		## percentile to control (controller parameter)
 		self.percentile = percentile
-		## latencies measured during last control period (controller input)
-		self.latestLatencies = []
+		## percentile of the latencies measured during last control period,
+		# updated as they are reported (controller input)
+		self.latestLatencies = PercentileEstimator(percentile)
 		## dimmer value (controller output)
 		self.dimmer = initialDimmer
 		## discount factor
@@ -67,8 +68,10 @@ class MMQueueFeedforwardFeedbackReplicaController:
 
 		## Reference to simulator
 		self.sim = sim
+		## handle of the periodic control event, None if not running
+		self.controlLoop = None
 		if self.controlPeriod > 0:
-			self.sim.add(0, self.runControlLoop)
+			self.controlLoop = self.sim.every(self.controlPeriod, self.runControlLoop, delay = 0)
 		
 		## Random number generator
 		self.random = xxx_random.Random()
@@ -77,6 +80,9 @@ class MMQueueFeedforwardFeedbackReplicaController:
 		## Controller ID for pretty-printing
 		self.name = name
 
+		# Name the columns of reports, for the metrics registry
+		self.describeReport()
+
 	## Runs the control loop.
 	# Basically retrieves self.lastestLatencies and computes a new self.dimmer.
 	# Ask Martina for details. :P
@@ -86,7 +92,7 @@ class MMQueueFeedforwardFeedbackReplicaController:
 	
 		if self.latestLatencies:
 			# Possible choices: max or avg latency control
-			serviceTime = np.percentile(self.latestLatencies, self.percentile)
+			serviceTime = self.latestLatencies.estimate()
 			serviceLevel = self.dimmer
 
 			# feedforward
@@ -107,20 +113,8 @@ class MMQueueFeedforwardFeedbackReplicaController:
 			
 			output_dimmer = self.dimmer # replica is active, print correct value
 		
-		# Report
-		valuesToOutput = [ \
-			self.sim.now, \
-			avg(self.latestLatencies), \
-			maxOrNan(self.latestLatencies), \
-			self.dimmer, \
-			output_dimmer, \
-		]
-		self.sim.output(self, ','.join(["{0:.5f}".format(value) \
-			for value in valuesToOutput]))
-
-		# Re-run later
-		self.latestLatencies = []
-		self.sim.add(self.controlPeriod, self.runControlLoop)
+		# Report, suspending the loop until reportData() if there were no latencies
+		self.endControlPeriod(output_dimmer)
 
 	def withOptional(self):
 		return self.random.random() <= self.dimmer, self.dimmer
@@ -128,6 +122,7 @@ class MMQueueFeedforwardFeedbackReplicaController:
 	def reportData(self, responseTime, queueLenght, timeY, timeN):
 	  # save all
 		self.latestLatencies.append(responseTime)
+		self.resumeControlLoop()
 		self.queueLenght = queueLenght
 		self.timeY = timeY
 		self.timeN = timeN
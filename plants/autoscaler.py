@@ -75,12 +75,15 @@ class AutoScaler:
 		## reporting interval
 		self.reportInterval = 1
 
+		# Name the columns of reports, for the metrics registry
+		self.sim.describeOutput(self, ('time', 'stopped', 'starting', 'started', 'stopping'))
+
 		# start reporting
-		self.sim.add(self.reportInterval, self.runReportLoop)
+		self.sim.every(self.reportInterval, self.runReportLoop)
 
 		# start control
 		self.sim.add(0, lambda: self.controller.onStatus(self.getStatus()))
-		self.sim.add(self.controller.controlInterval, self.runControlLoop)
+		self.sim.every(self.controller.controlInterval, self.runControlLoop)
 
 	## Adds a new back-end server and initializes decision variables.
 	# @param backend the server to add
@@ -93,7 +96,9 @@ class AutoScaler:
 	def request(self, request):
 		newRequest = Request()
 		newRequest.originalRequest = request
-		newRequest.onCompleted = lambda: self.onCompleted(newRequest)
+		newRequest.onCompleted = self.onCompleted
+		if self.sim.tracing:
+			self.sim.traceMark(self, 'forward', newRequest)
 		self.loadBalancer.request(newRequest)
 
 		action = self.controller.onRequest(newRequest)
@@ -105,7 +110,7 @@ class AutoScaler:
 		self.numRequests += 1
 		originalRequest = request.originalRequest
 		originalRequest.withOptional = request.withOptional
-		originalRequest.onCompleted()
+		originalRequest.onCompleted(originalRequest)
 
 		action = self.controller.onCompleted(request)
 		self.scaleBy(action)
@@ -115,21 +120,18 @@ class AutoScaler:
 	def runReportLoop(self):		
 		status = self.getStatus()
 
-		valuesToOutput = [ self.sim.now,
+		valuesToOutput = ( self.sim.now,
 			status[BackendStatus.STOPPED],
 			status[BackendStatus.STARTING],
 			status[BackendStatus.STARTED],
 			status[BackendStatus.STOPPING],
-		]
-		self.sim.output(self, ','.join(["{0:.5f}".format(value) \
-			for value in valuesToOutput]))
-		self.sim.add(self.reportInterval, self.runReportLoop)
+		)
+		self.sim.output(self, valuesToOutput)
 
 	## Run control loop.
 	def runControlLoop(self):		
 		action = self.controller.onControlPeriod()
 		self.scaleBy(action)
-		self.sim.add(self.controller.controlInterval, self.runControlLoop)
 
 	## Get status of auto-scaler
 	# @return a dict with the number of backends in each state.
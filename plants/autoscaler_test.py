@@ -31,7 +31,7 @@ class MockLoadBalancer:
         else:
             request.withOptional = False
         self.numSeenRequests += 1
-        self.sim.add(self.latency, request.onCompleted)
+        self.sim.add(self.latency, request.onCompleted, request)
 
     def removeBackend(self, backend, onShutdown):
         self.sim.add(self.latency, onShutdown)
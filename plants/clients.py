@@ -1,6 +1,7 @@
 import random as xxx_random # prevent accidental usage
 
 from base import *
+from base.utils import FloatBuffer
 
 ## Simulates an open-loop client.
 # The clients have an exponential arrival time.
@@ -9,7 +10,9 @@ class OpenLoopClient:
 	# @param sim Simulator to attach client to
 	# @param server server-like entity to which requests are sent
 	# @param rate average arrival rate
-	def __init__(self, sim, server, rate = 0, seed = 1):
+	# @param responseTimes where to append response times, e.g., a
+	# base.sketch.QuantileSketch; by default, a new FloatBuffer
+	def __init__(self, sim, server, rate = 0, seed = 1, responseTimes = None):
 		## average arrival rate (model parameter)
 		self.rate = rate
 
@@ -28,7 +31,9 @@ class OpenLoopClient:
 		# with optional content (metric)
 		self.numCompletedRequestsWithOptional = 0
 		## Store all response times (metric)
-		self.responseTimes = []
+		self.responseTimes = FloatBuffer() if responseTimes is None else responseTimes
+		## handle of the pending request issuing event, if any
+		self.pendingRequest = None
 
 		self.scheduleRequest()
 
@@ -39,7 +44,9 @@ class OpenLoopClient:
 
 		request = Request()
 		request.createdAt = self.sim.now
-		request.onCompleted = lambda: self.onCompleted(request)
+		request.onCompleted = self.onCompleted
+		if self.sim.tracing:
+			self.sim.traceMark(self, 'send', request)
 		self.server.request(request)
 
 		# Schedule the next one
@@ -47,10 +54,14 @@ class OpenLoopClient:
 
 	## Schedules the next request.
 	def scheduleRequest(self):
-		# If rate is changed from nonzero to zero, event will still be in simulator
+		# Drop the previously scheduled request, if the rate changed before it
+		# was issued
+		if self.pendingRequest is not None:
+			self.sim.cancel(self.pendingRequest)
+			self.pendingRequest = None
 		if self.rate > 0:
 			interval = self.random.expovariate(self.rate)
-			self.sim.update(interval, self.issueRequest)
+			self.pendingRequest = self.sim.add(interval, self.issueRequest)
 
 	## Called when a request completes
 	# @param request the request that has been completed
@@ -59,6 +70,8 @@ class OpenLoopClient:
 		if request.withOptional:
 			self.numCompletedRequestsWithOptional += 1
 		self.responseTimes.append(self.sim.now - request.createdAt)
+		if self.sim.tracing:
+			self.sim.traceMark(self, 'reply', request)
 		
 	def setRate(self, rate):
 		self.rate = rate
@@ -78,7 +91,9 @@ class ClosedLoopClient:
 	# @param sim Simulator to attach client to
 	# @param server server-like entity to which requests are sent
 	# @param thinkTime average think-time between issuing consecutive requests
-	def __init__(self, sim, server, thinkTime = 1, seed = 1):
+	# @param responseTimes where to append response times, e.g., a
+	# base.sketch.QuantileSketch; by default, a new FloatBuffer
+	def __init__(self, sim, server, thinkTime = 1, seed = 1, responseTimes = None):
 		## average think-time (model parameter)
 		self.averageThinkTime = thinkTime
 		## ID of this client used for pretty-printing
@@ -97,9 +112,11 @@ class ClosedLoopClient:
 		# with optional content (metric)
 		self.numCompletedRequestsWithOptional = 0
 		## Store all response times (metric)
-		self.responseTimes = []
+		self.responseTimes = FloatBuffer() if responseTimes is None else responseTimes
 		## Variable used to deactive the client
 		self.active = True
+		## handle of the pending request issuing event, if any
+		self.pendingRequest = None
 		## separate random number generator
 		self.random = xxx_random.Random()
 		self.random.seed(seed)
@@ -113,8 +130,10 @@ class ClosedLoopClient:
 			return
 		request = Request()
 		request.createdAt = self.sim.now
-		request.onCompleted = lambda: self.onCompleted(request)
+		request.onCompleted = self.onCompleted
 		#self.sim.log(self, "Requested {0}", request)
+		if self.sim.tracing:
+			self.sim.traceMark(self, 'send', request)
 		self.server.request(request)
 
 	## Called when a request completes
@@ -124,17 +143,24 @@ class ClosedLoopClient:
 		if request.withOptional:
 			self.numCompletedRequestsWithOptional += 1
 		self.responseTimes.append(self.sim.now - request.createdAt)
+		if self.sim.tracing:
+			self.sim.traceMark(self, 'reply', request)
 		self.think()
 
 	def think(self):
+		if not self.active:
+			return
 		thinkTime = self.random.expovariate(1.0 / self.averageThinkTime)
-		self.sim.add(thinkTime, self.issueRequest)
+		self.pendingRequest = self.sim.add(thinkTime, self.issueRequest)
 
 	## Deactive this client.
 	# The client will not issue any more requests and no new simulator events
 	# are created. Hence, the object can be garbage-collected.
 	def deactivate(self):
 		self.active = False
+		if self.pendingRequest is not None:
+			self.sim.cancel(self.pendingRequest)
+			self.pendingRequest = None
 	
 	## Pretty-print client's name
 	def __str__(self):
@@ -1,4 +1,5 @@
 from base import SimulatorKernel
+from base.sketch import QuantileSketch
 from clients import ClosedLoopClient, OpenLoopClient
 
 eps = 10e-6
@@ -15,7 +16,7 @@ class MockServer:
         else:
             request.withOptional = False
         self.numSeenRequests += 1
-        self.sim.add(self.latency, request.onCompleted)
+        self.sim.add(self.latency, request.onCompleted, request)
 
 def test_open_client():
     sim = SimulatorKernel()
@@ -95,6 +96,17 @@ def test_closed_client_with_latency():
     assert len(client.responseTimes) == client.numCompletedRequests
     assert abs(max(client.responseTimes) - 1.0) < eps, max(client.responseTimes)
 
+def test_closed_client_with_sketch():
+    sim = SimulatorKernel(outputDirectory = None)
+    server = MockServer(sim, latency = 1)
+    responseTimes = QuantileSketch()
+    client = ClosedLoopClient(sim, server, responseTimes = responseTimes)
+    sim.run(until = 100)
+
+    assert client.responseTimes is responseTimes
+    assert len(responseTimes) == client.numCompletedRequests
+    assert abs(responseTimes.percentile(99) - 1) <= 0.01
+
 def test_closed_client_off():
     sim = SimulatorKernel()
     server = MockServer(sim)
@@ -104,6 +116,16 @@ def test_closed_client_off():
 
     assert server.numSeenRequests < 20, server.numSeenRequests
 
+def test_closed_client_off_cancels_pending_request():
+    sim = SimulatorKernel()
+    server = MockServer(sim)
+    client = ClosedLoopClient(sim, server)
+    sim.add(10, lambda: client.deactivate())
+    sim.run(until = 100)
+
+    # Nothing left in the simulator after deactivation
+    assert sim.now <= 10, sim.now
+
 def test_closed_client_str():
     sim = SimulatorKernel()
     server = MockServer(sim)
@@ -84,7 +84,7 @@ class LoadBalancer:
 		#solvers.options['show_progress'] = False
 
 		# Launch control loop
-		self.sim.add(0, self.runControlLoop)
+		self.sim.every(self.controlPeriod, self.runControlLoop, delay = 0)
 
 	## Adds a new back-end server and initializes decision variables.
 	# @param backend the server to add
@@ -121,8 +121,8 @@ class LoadBalancer:
 		self.lastThetaErrors = [ 0 ] * n
 		self.lastThetas = [ self.initialTheta ] * n # to be updated at onComplete
 		self.lastLastThetas = [ self.initialTheta ] * n # to be updated at onComplete
-		self.lastLatencies = [ [] for _ in range(n) ] # to be updated at onComplete
-		self.lastLastLatencies = [ [] for _ in range(n) ]
+		self.lastLatencies = [ FloatBuffer() for _ in range(n) ] # to be updated at onComplete
+		self.lastLastLatencies = [ FloatBuffer() for _ in range(n) ]
 		self.lastQueueLengths = [ 0 ] * n
 		assert len(self.queueLengths) == n
 		self.queueOffsets = [ 0 ] * n
@@ -135,6 +135,16 @@ class LoadBalancer:
 
 		self.weights = [ 1.0 / len(self.backends) ] * len(self.backends)
 
+		# Name the columns of reports, which depend on the back-ends
+		names = [ str(backend) for backend in self.backends ]
+		self.sim.describeOutput(self, [ 'time' ] + \
+			[ 'weight-' + name for name in names ] + \
+			[ 'theta-' + name for name in names ] + \
+			[ 'avgLatency-' + name for name in names ] + \
+			[ 'maxLatency-' + name for name in names ] + \
+			[ 'numRequests', 'numRequestsWithOptional' ] + \
+			[ 'effectiveWeight-' + name for name in names ])
+
 	## Handles a request.
 	# @param request the request to handle
 	def request(self, request):
@@ -277,8 +287,10 @@ class LoadBalancer:
 		request.chosenBackend = self.backends[chosenBackendIndex]
 		newRequest = Request()
 		newRequest.originalRequest = request
-		newRequest.onCompleted = lambda: self.onCompleted(newRequest)
+		newRequest.onCompleted = self.onCompleted
 		#self.sim.log(self, "Directed request to {0}", chosenBackendIndex)
+		if self.sim.tracing:
+			self.sim.traceMark(self, 'route', newRequest)
 		self.queueLengths[chosenBackendIndex] += 1
 		self.numRequestsPerReplica[chosenBackendIndex] += 1
 		self.backends[chosenBackendIndex].request(newRequest)
@@ -318,7 +330,7 @@ class LoadBalancer:
 				(1 - ewmaAlpha) * self.ewmaResponseTime[chosenBackendIndex]
 	
 		# Call original onCompleted
-		request.onCompleted()
+		request.onCompleted(request)
 
 	## Run control loop.
 	# Takes as input the dimmers and computes new weights. Also outputs
@@ -441,7 +453,6 @@ class LoadBalancer:
 
 		self.lastNumRequests = self.numRequests
 		self.iteration += 1
-		self.sim.add(self.controlPeriod, self.runControlLoop)
 
 		# Compute effective weights
 		effectiveWeights = [ self.numRequestsPerReplica[i] - self.numLastRequestsPerReplica[i] \
@@ -460,16 +471,17 @@ class LoadBalancer:
 			
 		valuesToOutput = [ self.sim.now ] + self.weights + self.lastThetas + \
 			[ avg(latencies) for latencies in self.lastLatencies ] + \
-			[ max(latencies + [0]) for latencies in self.lastLatencies ] + \
+			[ max(latencies or [ 0 ]) for latencies in self.lastLatencies ] + \
 			[ self.numRequests, self.numRequestsWithOptional ] + \
 			effectiveWeights
-		self.sim.output(self, ','.join(["{0:.5f}".format(value) \
-			for value in valuesToOutput]))
+		self.sim.output(self, tuple(valuesToOutput))
 		
 		self.lastQueueLengths = self.queueLengths[:]
 		self.lastLastThetas = self.lastThetas[:]
-		self.lastLastLatencies = self.lastLatencies
-		self.lastLatencies = [ [] for _ in self.backends ]
+		# Reuse the buffers of the period before the last one
+		self.lastLastLatencies, self.lastLatencies = self.lastLatencies, self.lastLastLatencies
+		for latencies in self.lastLatencies:
+			latencies.reset()
 		self.numLastRequestsPerReplica = self.numRequestsPerReplica[:]
 
 	## Pretty-print load-balancer's name.
@@ -31,7 +31,7 @@ class MockServer:
             request.withOptional = False
             request.theta = 0
         self.numSeenRequests += 1
-        self.sim.add(self.latency, request.onCompleted)
+        self.sim.add(self.latency, request.onCompleted, request)
 
 def test_remove_while_request_in_progress():
     sim = SimulatorKernel(outputDirectory = None)
@@ -60,7 +60,7 @@ def test_remove_while_request_in_progress():
     sim.add(2, lambda: lb.request(Request()))
     sim.run()
 
-    r1.onCompleted.assert_called_once_with()
+    r1.onCompleted.assert_called_once_with(r1)
     onShutdownCompleted.assert_called_once_with()
     assert server1.numSeenRequests == 1 or server2.numSeenRequests == 1
     assert server1.numSeenRequests == 3 or server2.numSeenRequests == 3
@@ -92,7 +92,7 @@ def test_remove_while_request_not_in_progress():
     sim.add(2, lambda: lb.request(Request()))
     sim.run()
 
-    r1.onCompleted.assert_called_once_with()
+    r1.onCompleted.assert_called_once_with(r1)
     onShutdownCompleted.assert_called_once_with()
     assert server1.numSeenRequests == 1 or server2.numSeenRequests == 1
     assert server1.numSeenRequests == 3 or server2.numSeenRequests == 3
@@ -125,9 +125,9 @@ def test_remove_two_servers_while_request_in_progress():
     sim.add(2, lambda: lb.removeBackend(server2, onShutdownCompleted))
     sim.run()
 
-    r1.onCompleted.assert_called_once_with()
-    r2.onCompleted.assert_called_once_with()
-    r3.onCompleted.assert_called_once_with()
+    r1.onCompleted.assert_called_once_with(r1)
+    r2.onCompleted.assert_called_once_with(r2)
+    r3.onCompleted.assert_called_once_with(r3)
     assert onShutdownCompleted.call_count == 2
     assert server1.numSeenRequests == 1
     assert server2.numSeenRequests == 1
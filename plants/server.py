@@ -43,7 +43,7 @@ class Server:
 		## how often to report metrics
 		self.reportPeriod = 1
 		## latencies during the last report interval
-		self.latestLatencies = []
+		self.latestLatencies = FloatBuffer()
 		## reference to controller
 		self.controller = None
 
@@ -66,6 +66,14 @@ class Server:
 		self.random = xxx_random.Random()
 		self.random.seed(seed)
 
+		# Name the columns of reports, for the metrics registry
+		self.sim.describeOutput(self, ('time', 'avgLatency', 'maxLatency', 'utilization'))
+		self.sim.describeOutput(str(self) + '-rt', ('time', 'arrival', 'responseTime'))
+		self.sim.describeOutput(str(self) + '-arl', ('time', 'queueLength'))
+
+		## handle of the periodic report event
+		self.reportLoop = self.sim.every(self.reportPeriod, self.runReportLoop)
+
 		# Initialize reporting
 		self.runReportLoop()
 
@@ -81,29 +89,38 @@ class Server:
 		return ret
 
 	## Runs report loop.
-	# Regularly report on the status of the server
+	# Regularly report on the status of the server. The loop is suspended while
+	# the server is idle, since it would only report the absence of latencies
+	# and a zero utilization, and resumed by request().
 	def runReportLoop(self):
 		# Compute utilization
 		utilization = (self.getActiveTime() - self.lastActiveTime) / self.reportPeriod
 		self.lastActiveTime = self.getActiveTime()
 
 		# Report
-		valuesToOutput = [ \
-			self.sim.now, \
-			avg(self.latestLatencies), \
-			maxOrNan(self.latestLatencies), \
-			utilization, \
-		]
-		self.sim.output(self, ','.join(["{0:.5f}".format(value) \
-			for value in valuesToOutput]))
+		self.outputReport(self.sim.now, self.latestLatencies, utilization)
 
-		# Re-run later
-		self.latestLatencies = []
-		self.sim.add(self.reportPeriod, self.runReportLoop)
+		self.latestLatencies.reset()
+		if len(self.activeRequests) == 0:
+			self.sim.suspend(self.reportLoop,
+				lambda time: self.outputReport(time, [], 0))
+
+	## Output a report row
+	# @param now time of the report
+	# @param latencies latencies during the last report interval
+	# @param utilization utilization during the last report interval
+	def outputReport(self, now, latencies, utilization):
+		valuesToOutput = ( \
+			now, \
+			avg(latencies), \
+			maxOrNan(latencies), \
+			utilization, \
+		)
+		self.sim.output(self, valuesToOutput)
 
 	## Tells the server to serve a request.
 	# @param request request to serve
-	# @note When request completes, request.onCompleted() is called.
+	# @note When request completes, request.onCompleted(request) is called.
 	# The following attributes are added to the request:
 	# <ul>
 	#   <li>theta, the current dimmer value</li>
@@ -115,16 +132,18 @@ class Server:
 		# Activate scheduler, if its not active
 		if len(self.activeRequests) == 0:
 			self.sim.add(0, self.onScheduleRequests)
+			self.sim.resume(self.reportLoop)
 		# Add request to list of active requests
 		self.activeRequests.append(request)
+		if self.sim.tracing:
+			self.sim.traceMark(self, 'arrive', request)
 
 		# Report queue length
-		valuesToOutput = [ \
+		valuesToOutput = ( \
 			self.sim.now, \
 			len(self.activeRequests), \
-		]
-		self.sim.output(str(self) + '-arl', ','.join(["{0:.5f}".format(value) \
-			for value in valuesToOutput]))
+		)
+		self.sim.output(str(self) + '-arl', valuesToOutput)
 			
 		#print "request() to %s at time %f"%(self.name, self.sim.now)
 
@@ -147,7 +166,7 @@ class Server:
 	#   <li>By request(), when the list of active requests was previously empty.
 	#   </li>
 	#   <li>By onCompleted(), to pick a new request to schedule</li>
-	#   <li>By itself, when a request is preempted, i.e., context-switched</li>
+	#   <li>By onPreempted(), when a request is preempted, i.e., context-switched</li>
 	# </ul>
 	def onScheduleRequests(self):
 		#self.sim.log(self, "scheduling")
@@ -175,6 +194,8 @@ class Server:
 		# Schedule it to run for a bit
 		timeToExecuteActiveRequest = min(self.timeSlice, activeRequest.remainingTime)
 		activeRequest.remainingTime -= timeToExecuteActiveRequest
+		if self.sim.tracing:
+			self.sim.traceMark(self, 'run', activeRequest)
 
 		# Will it finish?
 		if activeRequest.remainingTime == 0:
@@ -182,8 +203,7 @@ class Server:
 			self.activeRequests.appendleft(activeRequest)
 
 			# Run onComplete when done
-			self.sim.add(timeToExecuteActiveRequest, \
-				lambda: self.onCompleted(activeRequest))
+			self.sim.add(timeToExecuteActiveRequest, self.onCompleted, activeRequest)
 			#self.sim.log(self, "request {0} will execute for {1} to completion", \
 			#	activeRequest, timeToExecuteActiveRequest)
 		else:
@@ -192,12 +212,21 @@ class Server:
 			self.activeRequests.append(activeRequest)
 
 			# Re-run scheduler when time-slice has expired
-			self.sim.add(timeToExecuteActiveRequest, self.onScheduleRequests)
+			self.sim.add(timeToExecuteActiveRequest, self.onPreempted, activeRequest)
 			#self.sim.log(self, "request {0} will execute for {1} not to completion",\
 			#	activeRequest, timeToExecuteActiveRequest)
 
+	## Event handler for time-slice expiry.
+	# Marks the request as preempted and calls onScheduleRequests() to pick a
+	# new request to schedule.
+	# @param request request whose time-slice expired
+	def onPreempted(self, request):
+		if self.sim.tracing:
+			self.sim.traceMark(self, 'preempt', request)
+		self.onScheduleRequests()
+
 	## Event handler for request completion.
-	# Marks the request as completed, calls request.onCompleted() and calls
+	# Marks the request as completed, calls request.onCompleted(request) and calls
 	# onScheduleRequests() to pick a new request to schedule.
 	# @param request request that has received enough service time
 	def onCompleted(self, request):
@@ -213,28 +242,28 @@ class Server:
 
 		# And completed it
 		request.completion = self.sim.now
+		if self.sim.tracing:
+			self.sim.traceMark(self, 'complete', request)
 		self.latestLatencies.append(request.completion - request.arrival)
 		if self.controller:
 			self.controller.reportData(request.completion - request.arrival,
 			  len(self.activeRequests), self.serviceTimeY, self.serviceTimeN)
-		request.onCompleted()
+		request.onCompleted(request)
 
 		# Report
-		valuesToOutput = [ \
+		valuesToOutput = ( \
 			self.sim.now, \
 			request.arrival, \
 			request.completion - request.arrival, \
-		]
-		self.sim.output(str(self)+'-rt', ','.join(["{0:.5f}".format(value) \
-			for value in valuesToOutput]))
+		)
+		self.sim.output(str(self)+'-rt', valuesToOutput)
 
 		# Report queue length
-		valuesToOutput = [ \
+		valuesToOutput = ( \
 			self.sim.now, \
 			len(self.activeRequests), \
-		]
-		self.sim.output(str(self) + '-arl', ','.join(["{0:.5f}".format(value) \
-			for value in valuesToOutput]))
+		)
+		self.sim.output(str(self) + '-arl', valuesToOutput)
 
 		# Continue with scheduler
 		if len(self.activeRequests) > 0:
@@ -1,7 +1,12 @@
 from mock import Mock
+import os
+import shutil
+import tempfile
 
 from server import Server
 from base import Request, SimulatorKernel
+from base.metrics import MetricsRegistry
+from base.tracing import RequestTracer, loadRequestTrace, splitServerTime
 
 eps = 10e-6
 
@@ -13,11 +18,11 @@ def test_without_controller():
     server = Server(sim, serviceTimeY = 1, serviceTimeYVariance = 0)
 
     r = Request()
-    r.onCompleted = lambda: completedRequests.append(r)
+    r.onCompleted = completedRequests.append
     sim.add(0, lambda: server.request(r))
     
     r2 = Request()
-    r2.onCompleted = lambda: completedRequests.append(r2)
+    r2.onCompleted = completedRequests.append
     sim.add(0, lambda: server.request(r2))
 
     sim.run()
@@ -38,11 +43,11 @@ def test_with_controller_always_no():
     server.controller = controller
 
     r = Request()
-    r.onCompleted = lambda: completedRequests.append(r)
+    r.onCompleted = completedRequests.append
     sim.add(0, lambda: server.request(r))
     
     r2 = Request()
-    r2.onCompleted = lambda: completedRequests.append(r2)
+    r2.onCompleted = completedRequests.append
     sim.add(0, lambda: server.request(r2))
 
     sim.run()
@@ -65,11 +70,11 @@ def test_with_controller_always_yes():
     server.controller = controller
 
     r = Request()
-    r.onCompleted = lambda: completedRequests.append(r)
+    r.onCompleted = completedRequests.append
     sim.add(0, lambda: server.request(r))
     
     r2 = Request()
-    r2.onCompleted = lambda: completedRequests.append(r2)
+    r2.onCompleted = completedRequests.append
     sim.add(0, lambda: server.request(r2))
 
     sim.run()
@@ -78,3 +83,59 @@ def test_with_controller_always_yes():
 
     assert set(completedRequests) == set([ r, r2 ])
     assert abs(server.getActiveTime() - 20.0) < eps, server.getActiveTime()
+
+def test_report_loop_suspended_while_idle():
+    sim = SimulatorKernel(outputDirectory = None)
+    rows = []
+    sim.output = lambda issuer, values: rows.append(
+        ','.join([ "{0:.5f}".format(value) for value in values ]))
+
+    server = Server(sim, serviceTimeY = 1.5, serviceTimeYVariance = 0, timeSlice = 10)
+    r = Request()
+    r.onCompleted = lambda request: None
+    sim.add(3.5, lambda: server.request(r))
+    sim.run(until = 7)
+
+    # Only the loop of the busy period triggers events
+    assert sim.numEvents == 5, sim.numEvents
+    times = [ float(row.split(',')[0]) for row in rows if row.count(',') == 3 ]
+    assert times == [ 0, 1, 2, 3, 4, 5, 6, 7 ], rows
+    assert rows[3] == '3.00000,nan,nan,0.00000', rows
+    assert rows[-3] == '5.00000,1.50000,1.50000,1.00000', rows
+
+def test_metrics():
+    metrics = MetricsRegistry()
+    sim = SimulatorKernel(outputDirectory = None, metrics = metrics)
+
+    server = Server(sim, serviceTimeY = 1, serviceTimeYVariance = 0, timeSlice = 10)
+    for _ in range(0, 2):
+        r = Request()
+        r.onCompleted = lambda request: None
+        sim.add(0, server.request, r)
+    sim.run(until = 3)
+
+    assert metrics.query(str(server) + '-rt', 'responseTime') == [ (1.0, 1.0), (2.0, 1.0) ]
+    assert metrics.last(server, 'utilization') == (3.0, 0.0)
+    assert max([ value for _, value in metrics.query(str(server) + '-arl', 'queueLength') ]) == 2
+
+def test_request_trace():
+    outputDirectory = tempfile.mkdtemp()
+    try:
+        requestTracer = RequestTracer(outputDirectory, samplingRate = 1)
+        sim = SimulatorKernel(outputDirectory = None, requestTracer = requestTracer)
+
+        # Both requests are executed in turns of 0.5, the second one waits
+        # for the first time slice of the first one
+        server = Server(sim, serviceTimeY = 1, serviceTimeYVariance = 0, timeSlice = 0.5)
+        requests = [ Request(), Request() ]
+        for request in requests:
+            request.onCompleted = lambda request: None
+            sim.add(0, server.request, request)
+        sim.run(until = 3)
+        sim.close()
+
+        marks = loadRequestTrace(os.path.join(outputDirectory, RequestTracer.FILENAME))
+        assert splitServerTime(marks[requests[0].requestId], str(server)) == (0, 1, 0.5)
+        assert splitServerTime(marks[requests[1].requestId], str(server)) == (0.5, 1, 0.5)
+    finally:
+        shutil.rmtree(outputDirectory)
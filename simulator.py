@@ -13,6 +13,11 @@ import sys
 
 from plants import AutoScaler, ClosedLoopClient, OpenLoopClient, LoadBalancer, Server
 from base import Request, SimulatorKernel
+from base.eventqueue import EVENT_QUEUES
+from base.kernel import LOG_LEVELS
+from base.output import FLUSH_POLICIES, OUTPUT_FORMATS, outputPolicy
+from base.sketch import QuantileSketch
+from base.tracing import EventTracer, RequestTracer
 from base.utils import *
 from controllers import loadControllerFactories
 
@@ -35,6 +40,36 @@ def distribution(s):
 		raise argparse.ArgumentTypeError(
 			'Unknown distribution; choose normalvariate or expovariate')
 
+## Custom type for argparse to represent log levels, e.g., "WARNING,as=INFO,server*=DEBUG"
+# @return list of (issuer pattern, level) pairs; the issuer pattern is None for
+# the level of all issuers
+def logLevels(s):
+	levels = []
+	for part in s.split(','):
+		issuer, _, levelName = part.rpartition('=')
+		if levelName.upper() not in LOG_LEVELS:
+			raise argparse.ArgumentTypeError(
+				'Unknown log level {0}; choose among {1}'.format(levelName,
+					' '.join(sorted(LOG_LEVELS, key = LOG_LEVELS.get))))
+		levels.append((issuer or None, LOG_LEVELS[levelName.upper()]))
+	return levels
+
+## Custom type for argparse to represent output policies, e.g.,
+# "*-arl=timeweighted:1,*-rt=sample:10"
+# @return list of (issuer pattern, policy factory) pairs, as taken by
+# SimulatorKernel.setOutputPolicy()
+def outputPolicies(s):
+	policies = []
+	for part in s.split(','):
+		if not part:
+			continue
+		issuer, _, spec = part.rpartition('=')
+		try:
+			policies.append((issuer or '*', outputPolicy(spec)))
+		except ValueError as e:
+			raise argparse.ArgumentTypeError(str(e))
+	return policies
+
 ## @package simulator Main simulator namespace
 
 ## Entry-point for simulator.
@@ -58,6 +93,81 @@ def main():
 	parser.add_argument('--scenario',
 		help = 'Specify a scenario in which to test the system',
 		default = os.path.join(os.path.dirname(sys.argv[0]), 'scenarios', 'replica-steady-1.py'))
+	parser.add_argument('--eventQueue',
+		choices = sorted(EVENT_QUEUES),
+		help = 'Event queue backend of the simulation kernel',
+		default = 'heap')
+	parser.add_argument('--clockResolution',
+		type = float,
+		help = 'Use an integer simulation clock with ticks of this many seconds, e.g., 1e-9; ' + \
+			'by default, the clock is a float',
+		default = None)
+	parser.add_argument('--profile',
+		action = 'store_true',
+		help = 'Print the number of events and the wall-clock time spent in each event handler ' + \
+			'at the end of each simulation')
+	parser.add_argument('--heartbeat',
+		type = float,
+		help = 'Every this many wall-clock seconds, log simulated time, events/s, speed, ' + \
+			'pending events, memory usage and ETA',
+		default = None)
+	parser.add_argument('--wallClockBudget',
+		type = float,
+		help = 'Stop each simulation after this many wall-clock seconds, and report the ' + \
+			'results obtained so far',
+		default = None)
+	parser.add_argument('--logLevel',
+		type = logLevels,
+		help = 'Log messages of at least this level: DEBUG, INFO, WARNING or ERROR; ' + \
+			'can be followed by per-issuer levels, e.g., WARNING,as=INFO,server*=DEBUG',
+		default = 'INFO')
+	parser.add_argument('--trace',
+		action = 'store_true',
+		help = 'Record the last TRACECAPACITY events of each simulation, and write them as ' + \
+			'trace.json in the output folder, to be opened with chrome://tracing or Perfetto')
+	parser.add_argument('--traceCapacity',
+		type = int,
+		help = 'Number of events to keep in the trace',
+		default = 1 << 20)
+	parser.add_argument('--requestSamplingRate',
+		type = float,
+		help = 'Record the hops of this fraction of requests, e.g., 0.01, with server time ' + \
+			'split into queueing, execution and preemption, as requests.bin in the output ' + \
+			'folder, read with base.tracing.loadRequestTrace()',
+		default = None)
+	parser.add_argument('--flushPolicy',
+		choices = FLUSH_POLICIES,
+		help = 'When to write output rows to files: line, as soon as they are output, e.g., ' + \
+			'to tail files live; size, in batches of rows; time, every few simulated seconds',
+		default = 'size')
+	parser.add_argument('--outputFormat',
+		choices = sorted(OUTPUT_FORMATS),
+		help = 'Format of output files: csv, text; npy, binary NumPy arrays, one per column of numbers, ' + \
+			'to be memory-mapped by analysis scripts, e.g., with base.output.loadNpyOutput(); ' + \
+			'container, a single sim.bin file for all issuers, read with base.output.OutputContainer',
+		default = 'csv')
+	parser.add_argument('--outputPolicy',
+		type = outputPolicies,
+		help = 'Per-issuer output policies: raw; sample:K, every K-th row; timeweighted:PERIOD, ' + \
+			'time-weighted mean and max per period; histogram:PERIOD, histogram per period; ' + \
+			'e.g., *-arl=timeweighted:1,*-rt=histogram:1',
+		default = '')
+	parser.add_argument('--asyncOutput',
+		action = 'store_true',
+		help = 'Format and write output files in a background thread, overlapping I/O with ' + \
+			'the simulation')
+	parser.add_argument('--responseTimeSketch',
+		type = float,
+		help = 'Summarize response times of clients in quantile sketches with this relative ' + \
+			'accuracy, e.g., 0.01, instead of keeping all of them; the reported percentiles ' + \
+			'are then within this relative error',
+		default = None)
+	parser.add_argument('--warmUp',
+		type = float,
+		help = 'Simulate until this time once with the first load-balancing algorithm, then ' + \
+			'fork and continue with each load-balancing algorithm in parallel; ' + \
+			'results are written in one sub-folder per algorithm',
+		default = None)
 
 	group = parser.add_argument_group('ac', 'General autoscaler controller options')
 	group.add_argument('--ac',
@@ -89,7 +199,7 @@ def main():
 	# Add load-balancer specific command-line arguments
 	group = parser.add_argument_group('lb', 'Load-balancer options')
 	group.add_argument('--lb',
-		help = 'Load-balancer algorithm or ALL: ' + ' '.join(LoadBalancer.ALGORITHMS),
+		help = 'Comma-separated load-balancer algorithms or ALL: ' + ' '.join(LoadBalancer.ALGORITHMS),
 		default = 'ALL')
 	group.add_argument('--equal-theta-gain',
 		type = float,
@@ -114,15 +224,16 @@ def main():
 		parser.print_help()
 		quit()
 
-	# Find load-balancing algorithm
+	# Find load-balancing algorithms
 	if args.lb == 'ALL':
 		loadBalancingAlgorithms = LoadBalancer.ALGORITHMS
-	elif args.lb in LoadBalancer.ALGORITHMS:
-		loadBalancingAlgorithms = [args.lb]
 	else:
-		print("Unsupported algorithm '{0}'".format(args.lb), file = sys.stderr)
-		parser.print_help()
-		quit()
+		loadBalancingAlgorithms = args.lb.split(',')
+		for algorithm in loadBalancingAlgorithms:
+			if algorithm not in LoadBalancer.ALGORITHMS:
+				print("Unsupported algorithm '{0}'".format(algorithm), file = sys.stderr)
+				parser.print_help()
+				quit()
 
 	# Find replica controller factory
 	replicaControllerFactories = filter(lambda rc: args.rc == 'ALL' or rc.getName() == args.rc, replicaControllerFactories)
@@ -137,8 +248,14 @@ def main():
 	for replicaControllerFactory in replicaControllerFactories:
 		replicaControllerFactory.parseCommandLine(args)
 
+	# With warm-up, a single simulation is forked into all load-balancing algorithms
+	if args.warmUp is None:
+		loadBalancingAlgorithmBranches = [ [ algorithm ] for algorithm in loadBalancingAlgorithms ]
+	else:
+		loadBalancingAlgorithmBranches = [ loadBalancingAlgorithms ]
+
 	for autoScalerControllerFactory in autoScalerControllerFactories:
-		for loadBalancingAlgorithm in loadBalancingAlgorithms:
+		for branchAlgorithms in loadBalancingAlgorithmBranches:
 			for replicaControllerFactory in replicaControllerFactories:
 				outdir = os.path.join(args.outdir, autoScalerControllerFactory.getName(), replicaControllerFactory.getName())
 				if not os.path.exists(outdir): # Not cool, Python!
@@ -150,10 +267,25 @@ def main():
 						replicaControllerFactory = replicaControllerFactory,
 						scenario = args.scenario,
 						timeSlice = args.timeSlice,
-						loadBalancingAlgorithm = loadBalancingAlgorithm,
+						loadBalancingAlgorithm = branchAlgorithms[0],
 						equal_theta_gain = args.equal_theta_gain,
 						equal_thetas_fast_gain = args.equal_thetas_fast_gain,
 						startupDelay = args.startupDelay,
+						eventQueue = args.eventQueue,
+						clockResolution = args.clockResolution,
+						warmUp = args.warmUp,
+						profile = args.profile,
+						heartbeatInterval = args.heartbeat,
+						wallClockBudget = args.wallClockBudget,
+						logLevels = args.logLevel,
+						traceCapacity = args.traceCapacity if args.trace else None,
+						requestSamplingRate = args.requestSamplingRate,
+						flushPolicy = args.flushPolicy,
+						outputFormat = args.outputFormat,
+						asyncOutput = args.asyncOutput,
+						outputPolicies = args.outputPolicy,
+						responseTimeSketch = args.responseTimeSketch,
+						branchAlgorithms = branchAlgorithms,
 					)
 				except Exception as e:
 					print("Caught exception with {0} and {1}: {2}".
@@ -169,22 +301,67 @@ def main():
 # @param equal_theta_gain parameter for load-balancing algorithm (TODO: move into LoadBalancingAlgorithm)
 # @param equal_thetas_fast_gain paramater for load-balancing algorithm (TODO: move into LoadBalancingAlgorithm)
 # @param startupDelay a tuple of the form (distribution, param1, param2)
+# @param eventQueue name of the event queue backend of the simulation kernel
+# @param clockResolution tick duration of the integer simulation clock, None for a float clock
+# @param warmUp if not None, simulate until this time with loadBalancingAlgorithm, then fork
+# the simulation once for each of branchAlgorithms, writing results in a sub-folder of outdir;
+# raises RuntimeError if the simulation of a branch failed
+# @param branchAlgorithms load-balancing algorithm names to continue the simulation with after warm-up,
+# None to only continue with loadBalancingAlgorithm
+# @param profile whether to profile event handlers
+# @param heartbeatInterval wall-clock seconds between progress reports, None to disable
+# @param wallClockBudget wall-clock seconds after which the simulation is stopped, None for no limit
+# @param logLevels list of (issuer pattern, level) pairs, as returned by logLevels()
+# @param traceCapacity number of events to record in the trace, None to disable tracing
+# @param requestSamplingRate fraction of requests whose hops are recorded, None to disable
+# request tracing
+# @param flushPolicy when to write output rows to files, one of base.output.FLUSH_POLICIES
+# @param outputFormat format of output files, one of base.output.OUTPUT_FORMATS
+# @param asyncOutput whether to write output files in a background thread
+# @param outputPolicies list of (issuer pattern, policy factory) pairs, as returned by outputPolicies()
+# @param metrics optional base.metrics.MetricsRegistry, in which the simulated entities record
+# their reports, e.g., so that the caller can read them without reading output files
+# @param responseTimeSketch relative accuracy of the quantile sketches summarizing response
+# times of clients, None to keep all response times and compute exact results
 def runSingleSimulation(outdir, autoScalerControllerFactory, replicaControllerFactory, scenario, timeSlice,
-		loadBalancingAlgorithm, equal_theta_gain, equal_thetas_fast_gain, startupDelay):
+		loadBalancingAlgorithm, equal_theta_gain, equal_thetas_fast_gain, startupDelay, eventQueue = 'heap',
+		clockResolution = None, warmUp = None, branchAlgorithms = None, profile = False,
+		heartbeatInterval = None, wallClockBudget = None, logLevels = None, traceCapacity = None,
+		requestSamplingRate = None,
+		flushPolicy = 'size', outputFormat = 'csv', asyncOutput = False, outputPolicies = None,
+		metrics = None, responseTimeSketch = None):
 	startupDelayRng = random.Random()
 	startupDelayFunc = lambda: \
 		getattr(startupDelayRng, startupDelay[0])(*startupDelay[1:])
 	assert startupDelayFunc() # ensure the PRNG works
 	startupDelayRng.seed(1)
 
-	sim = SimulatorKernel(outputDirectory = outdir)
+	tracer = None
+	if traceCapacity is not None:
+		tracer = EventTracer(capacity = traceCapacity)
+	requestTracer = None
+	if requestSamplingRate is not None and outdir is not None:
+		requestTracer = RequestTracer(outdir, samplingRate = requestSamplingRate)
+	sim = SimulatorKernel(outputDirectory = outdir, eventQueue = eventQueue,
+		clockResolution = clockResolution, profile = profile,
+		heartbeatInterval = heartbeatInterval, wallClockBudget = wallClockBudget,
+		tracer = tracer, flushPolicy = flushPolicy, outputFormat = outputFormat,
+		asyncOutput = asyncOutput, metrics = metrics, requestTracer = requestTracer)
+	for issuer, level in logLevels or []:
+		sim.setLogLevel(level, issuer)
+	for issuer, policy in outputPolicies or []:
+		sim.setOutputPolicy(policy, issuer)
 	servers = []
 	clients = []
+	def newResponseTimes():
+		if responseTimeSketch is None:
+			return None
+		return QuantileSketch(relativeAccuracy = responseTimeSketch)
 	loadBalancer = LoadBalancer(sim, controlPeriod = 1.0)
 	autoScaler = AutoScaler(sim, loadBalancer,
 				controller = autoScalerControllerFactory.newInstance(sim,
 					'as-ctr'), startupDelay = startupDelayFunc)
-	openLoopClient = OpenLoopClient(sim, autoScaler)
+	openLoopClient = OpenLoopClient(sim, autoScaler, responseTimes = newResponseTimes())
 
 
 	loadBalancer.algorithm = loadBalancingAlgorithm
@@ -192,27 +369,38 @@ def runSingleSimulation(outdir, autoScalerControllerFactory, replicaControllerFa
 	loadBalancer.equal_thetas_fast_gain = equal_thetas_fast_gain
 
 	# Define verbs for scenarios
+	# Events of timeline verbs are compiled into a list, added in bulk to the
+	# kernel once the scenario is loaded. The list is also flushed before
+	# entities are created, so that events keep the order in which the
+	# scenario defined them.
+	timeline = []
+	def flushTimeline():
+		sim.addMany(timeline)
+		del timeline[:]
+
 	def addClients(at, n):
 		def addClientsHandler():
 			for _ in range(0, n):
-				clients.append(ClosedLoopClient(sim, loadBalancer))
-		sim.add(at, addClientsHandler)
+				clients.append(ClosedLoopClient(sim, loadBalancer,
+					responseTimes = newResponseTimes()))
+		timeline.append((at, addClientsHandler))
 
 	def delClients(at, n):
 		def delClientsHandler():
 			for _ in range(0, n):
 				client = clients.pop()
 				client.deactivate()
-		sim.add(at, delClientsHandler)
+		timeline.append((at, delClientsHandler))
 
 	def changeServiceTime(at, serverId, y, n):
 		def changeServiceTimeHandler():
 			server = servers[serverId]
 			server.serviceTimeY = y
 			server.serviceTimeN = n
-		sim.add(at, changeServiceTimeHandler)
+		timeline.append((at, changeServiceTimeHandler))
 		
 	def addServer(y, n, autoScale = False):
+		flushTimeline()
 		server = Server(sim, \
 			serviceTimeY = y, serviceTimeN = n, \
 			timeSlice = timeSlice)
@@ -225,7 +413,7 @@ def runSingleSimulation(outdir, autoScalerControllerFactory, replicaControllerFa
 			loadBalancer.addBackend(server)
 	
 	def setRate(at, rate):
-		sim.add(at, lambda: openLoopClient.setRate(rate))
+		timeline.append((at, lambda: openLoopClient.setRate(rate)))
 	
 	def endOfSimulation(at):
 		otherParams['simulateUntil'] = at
@@ -233,39 +421,117 @@ def runSingleSimulation(outdir, autoScalerControllerFactory, replicaControllerFa
 	# Load scenario
 	otherParams = {}
 	execfile(scenario)
+	flushTimeline()
 
 	# For weighted-RR algorithm set the weights
-	if loadBalancingAlgorithm == 'weighted-RR':
-		serviceRates = np.array([ 1.0/x.serviceTimeY for x in servers ])
-		sumServiceRates = sum(serviceRates)
-		loadBalancer.weights = list(np.array(serviceRates / sumServiceRates))
+	def setLoadBalancingAlgorithm(loadBalancingAlgorithm):
+		loadBalancer.algorithm = loadBalancingAlgorithm
+		if loadBalancingAlgorithm == 'weighted-RR':
+			serviceRates = np.array([ 1.0/x.serviceTimeY for x in servers ])
+			sumServiceRates = sum(serviceRates)
+			loadBalancer.weights = list(np.array(serviceRates / sumServiceRates))
+	setLoadBalancingAlgorithm(loadBalancingAlgorithm)
 	
 	if 'simulateUntil' not in otherParams:
 		raise Exception("Scenario does not define end-of-simulation")
-	sim.run(until = otherParams['simulateUntil'])
 
 	# Report end results
-	responseTimes = reduce(lambda x,y: x+y, [client.responseTimes for client in clients], []) + openLoopClient.responseTimes
-	numRequestsWithOptional = sum([client.numCompletedRequestsWithOptional for client in clients]) + openLoopClient.numCompletedRequestsWithOptional
-
-	toReport = []
-	toReport.append(( "autoScalerAlgorithm", autoScalerControllerFactory.getName().ljust(20) ))
-	toReport.append(( "loadBalancingAlgorithm", loadBalancingAlgorithm.ljust(20) ))
-	toReport.append(( "replicaAlgorithm", replicaControllerFactory.getName().ljust(20) ))
-	toReport.append(( "numRequests", str(len(responseTimes)).rjust(7) ))
-	toReport.append(( "numRequestsWithOptional", str(numRequestsWithOptional).rjust(7) ))
-	toReport.append(( "optionalRatio", "{:.3f}".format(numRequestsWithOptional / len(responseTimes)) ))
-	toReport.append(( "avgResponseTime", "{:.3f}".format(avg(responseTimes)) ))
-	toReport.append(( "p95ResponseTime", "{:.3f}".format(np.percentile(responseTimes, 95)) ))
-	toReport.append(( "p99ResponseTime", "{:.3f}".format(np.percentile(responseTimes, 99)) ))
-	toReport.append(( "maxResponseTime", "{:.3f}".format(max(responseTimes)) ))
-	toReport.append(( "stddevResponseTime", "{:.3f}".format(np.std(responseTimes)) ))
-
-	print(*[k for k,v in toReport], sep = ', ')
-	print(*[v for k,v in toReport], sep = ', ')
-
-	sim.output('final-results', ', '.join([k for k,v in toReport]))
-	sim.output('final-results', ', '.join([v for k,v in toReport]))
+	def reportResults(loadBalancingAlgorithm):
+		if responseTimeSketch is None:
+			responseTimes = FloatBuffer()
+			for client in clients + [ openLoopClient ]:
+				responseTimes.extend(client.responseTimes)
+			responseTimesArray = responseTimes.toNumpy()
+			avgResponseTime = np.mean(responseTimesArray)
+			p95ResponseTime = np.percentile(responseTimesArray, 95)
+			p99ResponseTime = np.percentile(responseTimesArray, 99)
+			maxResponseTime = np.max(responseTimesArray)
+			stddevResponseTime = np.std(responseTimesArray)
+		else:
+			responseTimes = QuantileSketch(relativeAccuracy = responseTimeSketch)
+			for client in clients + [ openLoopClient ]:
+				responseTimes.merge(client.responseTimes)
+			avgResponseTime = responseTimes.average()
+			p95ResponseTime = responseTimes.percentile(95)
+			p99ResponseTime = responseTimes.percentile(99)
+			maxResponseTime = responseTimes.max
+			stddevResponseTime = responseTimes.stddev()
+		numRequestsWithOptional = sum([client.numCompletedRequestsWithOptional for client in clients]) + openLoopClient.numCompletedRequestsWithOptional
+
+		toReport = []
+		toReport.append(( "autoScalerAlgorithm", autoScalerControllerFactory.getName().ljust(20) ))
+		toReport.append(( "loadBalancingAlgorithm", loadBalancingAlgorithm.ljust(20) ))
+		toReport.append(( "replicaAlgorithm", replicaControllerFactory.getName().ljust(20) ))
+		toReport.append(( "numRequests", str(len(responseTimes)).rjust(7) ))
+		toReport.append(( "numRequestsWithOptional", str(numRequestsWithOptional).rjust(7) ))
+		toReport.append(( "optionalRatio", "{:.3f}".format(numRequestsWithOptional / len(responseTimes)) ))
+		toReport.append(( "avgResponseTime", "{:.3f}".format(avgResponseTime) ))
+		toReport.append(( "p95ResponseTime", "{:.3f}".format(p95ResponseTime) ))
+		toReport.append(( "p99ResponseTime", "{:.3f}".format(p99ResponseTime) ))
+		toReport.append(( "maxResponseTime", "{:.3f}".format(maxResponseTime) ))
+		toReport.append(( "stddevResponseTime", "{:.3f}".format(stddevResponseTime) ))
+
+		print(*[k for k,v in toReport], sep = ', ')
+		print(*[v for k,v in toReport], sep = ', ')
+
+		sim.output('final-results', ', '.join([k for k,v in toReport]))
+		sim.output('final-results', ', '.join([v for k,v in toReport]))
+
+		if tracer is not None:
+			with open(os.path.join(sim.outputDirectory, 'trace.json'), 'w') as traceFile:
+				tracer.exportChromeTrace(traceFile)
+
+	if warmUp is None:
+		sim.run(until = otherParams['simulateUntil'])
+		try:
+			reportResults(loadBalancingAlgorithm)
+		finally:
+			# Make output durable, even if written by a background thread
+			sim.close()
+		return
+
+	# Simulate warm-up once, then fork one simulation per branch
+	if branchAlgorithms is None:
+		branchAlgorithms = [ loadBalancingAlgorithm ]
+	sim.run(until = warmUp)
+	children = []
+	for branchAlgorithm in branchAlgorithms:
+		branchOutdir = os.path.join(outdir, branchAlgorithm)
+		if not os.path.exists(branchOutdir):
+			os.makedirs(branchOutdir)
+		pid = sim.fork(branchOutdir)
+		if pid == 0:
+			exitCode = 1
+			try:
+				setLoadBalancingAlgorithm(branchAlgorithm)
+				sim.run(until = otherParams['simulateUntil'])
+				reportResults(branchAlgorithm)
+				exitCode = 0
+			except Exception as e:
+				print("Caught exception with {0}: {1}".format(branchAlgorithm, e))
+			finally:
+				# Never return into the parent's code
+				sim.close()
+				sys.stdout.flush()
+				os._exit(exitCode)
+		children.append((pid, branchAlgorithm))
+	# Branches continue with their own copy of the output, finish the warm-up one
+	sim.close()
+
+	failedBranches = []
+	for pid, branchAlgorithm in children:
+		_, status = os.waitpid(pid, 0)
+		if os.WIFSIGNALED(status):
+			print("Branch {0} killed by signal {1}".format(branchAlgorithm, os.WTERMSIG(status)),
+				file = sys.stderr)
+		elif os.WEXITSTATUS(status) != 0:
+			print("Branch {0} exited with status {1}".format(branchAlgorithm, os.WEXITSTATUS(status)),
+				file = sys.stderr)
+		else:
+			continue
+		failedBranches.append(branchAlgorithm)
+	if failedBranches:
+		raise RuntimeError("Failed branches: {0}".format(', '.join(failedBranches)))
 
 if __name__ == "__main__":
 	main() # pragma: no cover
@@ -26,6 +26,27 @@ def test_invalid_algorithm(_):
             ]):
         main()
 
+@mock.patch('base.SimulatorKernel.output')
+def test_several_algorithms(output):
+    with mock.patch('sys.argv', [
+            './simulator.py',
+            '--lb', 'SQF,RR',
+            '--rc', 'mm_queueifac',
+            ]):
+        main()
+    algorithms = [ args[1].split(',')[1].strip() for args, _ in output.call_args_list
+        if args[0] == 'final-results' and not args[1].startswith('autoScalerAlgorithm') ]
+    assert_equal(algorithms, [ 'SQF', 'RR' ])
+
+@mock.patch('base.SimulatorKernel.output')
+@raises(SystemExit)
+def test_invalid_algorithm_in_list(_):
+    with mock.patch('sys.argv', [
+            './simulator.py',
+            '--lb', 'SQF,non-existant',
+            ]):
+        main()
+
 @mock.patch('base.SimulatorKernel.output')
 def test_autoscaler(_):
     with mock.patch('sys.argv', [